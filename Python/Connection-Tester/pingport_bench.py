@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Network Connectivity Checker - Benchmark Suite
+Measures the scanning engines of pingport_cli.py against local loopback listeners.
+"""
+
+import argparse
+import json
+import os
+import platform
+import selectors
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from pingport_cli import NetworkChecker, PortSet, PortStateStore
+
+# Benchmark cases: name -> (engine, workers/concurrency)
+CASES = {
+    "sequential": ("sequential", 1),
+    "ports-parallel-w10": ("ports_parallel", 10),
+    "ports-parallel-w50": ("ports_parallel", 50),
+    "ports-parallel-w200": ("ports_parallel", 200),
+    "scheduler-w50": ("scheduler", 50),
+    "async-c500": ("async", 500),
+    "select-c500": ("select", 500),
+}
+
+
+class LoopbackFixture:
+    """
+    Local listeners on 127.0.0.0/8 that look like open, closed and filtered ports.
+
+    Open ports are accepted and closed immediately by a selector thread. Closed
+    ports have no listener, so the kernel answers with a reset. Filtered ports
+    are simulated by listeners whose accept queue is full and never drained:
+    Linux silently drops further SYNs, so those connects run into the probe
+    timeout, just as they would against a black-holing firewall.
+    """
+
+    def __init__(self, hosts: int, ports: int, base_port: int,
+                 open_every: int, filtered_every: int):
+        self.addresses = [f"127.0.0.{i + 1}" for i in range(hosts)]
+        self.ports = PortSet([(base_port, base_port + ports - 1)])
+        self.expected = {}  # (address, port) -> state
+        self._listeners = []
+        self._stuck = []  # Connections that keep the filtered accept queues full
+        self._selector = selectors.DefaultSelector()
+        self._running = False
+
+        for address in self.addresses:
+            for offset, port in enumerate(self.ports):
+                if offset % filtered_every == filtered_every - 1:
+                    state = PortStateStore.FILTERED
+                elif offset % open_every == 0:
+                    state = PortStateStore.OPEN
+                else:
+                    state = PortStateStore.CLOSED
+                self.expected[(address, port)] = state
+
+    def start(self) -> None:
+        """Bind every open and filtered port and start accepting."""
+        filtered = []
+        for (address, port), state in self.expected.items():
+            if state == PortStateStore.CLOSED:
+                continue
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((address, port))
+            if state == PortStateStore.OPEN:
+                sock.listen(1024)
+                sock.setblocking(False)
+                self._selector.register(sock, selectors.EVENT_READ)
+            else:
+                sock.listen(0)
+                filtered.append((address, port))
+            self._listeners.append(sock)
+
+        # Only fill the queues once every listener is bound, so the clients'
+        # source ports cannot take a port the fixture still has to bind
+        for address, port in filtered:
+            self._fill_queue(address, port)
+
+        self._running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _fill_queue(self, address: str, port: int) -> None:
+        # A backlog of 0 still admits one pending connection; fill it and a spare
+        for _ in range(2):
+            client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            client.setblocking(False)
+            client.connect_ex((address, port))
+            self._stuck.append(client)
+        time.sleep(0.01)
+
+    def _accept_loop(self) -> None:
+        while self._running:
+            for key, _ in self._selector.select(0.2):
+                try:
+                    conn, _ = key.fileobj.accept()
+                    conn.close()
+                except OSError:
+                    pass
+
+    def stop(self) -> None:
+        """Close all listeners and queued connections."""
+        self._running = False
+        for sock in self._listeners + self._stuck:
+            sock.close()
+        self._selector.close()
+
+    def config(self) -> dict:
+        """Describe the fixture for child processes and the results file."""
+        return {
+            "addresses": self.addresses,
+            "ports": str(self.ports),
+            "expected": {f"{a}:{p}": state for (a, p), state in self.expected.items()},
+        }
+
+
+def run_case(name: str, config: dict, timeout: float) -> dict:
+    """
+    Run one benchmark case in this process and measure it.
+
+    Returns:
+        Dictionary with wall time, probes/sec, peak RSS, peak threads and
+        the number of probes whose state differed from the fixture
+    """
+    engine, width = CASES[name]
+    addresses = config["addresses"]
+    ports = PortSet.parse(config["ports"])
+    checker = NetworkChecker(timeout=timeout, max_workers=width, concurrency=width)
+    results: List[Tuple[str, dict]] = []
+
+    def on_probe(host, port, result):
+        results.append((host, result))
+
+    peak_threads = threading.active_count()
+    sampling = True
+
+    def sample_threads():
+        nonlocal peak_threads
+        while sampling:
+            peak_threads = max(peak_threads, threading.active_count())
+            time.sleep(0.01)
+
+    sampler = threading.Thread(target=sample_threads, daemon=True)
+    sampler.start()
+    start_time = time.perf_counter()
+
+    if engine == "sequential":
+        for host in addresses:
+            for port in ports:
+                results.append((host, checker.check_port(host, port)))
+    elif engine == "ports_parallel":
+        for host in addresses:
+            results.extend((host, r) for r in checker.scan_ports_parallel(host, list(ports)))
+    elif engine == "scheduler":
+        checker.scan_hosts_parallel(addresses, ports, ping=False, on_probe=on_probe, keep_results=False)
+    elif engine == "async":
+        import asyncio
+        asyncio.run(checker.scan_hosts_async(addresses, ports, ping=False,
+                                             on_probe=on_probe, keep_results=False))
+    elif engine == "select":
+        checker.scan_hosts_selector(addresses, ports, ping=False, on_probe=on_probe, keep_results=False)
+
+    wall_time = time.perf_counter() - start_time
+    sampling = False
+    sampler.join()
+
+    mismatches = sum(
+        1 for host, result in results
+        if config["expected"][f"{host}:{result['port']}"] != PortStateStore.classify(result)
+    )
+    return {
+        "case": name,
+        "engine": engine,
+        "width": width,
+        "probes": len(results),
+        "wall_time": round(wall_time, 3),
+        "probes_per_sec": round(len(results) / wall_time, 1) if wall_time else None,
+        "peak_rss_kb": peak_rss_kb(),
+        "peak_threads": peak_threads,
+        "mismatches": mismatches,
+    }
+
+
+def ephemeral_port_range() -> Optional[Tuple[int, int]]:
+    """Range the kernel picks connect() source ports from (None if unknown)."""
+    try:
+        with open("/proc/sys/net/ipv4/ip_local_port_range", encoding="utf-8") as f:
+            low, high = f.read().split()
+        return int(low), int(high)
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_kb() -> int:
+    """Peak resident set size of this process in KB (0 where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss  # bytes on macOS
+
+
+def git_revision() -> str:
+    """Commit of the checked-out tree, so results can be compared across versions."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the pingport_cli scanning engines against loopback listeners",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s
+  %(prog)s --cases async-c500 select-c500 --hosts 8 --ports 2000
+  %(prog)s --output results/bench_$(git rev-parse --short HEAD).json
+        """
+    )
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES),
+                        help="Benchmark cases to run (default: all)")
+    parser.add_argument("--hosts", type=int, default=2,
+                        help="Number of loopback addresses to scan (default: 2)")
+    parser.add_argument("--ports", type=int, default=200,
+                        help="Number of ports per address (default: 200)")
+    parser.add_argument("--base-port", type=int, default=20000,
+                        help="First port of the scanned range (default: 20000)")
+    parser.add_argument("--open-every", type=int, default=10,
+                        help="Every Nth port is open (default: 10)")
+    parser.add_argument("--filtered-every", type=int, default=50,
+                        help="Every Nth port is filtered (default: 50)")
+    parser.add_argument("--timeout", type=float, default=1,
+                        help="Probe timeout in seconds, paid by every filtered port (default: 1)")
+    parser.add_argument("--output", type=str, default="bench_results.json",
+                        help="Machine-readable results file (default: bench_results.json)")
+    parser.add_argument("--run-case", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child mode: run a single case on the fixture described on stdin and report it on stdout
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case, json.load(sys.stdin), args.timeout)))
+        return
+
+    last_port = args.base_port + args.ports - 1
+    if args.base_port < 1 or last_port > 65535:
+        parser.error(f"ports {args.base_port}-{last_port} are outside 1-65535")
+    ephemeral = ephemeral_port_range()
+    if ephemeral and args.base_port <= ephemeral[1] and last_port >= ephemeral[0]:
+        parser.error(f"ports {args.base_port}-{last_port} overlap the ephemeral port range "
+                     f"{ephemeral[0]}-{ephemeral[1]}; choose another --base-port")
+
+    fixture = LoopbackFixture(args.hosts, args.ports, args.base_port,
+                              args.open_every, args.filtered_every)
+    fixture.start()
+    config = fixture.config()
+
+    print("Network Connectivity Checker - Benchmark")
+    print("=" * 60)
+    print(f"Targets: {args.hosts} address(es) x {args.ports} port(s) | Timeout: {args.timeout}s")
+    print()
+    print(f"{'Case':<22} {'Probes/s':>10} {'Wall s':>8} {'RSS MB':>8} {'Threads':>8} {'Errors':>7}")
+
+    results = []
+    try:
+        for name in args.cases:
+            # Each case runs in a fresh interpreter so peak RSS is its own. The
+            # fixture goes in on stdin: it is far too large for a command line.
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run-case", name,
+                 "--timeout", str(args.timeout)],
+                input=json.dumps(config), capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                print(f"{name:<22} failed: {proc.stderr.strip().splitlines()[-1:]}")
+                continue
+            result = json.loads(proc.stdout)
+            results.append(result)
+            print(f"{name:<22} {result['probes_per_sec']:>10} {result['wall_time']:>8} "
+                  f"{result['peak_rss_kb'] / 1024:>8.1f} {result['peak_threads']:>8} {result['mismatches']:>7}")
+    finally:
+        fixture.stop()
+
+    report = {
+        "generated": datetime.now().isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            "hosts": args.hosts,
+            "ports": args.ports,
+            "open_every": args.open_every,
+            "filtered_every": args.filtered_every,
+            "timeout": args.timeout,
+        },
+        "results": results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print()
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\nBenchmark cancelled by user.")
+        sys.exit(1)
@@ -7,17 +7,1053 @@ A comprehensive tool for testing network connectivity via ping and port scanning
 import subprocess
 import socket
 import argparse
+import asyncio
+import copy
+import errno
+import gzip
+import heapq
+import hmac
+import io
+import ipaddress
+import json
+import math
 import sys
+import os
 import platform
+import queue
+import random
+import select
+import selectors
+import sqlite3
+import struct
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Tuple, Optional
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from itertools import chain
+from datetime import datetime, timezone
+from contextlib import ExitStack
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from typing import Callable, Iterable, Iterator, List, Tuple, Optional
+
+class IcmpPinger:
+    """
+    In-process ICMP echo engine shared by every ping in a scan.
+    
+    Echo requests for all hosts go out through one ICMP socket, preferring an
+    unprivileged SOCK_DGRAM ping socket (Linux, net.ipv4.ping_group_range) and
+    falling back to a raw socket. A background thread reads replies and matches
+    them to their request by sequence number (plus identifier on raw sockets,
+    where the kernel does not demultiplex for us). IPv4 only; callers fall
+    back to the system `ping` command when the engine is unavailable.
+    """
+    
+    ICMP_ECHO_REPLY = 0
+    ICMP_ECHO_REQUEST = 8
+    PAYLOAD = b"pingport" + bytes(48)  # 56 bytes, like the default ping payload
+    UNAVAILABLE = ("ICMP sockets are not permitted on this system "
+                   "(check net.ipv4.ping_group_range or run with raw-socket privileges)")
+    
+    def __init__(self, timeout: float = 3, interval: float = 1.0):
+        self.timeout = timeout
+        self.interval = interval
+        self.sock = None
+        self.raw = False
+        self.ident = os.getpid() & 0xFFFF
+        self._lock = threading.Lock()
+        self._next_seq = 0
+        self._outstanding = {}  # seq -> (session, address, send_time)
+        self._pinging = set()   # Sessions of ping() calls in progress
+        self._receiver = None
+    
+    @classmethod
+    def open_socket(cls) -> Tuple[socket.socket, bool]:
+        """
+        Open an ICMP socket, trying SOCK_DGRAM before SOCK_RAW.
+        
+        Returns:
+            Tuple of (socket, is_raw)
+            
+        Raises:
+            OSError: If neither socket type is permitted on this system
+        """
+        try:
+            return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+        except OSError:
+            return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+    
+    def available(self) -> bool:
+        """Open the shared socket on first use; False if ICMP sockets are not permitted."""
+        with self._lock:
+            if self.sock is not None:
+                return True
+            try:
+                self.sock, self.raw = self.open_socket()
+            except (OSError, AttributeError):
+                return False
+            self.sock.setblocking(False)
+            self._receiver = threading.Thread(target=self._receive_loop, daemon=True)
+            self._receiver.start()
+            return True
+    
+    def interrupt(self) -> None:
+        """Make every ping() or ping_async() in progress stop sending and return what it has so far."""
+        with self._lock:
+            sessions = list(self._pinging)
+        for session in sessions:
+            session.finish()
+    
+    def close(self) -> None:
+        """Close the shared socket and stop the receiver thread."""
+        with self._lock:
+            sock, self.sock = self.sock, None
+        if sock is not None:
+            sock.close()
+    
+    @staticmethod
+    def checksum(data: bytes) -> int:
+        """RFC 1071 Internet checksum."""
+        if len(data) % 2:
+            data += b"\0"
+        total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+        total = (total >> 16) + (total & 0xFFFF)
+        total += total >> 16
+        return ~total & 0xFFFF
+    
+    def _build_echo(self, seq: int) -> bytes:
+        header = struct.pack("!BBHHH", self.ICMP_ECHO_REQUEST, 0, 0, self.ident, seq)
+        checksum = self.checksum(header + self.PAYLOAD)
+        return struct.pack("!BBHHH", self.ICMP_ECHO_REQUEST, 0, checksum, self.ident, seq) + self.PAYLOAD
+    
+    def _send_echo(self, session: "_EchoSession") -> None:
+        """Send one echo request for a session, recording it as outstanding."""
+        with self._lock:
+            # Pick the next free 16-bit sequence number
+            for _ in range(0x10000):
+                seq = self._next_seq
+                self._next_seq = (self._next_seq + 1) & 0xFFFF
+                if seq not in self._outstanding:
+                    break
+            else:
+                session.errors.append("Too many outstanding echo requests")
+                return
+            self._outstanding[seq] = (session, session.address, time.perf_counter())
+            sock = self.sock
+        session.sent += 1
+        try:
+            sock.sendto(self._build_echo(seq), (session.address, 0))
+        except OSError as e:
+            with self._lock:
+                self._outstanding.pop(seq, None)
+            session.errors.append(str(e))
+    
+    def _receive_loop(self) -> None:
+        """Read echo replies and hand each RTT to the session that sent it."""
+        while True:
+            sock = self.sock
+            if sock is None:
+                return
+            try:
+                readable, _, _ = select.select([sock], [], [], 0.5)
+                if not readable:
+                    continue
+                packet, (address, _) = sock.recvfrom(2048)
+            except (OSError, ValueError):
+                if self.sock is None:
+                    return
+                continue
+            received_at = time.perf_counter()
+            
+            if self.raw:
+                packet = packet[(packet[0] & 0x0F) * 4:]  # Strip the IP header
+            if len(packet) < 8:
+                continue
+            icmp_type, _, _, ident, seq = struct.unpack("!BBHHH", packet[:8])
+            if icmp_type != self.ICMP_ECHO_REPLY:
+                continue
+            if self.raw and ident != self.ident:
+                continue
+            
+            with self._lock:
+                entry = self._outstanding.get(seq)
+                if entry is None or entry[1] != address:
+                    continue
+                del self._outstanding[seq]
+            session, _, sent_at = entry
+            session.add_reply((received_at - sent_at) * 1000)
+    
+    def _expire(self, session: "_EchoSession") -> None:
+        """Forget any echo requests of a session that were never answered."""
+        with self._lock:
+            for seq in [seq for seq, entry in self._outstanding.items() if entry[0] is session]:
+                del self._outstanding[seq]
+    
+    @staticmethod
+    def resolve(host: str) -> str:
+        """Resolve a host to its first IPv4 address."""
+        return socket.getaddrinfo(host, None, socket.AF_INET, socket.SOCK_RAW)[0][4][0]
+    
+    def ping(self, host: str, count: int = 4, timeout: Optional[float] = None,
+             address: Optional[str] = None, cancelled: Optional[Callable[[], bool]] = None) -> dict:
+        """
+        Ping a host with `count` echoes spaced by `interval` seconds.
+        
+        Thread-safe; concurrent callers share the engine's socket, and
+        interrupt() ends every call in progress early.
+        
+        Args:
+            host: Hostname or IPv4 address to ping
+            count: Number of echo requests to send
+            timeout: Seconds to wait for replies after the last echo
+            address: Pre-resolved IPv4 address, skipping the lookup
+            cancelled: Optional check, made once the call can be interrupted;
+                if it returns True no echo is sent. A caller that sets its flag
+                before calling interrupt() thus never misses a ping starting
+                concurrently.
+            
+        Returns:
+            Ping result dict with RTT min/avg/max (ms) and packet loss (%)
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start_time = time.time()
+        try:
+            session = _EchoSession(host, address or self.resolve(host), count)
+        except (socket.gaierror, IndexError) as e:
+            return _EchoSession.failure(host, f"DNS resolution failed: {e}")
+        
+        with self._lock:
+            self._pinging.add(session)
+        if cancelled and cancelled():
+            session.finish()
+        try:
+            for i in range(count):
+                # done is only set early by interrupt(): replies cannot outnumber echoes
+                if session.done.wait(self.interval if i else 0):
+                    break
+                self._send_echo(session)
+            session.done.wait(timeout)
+        finally:
+            with self._lock:
+                self._pinging.discard(session)
+            self._expire(session)
+        return session.result(time.time() - start_time)
+    
+    async def ping_async(self, host: str, count: int = 4, timeout: Optional[float] = None,
+                         address: Optional[str] = None) -> dict:
+        """Asyncio counterpart of ping(); never blocks the event loop."""
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        start_time = time.time()
+        try:
+            if address is None:
+                infos = await loop.getaddrinfo(host, None, family=socket.AF_INET, type=socket.SOCK_RAW)
+                address = infos[0][4][0]
+        except (socket.gaierror, IndexError) as e:
+            return _EchoSession.failure(host, f"DNS resolution failed: {e}")
+        
+        done = asyncio.Event()
+        session = _EchoSession(host, address, count,
+                               notify=lambda: loop.call_soon_threadsafe(done.set))
+        with self._lock:
+            self._pinging.add(session)
+        try:
+            for i in range(count):
+                # done is only set early by interrupt(): replies cannot outnumber echoes
+                if i and await self._wait_async(done, self.interval):
+                    break
+                self._send_echo(session)
+            await self._wait_async(done, timeout)
+        finally:
+            with self._lock:
+                self._pinging.discard(session)
+            self._expire(session)  # Also when the ping is cancelled
+        return session.result(time.time() - start_time)
+    
+    @staticmethod
+    async def _wait_async(event: asyncio.Event, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for an event; True if it was set."""
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class _EchoSession:
+    """Replies collected for one host's series of echo requests."""
+    
+    def __init__(self, host: str, address: str, count: int,
+                 notify: Optional[Callable[[], None]] = None):
+        self.host = host
+        self.address = address
+        self.count = count
+        self.sent = 0
+        self.rtts = []
+        self.errors = []
+        self.done = threading.Event()
+        self.notify = notify
+    
+    def add_reply(self, rtt_ms: float) -> None:
+        self.rtts.append(rtt_ms)
+        if len(self.rtts) >= self.count:
+            self.finish()
+    
+    def finish(self) -> None:
+        """Wake whoever waits for this session, whether on a thread or an event loop."""
+        self.done.set()
+        if self.notify:
+            self.notify()
+    
+    def result(self, duration: float) -> dict:
+        """Build a ping result dict compatible with NetworkChecker.ping_host."""
+        received = len(self.rtts)
+        sent = max(self.sent, 1)
+        loss = round(100.0 * (sent - received) / sent, 1)
+        result = {
+            "host": self.host,
+            "address": self.address,
+            "success": received > 0,
+            "output": f"{self.sent} packets transmitted, {received} received, {loss}% packet loss",
+            "error": "; ".join(self.errors) if self.errors else None,
+            "duration": round(duration, 2),
+            "return_code": 0 if received else 1,
+            "packets_sent": self.sent,
+            "packets_received": received,
+            "packet_loss": loss,
+            "rtt_min": None,
+            "rtt_avg": None,
+            "rtt_max": None
+        }
+        if self.rtts:
+            result["rtt_min"] = round(min(self.rtts), 3)
+            result["rtt_avg"] = round(sum(self.rtts) / received, 3)
+            result["rtt_max"] = round(max(self.rtts), 3)
+            result["output"] += (f"\nrtt min/avg/max = {result['rtt_min']}/"
+                                 f"{result['rtt_avg']}/{result['rtt_max']} ms")
+        elif not self.errors:
+            result["error"] = "No echo replies received"
+        return result
+    
+    @staticmethod
+    def failure(host: str, error: str) -> dict:
+        """Ping result dict for a host that could not be pinged at all."""
+        return {
+            "host": host,
+            "address": None,
+            "success": False,
+            "output": "",
+            "error": error,
+            "duration": 0,
+            "return_code": -1,
+            "packets_sent": 0,
+            "packets_received": 0,
+            "packet_loss": 100.0,
+            "rtt_min": None,
+            "rtt_avg": None,
+            "rtt_max": None
+        }
+
+
+class DnsCache:
+    """
+    Hostname resolution cache shared by every probe of a scan.
+    
+    Lookups run on a small resolver thread pool, so a slow DNS server never
+    occupies a scan worker, and concurrent requests for the same name share a
+    single in-flight lookup. Answers are cached for `ttl` seconds (failures for
+    at most 30 seconds), so each name costs one getaddrinfo call per scan
+    instead of one per port. IP address literals are answered without being
+    cached, and at most MAX_ENTRIES names are kept, least recently used first
+    out, so sweeping a large range does not grow the cache.
+    """
+    
+    MAX_ENTRIES = 4096
+    
+    def __init__(self, ttl: float = 300, workers: int = 8,
+                 profiler: Optional["PhaseProfiler"] = None):
+        self.ttl = ttl
+        self.profiler = profiler
+        self.negative_ttl = min(ttl, 30)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dns")
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # host -> (expires_at or None while pending, future)
+    
+    def _lookup(self, host: str) -> dict:
+        """Resolve a host, returning its addresses and the lookup time."""
+        start_time = time.perf_counter()
+        started_ns = time.perf_counter_ns()
+        try:
+            infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+            addresses = list(dict.fromkeys(info[4][0] for info in infos))
+            error = None
+        except (socket.gaierror, UnicodeError) as e:
+            addresses = []
+            error = f"DNS resolution failed: {str(e)}"
+        if self.profiler:
+            self.profiler.record("dns", host, time.perf_counter_ns() - started_ns)
+        return {
+            "host": host,
+            "addresses": addresses,
+            "error": error,
+            "dns_time": round((time.perf_counter() - start_time) * 1000, 2)  # ms
+        }
+    
+    @staticmethod
+    def _literal(host: str) -> Optional[dict]:
+        """Entry for an IP address literal, which needs no lookup."""
+        try:
+            address = str(ipaddress.ip_address(host))
+        except ValueError:
+            return None
+        return {"host": host, "addresses": [address], "error": None, "dns_time": 0}
+    
+    def submit(self, host: str) -> Future:
+        """Return a future for the host's entry, starting a lookup if needed."""
+        literal = self._literal(host)
+        if literal is not None:
+            future = Future()
+            future.set_result(literal)
+            return future
+        
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry and (entry[0] is None or entry[0] > now):
+                self._entries.move_to_end(host)
+                return entry[1]
+            
+            future = self._pool.submit(self._lookup, host)
+            self._entries[host] = (None, future)
+            self._entries.move_to_end(host)
+            while len(self._entries) > self.MAX_ENTRIES:
+                self._entries.popitem(last=False)
+        future.add_done_callback(lambda f: self._set_expiry(host, f))
+        return future
+    
+    def _set_expiry(self, host: str, future: Future) -> None:
+        ttl = self.negative_ttl if future.exception() or future.result()["error"] else self.ttl
+        with self._lock:
+            if self._entries.get(host, (None, None))[1] is future:
+                self._entries[host] = (time.monotonic() + ttl, future)
+    
+    def resolve(self, host: str) -> dict:
+        """
+        Resolve a host through the cache.
+        
+        Returns:
+            Dictionary with host, addresses, error and dns_time (ms)
+        """
+        return self.submit(host).result()
+    
+    async def resolve_async(self, host: str) -> dict:
+        """Asyncio counterpart of resolve()."""
+        return await asyncio.wrap_future(self.submit(host))
+    
+    def lookup(self, host: str) -> Optional[dict]:
+        """Return the cached entry for a host without starting a lookup."""
+        literal = self._literal(host)
+        if literal is not None:
+            return literal
+        with self._lock:
+            entry = self._entries.get(host)
+        if entry and entry[1].done() and not entry[1].exception():
+            return entry[1].result()
+        return None
+    
+    @staticmethod
+    def first_address(entry: dict, ipv4_only: bool = False) -> Optional[str]:
+        """Pick the address probes should target from a resolved entry."""
+        for address in entry["addresses"]:
+            if not ipv4_only or ":" not in address:
+                return address
+        return None
+    
+    def shutdown(self) -> None:
+        """Stop the resolver pool."""
+        self._pool.shutdown(wait=False)
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram with bounded memory.
+    
+    Durations (ns) fall into buckets eight per power of two (about 9%
+    resolution), so percentiles stay cheap to compute however many samples
+    are recorded. Exact count, total, min and max are kept alongside.
+    """
+    
+    SUB_BUCKETS = 8
+    
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+    
+    def add(self, duration_ns: int) -> None:
+        duration_ns = max(1, duration_ns)
+        bucket = int(math.log2(duration_ns) * self.SUB_BUCKETS)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total_ns += duration_ns
+        self.min_ns = duration_ns if self.min_ns is None else min(self.min_ns, duration_ns)
+        self.max_ns = max(self.max_ns, duration_ns)
+    
+    def merge(self, other: "LatencyHistogram") -> None:
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.total_ns += other.total_ns
+        if other.min_ns is not None:
+            self.min_ns = other.min_ns if self.min_ns is None else min(self.min_ns, other.min_ns)
+        self.max_ns = max(self.max_ns, other.max_ns)
+    
+    def percentile(self, pct: float) -> float:
+        """Approximate percentile in ms (bucket midpoint, clamped to min/max)."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * pct / 100))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                midpoint = 2 ** ((bucket + 0.5) / self.SUB_BUCKETS)
+                return min(max(midpoint, self.min_ns), self.max_ns) / 1e6
+        return self.max_ns / 1e6
+
+
+class PhaseProfiler:
+    """
+    Opt-in per-phase timing for a scan (dns, connect, connect_timeout, ping).
+    
+    Each recorded duration goes into a per-host and a global histogram for its
+    phase, so the summary can show whether time goes to name resolution,
+    completed connects, SYNs that time out, or pinging. Thread-safe.
+    """
+    
+    PHASES = ("dns", "connect", "connect_timeout", "ping", "traceroute")
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.global_phases = {}  # phase -> LatencyHistogram
+        self.host_phases = {}    # host -> phase -> LatencyHistogram
+    
+    def record(self, phase: str, host: str, duration_ns: int) -> None:
+        with self._lock:
+            self.global_phases.setdefault(phase, LatencyHistogram()).add(duration_ns)
+            self.host_phases.setdefault(host, {}).setdefault(phase, LatencyHistogram()).add(duration_ns)
+    
+    def merge(self, global_phases: dict, host_phases: dict) -> None:
+        """Fold in the histograms of another profiler, e.g. from a --procs worker."""
+        with self._lock:
+            for phase, histogram in global_phases.items():
+                self.global_phases.setdefault(phase, LatencyHistogram()).merge(histogram)
+            for host, phases in host_phases.items():
+                for phase, histogram in phases.items():
+                    self.host_phases.setdefault(host, {}).setdefault(phase, LatencyHistogram()).merge(histogram)
+    
+    @staticmethod
+    def _row(label: str, histogram: LatencyHistogram) -> str:
+        return (f"  {label:<32} {histogram.count:>8} {histogram.total_ns / 1e9:>10.2f} "
+                f"{histogram.percentile(50):>9.2f} {histogram.percentile(95):>9.2f} "
+                f"{histogram.percentile(99):>9.2f} {histogram.max_ns / 1e6:>9.2f}")
+    
+    def format_summary(self, top_hosts: int = 10) -> str:
+        """Render global and slowest-host phase statistics as a text table."""
+        def ordered(phases):
+            return sorted(phases, key=lambda p: (self.PHASES.index(p) if p in self.PHASES else len(self.PHASES), p))
+        
+        header = (f"  {'Phase':<32} {'Count':>8} {'Total s':>10} {'p50 ms':>9} "
+                  f"{'p95 ms':>9} {'p99 ms':>9} {'Max ms':>9}")
+        with self._lock:
+            lines = ["⏱  Profile (all hosts):", header]
+            for phase in ordered(self.global_phases):
+                lines.append(self._row(phase, self.global_phases[phase]))
+            
+            slowest = sorted(self.host_phases.items(),
+                             key=lambda item: sum(h.total_ns for h in item[1].values()),
+                             reverse=True)[:top_hosts]
+            if slowest:
+                lines.append("")
+                lines.append(f"⏱  Slowest {len(slowest)} host(s) by total probe time:")
+                lines.append(header)
+                for host, phases in slowest:
+                    for phase in ordered(phases):
+                        lines.append(self._row(f"{host} {phase}", phases[phase]))
+        return "\n".join(lines)
+
+
+class _AimdBucket:
+    """Token bucket whose rate is steered AIMD-style from probe outcomes."""
+    
+    def __init__(self, max_rate: float, min_rate: float):
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.rate = max(self.min_rate, max_rate / 10)  # Slow start from 10% of the ceiling
+        self.slow_start = True
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.last_decrease = 0.0
+        self.base_rtt = None  # Lowest connect time seen (ms)
+        self.decreases = 0
+        self._reset_window(self.updated)
+    
+    def _reset_window(self, now: float) -> None:
+        self.window_start = now
+        self.window_probes = 0
+        self.window_timeouts = 0
+        self.window_rtt_total = 0.0
+        self.window_rtt_count = 0
+    
+    def wait_time(self, now: float) -> float:
+        """Refill the bucket and return how long until a token is available."""
+        capacity = max(1.0, self.rate * ProbePacer.BURST_SECONDS)
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+    
+    def observe(self, now: float, timed_out: bool, rtt_ms: float, feedback_delay: float) -> None:
+        """Count one finished probe and adjust the rate at the end of each window."""
+        self.window_probes += 1
+        if timed_out:
+            self.window_timeouts += 1
+        else:
+            self.window_rtt_total += rtt_ms
+            self.window_rtt_count += 1
+            self.base_rtt = rtt_ms if self.base_rtt is None else min(self.base_rtt, rtt_ms)
+        
+        elapsed = now - self.window_start
+        if self.window_probes < ProbePacer.WINDOW_PROBES or elapsed < ProbePacer.WINDOW_SECONDS:
+            return
+        
+        timeout_ratio = self.window_timeouts / self.window_probes
+        mean_rtt = self.window_rtt_total / self.window_rtt_count if self.window_rtt_count else None
+        rtt_inflated = (mean_rtt is not None and self.base_rtt is not None
+                        and mean_rtt > 2 * self.base_rtt and mean_rtt - self.base_rtt > 5)
+        
+        # Timeouts only show up `feedback_delay` after the SYN was sent, so back
+        # off at most once per delay instead of once per window of stale results
+        if timeout_ratio > ProbePacer.TIMEOUT_RATIO or rtt_inflated:
+            if now - self.last_decrease >= feedback_delay:
+                factor = 0.5 if timeout_ratio > ProbePacer.TIMEOUT_RATIO else 0.8
+                self.rate = max(self.min_rate, self.rate * factor)
+                self.slow_start = False
+                self.last_decrease = now
+                self.decreases += 1
+        elif self.slow_start:
+            self.rate = min(self.max_rate, self.rate * 2)
+        else:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+        self._reset_window(now)
+
+
+class ProbePacer:
+    """
+    Global and per-target token-bucket pacing for TCP connect probes.
+    
+    Each probe takes a token from the global bucket and from its target's
+    bucket. Both rates start low, double while probes come back cleanly,
+    then grow additively; a window in which too many connects time out
+    halves the rate, and inflated connect times trim it. Firewalls that drop
+    SYNs under load therefore see fewer bursts, and fewer probes end as
+    spurious "Connection timed out" results that each cost the full timeout.
+    
+    Note that genuinely filtered ports also time out, so hosts that drop
+    everything are scanned at a lower rate. Thread-safe.
+    """
+    
+    BURST_SECONDS = 0.05   # Bucket depth, in seconds of the current rate
+    WINDOW_SECONDS = 0.5   # Minimum duration of a feedback window
+    WINDOW_PROBES = 8      # Minimum finished probes in a feedback window
+    TIMEOUT_RATIO = 0.1    # Timeout ratio above which a window counts as lossy
+    MAX_TARGETS = 4096     # Per-target buckets kept before the oldest are dropped
+    
+    def __init__(self, rate: float, host_rate: Optional[float] = None,
+                 min_rate: float = 1, feedback_delay: float = 3):
+        self.feedback_delay = feedback_delay
+        self.host_rate = host_rate or rate
+        self.min_rate = min_rate
+        self.global_bucket = _AimdBucket(rate, min_rate)
+        self.targets = OrderedDict()  # host -> _AimdBucket, least recently used first
+        self.sent = 0
+        self.finished = 0
+        self.timeouts = 0
+        self.started = None
+        self.shard_stats = []  # Stats reported by --procs workers
+        self._lock = threading.Lock()
+    
+    def _target(self, host: str) -> _AimdBucket:
+        bucket = self.targets.get(host)
+        if bucket is None:
+            bucket = self.targets[host] = _AimdBucket(self.host_rate, self.min_rate)
+            if len(self.targets) > self.MAX_TARGETS:
+                self.targets.popitem(last=False)
+        else:
+            self.targets.move_to_end(host)
+        return bucket
+    
+    def try_acquire(self, host: str) -> float:
+        """
+        Take a token for a probe to host if both buckets have one.
+        
+        Returns:
+            0 when the probe may start now, otherwise the seconds to wait
+            before trying again (no token is taken)
+        """
+        with self._lock:
+            now = time.monotonic()
+            target = self._target(host)
+            wait = max(self.global_bucket.wait_time(now), target.wait_time(now))
+            if wait > 0:
+                return wait
+            self.global_bucket.tokens -= 1
+            target.tokens -= 1
+            self.sent += 1
+            if self.started is None:
+                self.started = now
+            return 0.0
+    
+    def acquire(self, host: str) -> None:
+        """Block until a probe to host may start."""
+        while True:
+            wait = self.try_acquire(host)
+            if not wait:
+                return
+            time.sleep(wait)
+    
+    async def acquire_async(self, host: str) -> None:
+        """Wait on the event loop until a probe to host may start."""
+        while True:
+            wait = self.try_acquire(host)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+    
+    def observe(self, host: str, result: dict) -> None:
+        """Feed a finished connect result back into the global and target rates."""
+        timed_out = not result["open"] and result["error"] == "Connection timed out"
+        with self._lock:
+            now = time.monotonic()
+            self.finished += 1
+            if timed_out:
+                self.timeouts += 1
+            self.global_bucket.observe(now, timed_out, result["response_time"], self.feedback_delay)
+            self._target(host).observe(now, timed_out, result["response_time"], self.feedback_delay)
+    
+    def effective_rate(self) -> float:
+        """Probes started per second since the first one."""
+        with self._lock:
+            if self.started is None:
+                return 0.0
+            elapsed = time.monotonic() - self.started
+            return self.sent / elapsed if elapsed > 0 else 0.0
+    
+    def stats(self) -> dict:
+        """Counters behind the summary, in a form that can be sent between processes."""
+        effective = self.effective_rate()
+        with self._lock:
+            return {
+                "effective": effective,
+                "rate": self.global_bucket.rate,
+                "max_rate": self.global_bucket.max_rate,
+                "decreases": self.global_bucket.decreases,
+                "throttled": sum(1 for bucket in self.targets.values() if bucket.decreases),
+                "finished": self.finished,
+                "timeouts": self.timeouts,
+            }
+    
+    def absorb(self, stats: dict) -> None:
+        """Add a --procs worker's stats; the summary then reports the workers' total."""
+        self.shard_stats.append(stats)
+    
+    def format_summary(self) -> str:
+        """One-line report of the achieved and current pacing rates."""
+        if self.shard_stats:
+            # Workers pace concurrently, so their rates and counters add up
+            stats = {key: sum(shard[key] for shard in self.shard_stats) for key in self.shard_stats[0]}
+        else:
+            stats = self.stats()
+        timeout_pct = 100 * stats["timeouts"] / stats["finished"] if stats["finished"] else 0
+        return (f"🚦 Pacing: {stats['effective']:.1f} probes/s effective, limit now "
+                f"{stats['rate']:.1f}/s (max {stats['max_rate']:g}/s), "
+                f"{stats['decreases']} global slowdown(s), "
+                f"{stats['throttled']} target(s) throttled, {timeout_pct:.1f}% timed out")
+
+
+class RttEstimator:
+    """
+    Per-host connect timeouts derived from measured round-trip times.
+    
+    Follows TCP's retransmission timer (RFC 6298): each host keeps a smoothed
+    RTT and RTT variance, fed from ping replies and from connects that were
+    answered (open or refused), and its timeout is SRTT + 4 * RTTVAR clamped
+    to [floor, ceiling]. Hosts without samples yet get the ceiling. Thread-safe.
+    """
+    
+    MAX_HOSTS = 65536  # Hosts kept before the least recently sampled are dropped
+    
+    def __init__(self, ceiling: float, floor: float = 0.1):
+        self.ceiling = ceiling
+        self.floor = min(floor, ceiling)
+        self.hosts = OrderedDict()  # host -> [srtt, rttvar] in seconds
+        self._lock = threading.Lock()
+    
+    def sample(self, host: str, rtt: float) -> None:
+        """Add one RTT measurement (seconds) for host."""
+        with self._lock:
+            state = self.hosts.get(host)
+            if state is None:
+                self.hosts[host] = [rtt, rtt / 2]
+                if len(self.hosts) > self.MAX_HOSTS:
+                    self.hosts.popitem(last=False)
+                return
+            srtt, rttvar = state
+            state[1] = 0.75 * rttvar + 0.25 * abs(srtt - rtt)
+            state[0] = 0.875 * srtt + 0.125 * rtt
+            self.hosts.move_to_end(host)
+    
+    def timeout(self, host: str) -> float:
+        """Connect timeout (seconds) to use for the next probe to host."""
+        with self._lock:
+            state = self.hosts.get(host)
+        if state is None:
+            return self.ceiling
+        srtt, rttvar = state
+        return min(self.ceiling, max(self.floor, srtt + 4 * rttvar))
+
+
+class HostResultTracker:
+    """
+    Collects ping and port results for hosts whose probes complete out of order.
+    
+    Engines register each host with the number of probes scheduled for it and
+    record results as they arrive; the tracker hands back the assembled host
+    result ({"host", "dns", "ping", "ports"}) once the last probe has been
+    recorded. Port results are kept in a compact PortStateStore rather than
+    as one dict per port. Each probe result is also passed to `on_probe` as it
+    arrives; with keep_results=False only that stream is produced and no port
+    results are retained, keeping memory flat for very large scans.
+    
+    When `stop_when(host, port, result)` returns True for a port result, the
+    host is reported at once with the results so far: its queued jobs are
+    skipped, the engine's `on_cancel(host)` hook aborts its in-flight probes,
+    and any late results for it are dropped. A host whose name does not
+    resolve is stopped the same way on its first failed probe, which is not
+    passed to `on_probe`: the failure is reported once, in the host result's
+    "dns" field, instead of once per port.
+    """
+    
+    def __init__(self, on_host_complete: Optional[Callable[[dict], None]] = None,
+                 dns: Optional[DnsCache] = None,
+                 on_probe: Optional[Callable[[str, Optional[int], dict], None]] = None,
+                 keep_results: bool = True,
+                 stop_when: Optional[Callable[[str, int, dict], bool]] = None):
+        self.on_host_complete = on_host_complete
+        self.dns = dns
+        self.on_probe = on_probe
+        self.keep_results = keep_results
+        self.stop_when = stop_when
+        self.on_cancel: Optional[Callable[[str], None]] = None
+        self.pending = {}
+        self.completed = []
+    
+    def start(self, host: str, ports: "PortSet", ping: bool = True) -> None:
+        """Register a host with the ports (and optional ping) scheduled for it."""
+        expected = len(ports) + (1 if ping else 0)
+        self.pending[host] = {
+            "result": {
+                "host": host,
+                "ping": None,
+                "ports": PortStateStore(host, ports) if self.keep_results else []
+            },
+            "remaining": expected
+        }
+        if expected == 0:
+            self._finish(host)
+    
+    def record(self, host: str, port: Optional[int], result: dict, replay: bool = False) -> None:
+        """
+        Record a ping (port is None) or port result for a host.
+        
+        With replay=True the result comes from a resumed checkpoint: it counts
+        toward the host's result but is not passed to `on_probe` again. Results
+        inherited from an earlier scan (--incremental) are counted in the host
+        result's "inherited" field.
+        """
+        state = self.pending.get(host)
+        if state is None:
+            return  # Late result for a host that was stopped early
+        if not replay and self._unresolved(host, result):
+            self._finish(host)
+            if self.on_cancel:
+                self.on_cancel(host)
+            return
+        if self.on_probe and not replay:
+            self.on_probe(host, port, result)
+        if result.get("inherited"):
+            state["result"]["inherited"] = state["result"].get("inherited", 0) + 1
+        if port is None:
+            state["result"]["ping"] = result
+        elif self.keep_results:
+            state["result"]["ports"].record(result)
+        state["remaining"] -= 1
+        stop = port is not None and self.stop_when is not None and self.stop_when(host, port, result)
+        if state["remaining"] == 0:
+            self._finish(host)
+        elif stop:
+            self._finish(host)
+            if self.on_cancel:
+                self.on_cancel(host)
+    
+    def _unresolved(self, host: str, result: dict) -> bool:
+        """Whether a failed probe only failed because the host's name did not resolve."""
+        if self.dns is None or result.get("open") or result.get("success") or result.get("inherited"):
+            return False
+        dns = self.dns.lookup(host)
+        return bool(dns and dns["error"])
+    
+    def _finish(self, host: str) -> None:
+        result = self.pending.pop(host)["result"]
+        result["dns"] = self.dns.lookup(host) if self.dns else None
+        if self.keep_results:
+            self.completed.append(result)
+        if self.on_host_complete:
+            self.on_host_complete(result)
+
+
+class HostPlan(dict):
+    """
+    Probes of one host settled before it is scanned: port (None for ping) -> result.
+    
+    Built by IncrementalPlan. Ports in `emit` hold results inherited from an
+    earlier scan that still have to be reported; the other entries were
+    reported before a checkpoint resume. Ports in `first` are probed ahead
+    of the rest of the port set.
+    """
+    
+    def __init__(self, done: Optional[dict] = None):
+        super().__init__(done or {})
+        self.emit = set()
+        self.first = []
+
+
+def iter_host_jobs(tracker: HostResultTracker, hosts: Iterable[str],
+                   ports: List[int], ping: bool = True,
+                   restored: Optional[dict] = None):
+    """
+    Lazily yield (host, port) probe jobs, registering each host with the tracker.
+    
+    A port of None denotes the host's ping job, which is yielded first. A host
+    that is still being probed is skipped if it appears again, and a host the
+    tracker stopped early gets no further jobs. Probes found in `restored`
+    (host -> {port or None: result}, from a checkpoint or an IncrementalPlan)
+    are replayed into the tracker instead of being probed again; inherited
+    results listed in a HostPlan's `emit` are reported as they are replayed.
+    """
+    if not isinstance(ports, PortSet):
+        ports = PortSet((port, port) for port in ports)
+    for host in hosts:
+        if host in tracker.pending:
+            continue
+        tracker.start(host, ports, ping)
+        done = restored.get(host) if restored is not None else None
+        plan = done if isinstance(done, HostPlan) else HostPlan()
+        if done:
+            for port, result in done.items():
+                if host in tracker.pending and (port in ports if port is not None else ping):
+                    tracker.record(host, port, result, replay=port not in plan.emit)
+        if ping and not (done and None in done):
+            yield host, None
+        if plan.first:
+            first = set(plan.first)
+            order = chain(plan.first, (port for port in ports if port not in first))
+        else:
+            order = ports
+        for port in order:
+            if host not in tracker.pending:
+                break
+            if done and port in done:
+                continue
+            yield host, port
+
 
 class NetworkChecker:
-    def __init__(self, timeout: int = 3, max_workers: int = 10):
+    FD_EXHAUSTED = (errno.EMFILE, errno.ENFILE)  # Local errors, retried instead of reported
+    
+    def __init__(self, timeout: int = 3, max_workers: int = 10, concurrency: int = 500,
+                 ping_engine: str = "auto", dns_ttl: float = 300, profile: bool = False,
+                 pacer: Optional[ProbePacer] = None, adaptive_timeout: bool = False,
+                 min_timeout: float = 0.1, retries: int = 2):
         self.timeout = timeout
         self.max_workers = max_workers
+        self.concurrency = concurrency
+        self.ping_engine = ping_engine
         self.os_type = platform.system().lower()
+        self.icmp = IcmpPinger(timeout=timeout) if ping_engine != "subprocess" else None
+        self.profiler = PhaseProfiler() if profile else None
+        self.pacer = pacer
+        self.rtt = RttEstimator(timeout, floor=min_timeout) if adaptive_timeout else None
+        self.retries = retries
+        self.dns = DnsCache(ttl=dns_ttl, profiler=self.profiler)
+    
+    def probe_timeout(self, host: str) -> float:
+        """Connect timeout for the next probe to host: adaptive when enabled, else --timeout."""
+        return self.rtt.timeout(host) if self.rtt else self.timeout
+    
+    def _retry_timeout(self, result: dict, timeout: float, attempt: int) -> Optional[float]:
+        """
+        Decide whether a timed-out connect is worth another attempt.
+        
+        Only timeouts shorter than the configured ceiling are ambiguous (the
+        host may just be slower than its RTT estimate); those are retried up
+        to `retries` times with a doubled timeout. Definite answers and
+        full-length timeouts are final.
+        
+        Returns:
+            Timeout for the retry, or None when the result is final
+        """
+        if (result["open"] or result["error"] != "Connection timed out"
+                or timeout >= self.timeout or attempt >= self.retries):
+            return None
+        return min(self.timeout, timeout * 2)
+    
+    def _profile(self, phase: str, host: str, started_ns: int) -> None:
+        """Record the time since started_ns for a phase when profiling is enabled."""
+        if self.profiler:
+            self.profiler.record(phase, host, time.perf_counter_ns() - started_ns)
+    
+    def _connect_finished(self, host: str, result: dict, started_ns: int) -> None:
+        """
+        Feed a finished connect to the profiler, pacer and RTT estimator, when enabled.
+        
+        Timed-out (SYN-dropped) connects are profiled in their own phase.
+        """
+        if self.profiler:
+            timed_out = not result["open"] and result["error"] == "Connection timed out"
+            self._profile("connect_timeout" if timed_out else "connect", host, started_ns)
+        if self.pacer:
+            self.pacer.observe(host, result)
+        if self.rtt and (result["open"] or result["error"] == "Connection refused"):
+            # An answered connect, open or refused, took one round trip
+            self.rtt.sample(host, (time.perf_counter_ns() - started_ns) / 1e9)
+    
+    def _use_icmp(self, address: Optional[str]) -> bool:
+        """Whether an address should be pinged with the in-process ICMP engine."""
+        if self.icmp is None or address is None:  # No IPv4 address: use the ping command
+            return False
+        if self.icmp.available():
+            return True
+        if self.ping_engine == "icmp":
+            raise RuntimeError(IcmpPinger.UNAVAILABLE)
+        return False
+    
+    def _ping_command(self, host: str, count: int) -> List[str]:
+        """Build the cross-platform ping command line."""
+        if self.os_type == "windows":
+            return ["ping", "-n", str(count), host]
+        return ["ping", "-c", str(count), host]
     
     def ping_host(self, host: str, count: int = 4) -> dict:
         """
@@ -30,12 +1066,25 @@ class NetworkChecker:
         Returns:
             Dictionary with ping results and statistics
         """
+        dns = self.dns.resolve(host)
+        if dns["error"]:
+            return _EchoSession.failure(host, dns["error"])
+        
+        started = time.perf_counter_ns()
+        ipv4_address = DnsCache.first_address(dns, ipv4_only=True)
+        if self._use_icmp(ipv4_address):
+            result = self.icmp.ping(host, count, address=ipv4_address)
+        else:
+            result = self._ping_subprocess(host, DnsCache.first_address(dns), count)
+        self._profile("ping", host, started)
+        if self.rtt and result.get("rtt_avg") is not None:
+            self.rtt.sample(host, result["rtt_avg"] / 1000)
+        return result
+    
+    def _ping_subprocess(self, host: str, address: str, count: int) -> dict:
+        """Ping an address with the system ping command."""
         try:
-            # Cross-platform ping command
-            if self.os_type == "windows":
-                cmd = ["ping", "-n", str(count), host]
-            else:
-                cmd = ["ping", "-c", str(count), host]
+            cmd = self._ping_command(address, count)
             
             start_time = time.time()
             result = subprocess.run(
@@ -80,6 +1129,9 @@ class NetworkChecker:
         """
         Check if a specific port is open on a host.
         
+        The host is resolved through the scan's DNS cache and the first
+        address is probed, so response_time covers the TCP connect only.
+        
         Args:
             host: Hostname or IP address
             port: Port number to check
@@ -87,9 +1139,44 @@ class NetworkChecker:
         Returns:
             Dictionary with port check results
         """
+        dns = self.dns.resolve(host)
+        if dns["error"]:
+            return {
+                "host": host,
+                "port": port,
+                "open": False,
+                "error": dns["error"],
+                "response_time": 0
+            }
+        
+        timeout = self.probe_timeout(host)
+        attempt = 0
+        while True:
+            if self.pacer:
+                self.pacer.acquire(host)
+            started = time.perf_counter_ns()
+            try:
+                result = self._connect(host, port, DnsCache.first_address(dns), timeout)
+            except OSError:  # Out of file descriptors: wait for other probes to release some
+                time.sleep(0.05)
+                continue
+            self._connect_finished(host, result, started)
+            timeout = self._retry_timeout(result, timeout, attempt)
+            if timeout is None:
+                return result
+            attempt += 1
+    
+    def _connect(self, host: str, port: int, address: str, timeout: float) -> dict:
+        """
+        Attempt one blocking TCP connect to a resolved address.
+        
+        Raises:
+            OSError: If this process is out of file descriptors (FD_EXHAUSTED),
+                which says nothing about the port
+        """
         try:
             start_time = time.time()
-            with socket.create_connection((host, port), timeout=self.timeout):
+            with socket.create_connection((address, port), timeout=timeout):
                 end_time = time.time()
                 return {
                     "host": host,
@@ -104,7 +1191,7 @@ class NetworkChecker:
                 "port": port,
                 "open": False,
                 "error": "Connection timed out",
-                "response_time": self.timeout * 1000
+                "response_time": timeout * 1000
             }
         except ConnectionRefusedError:
             return {
@@ -123,6 +1210,8 @@ class NetworkChecker:
                 "response_time": 0
             }
         except Exception as e:
+            if getattr(e, "errno", None) in self.FD_EXHAUSTED:
+                raise
             return {
                 "host": host,
                 "port": port,
@@ -155,69 +1244,2660 @@ class NetworkChecker:
         # Sort results by port number
         return sorted(results, key=lambda x: x['port'])
     
-    def format_ping_results(self, ping_result: dict) -> str:
-        """Format ping results for display."""
-        if ping_result["success"]:
-            status = "✓ REACHABLE"
-            color = "\033[92m"  # Green
-        else:
-            status = "✗ UNREACHABLE"
-            color = "\033[91m"  # Red
+    def scan_hosts_parallel(self, hosts: Iterable[str], ports: List[int],
+                            ping_count: int = 4, ping: bool = True,
+                            on_host_complete: Optional[Callable[[dict], None]] = None,
+                            on_probe: Optional[Callable[[str, Optional[int], dict], None]] = None,
+                            keep_results: bool = True,
+                            stop_when: Optional[Callable[[str, int, dict], bool]] = None,
+                            restored: Optional[dict] = None) -> List[dict]:
+        """
+        Interleave ping and port probes from all hosts under one worker budget.
         
-        reset = "\033[0m"
+        Jobs are drawn lazily from every host and submitted to a single thread
+        pool of `max_workers` threads, keeping at most two jobs per worker
+        queued. A slow ping or filtered port on one host therefore only ties up
+        one worker instead of blocking every host behind it.
         
-        output = f"{color}{status}{reset} ({ping_result['duration']}s)"
+        Args:
+            hosts: Target hostnames or IPs
+            ports: Port numbers to check on every host
+            ping_count: Number of ping packets to send per host
+            ping: Whether to ping each host
+            on_host_complete: Optional callback receiving each finished host result
+            on_probe: Optional callback receiving (host, port, result) for every probe
+                (port is None for pings) as soon as it completes
+            keep_results: Whether to retain port results for the returned host results
+            stop_when: Optional predicate receiving (host, port, result); once it
+                returns True the host's remaining probes are skipped or cancelled
+            restored: Optional checkpointed results (host -> {port or None: result})
+                that are replayed instead of probed
+            
+        Returns:
+            List of host results ({"host", "dns", "ping", "ports"}) in completion order
+        """
+        tracker = HostResultTracker(on_host_complete, dns=self.dns, on_probe=on_probe,
+                                    keep_results=keep_results, stop_when=stop_when)
+        job_iter = iter_host_jobs(tracker, hosts, ports, ping, restored)
+        max_in_flight = max(1, self.max_workers) * 2
         
-        if ping_result["error"]:
-            output += f"\n    Error: {ping_result['error']}"
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+            in_flight = {}
+            
+            def submit_next() -> bool:
+                for host, port in job_iter:
+                    if port is None:
+                        future = executor.submit(self.ping_host, host, ping_count)
+                    else:
+                        future = executor.submit(self.check_port, host, port)
+                    in_flight[future] = (host, port)
+                    return True
+                return False
+            
+            def cancel_host(host):
+                # Queued probes are dropped; running blocking connects finish and are ignored
+                for future, (job_host, _) in in_flight.items():
+                    if job_host == host:
+                        future.cancel()
+            
+            tracker.on_cancel = cancel_host
+            while len(in_flight) < max_in_flight and submit_next():
+                pass
+            
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                # In submission order, so a single worker reports probes as they were queued
+                for future in [future for future in in_flight if future in done]:
+                    host, port = in_flight.pop(future)
+                    if not future.cancelled():
+                        tracker.record(host, port, future.result())
+                while len(in_flight) < max_in_flight and submit_next():
+                    pass
         
-        return output
+        return tracker.completed
     
-    def format_port_results(self, port_results: List[dict]) -> str:
-        """Format port scan results for display."""
-        if not port_results:
-            return ""
-        
-        output = []
-        open_ports = []
-        closed_ports = []
-        
-        for result in port_results:
-            if result["open"]:
-                open_ports.append(f"{result['port']} ({result['response_time']}ms)")
-            else:
-                error_msg = f" - {result['error']}" if result['error'] else ""
-                closed_ports.append(f"{result['port']}{error_msg}")
-        
-        if open_ports:
-            output.append(f"    \033[92m✓ OPEN PORTS:\033[0m {', '.join(open_ports)}")
+    async def ping_host_async(self, host: str, count: int = 4) -> dict:
+        """
+        Asyncio counterpart of ping_host; returns the same result dict.
         
-        if closed_ports:
-            output.append(f"    \033[91m✗ CLOSED PORTS:\033[0m {', '.join(closed_ports)}")
+        Args:
+            host: Hostname or IP address to ping
+            count: Number of ping packets to send
+            
+        Returns:
+            Dictionary with ping results and statistics
+        """
+        dns = await self.dns.resolve_async(host)
+        if dns["error"]:
+            return _EchoSession.failure(host, dns["error"])
         
-        return "\n".join(output)
-
-def parse_port_ranges(port_input: str) -> List[int]:
-    """
-    Parse port input supporting ranges (e.g., "80,443,8000-8010").
+        started = time.perf_counter_ns()
+        ipv4_address = DnsCache.first_address(dns, ipv4_only=True)
+        if self._use_icmp(ipv4_address):
+            result = await self.icmp.ping_async(host, count, address=ipv4_address)
+        else:
+            result = await self._ping_subprocess_async(host, DnsCache.first_address(dns), count)
+        self._profile("ping", host, started)
+        if self.rtt and result.get("rtt_avg") is not None:
+            self.rtt.sample(host, result["rtt_avg"] / 1000)
+        return result
     
-    Args:
-        port_input: String containing ports and ranges
+    async def _ping_subprocess_async(self, host: str, address: str, count: int) -> dict:
+        """Ping an address with the system ping command without blocking the loop."""
+        proc = None
+        start_time = time.time()
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *self._ping_command(address, count),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await asyncio.wait_for(
+                proc.communicate(), timeout=self.timeout * count
+            )
+            end_time = time.time()
+            
+            return {
+                "host": host,
+                "success": proc.returncode == 0,
+                "output": stdout.decode(errors="replace").strip(),
+                "error": stderr.decode(errors="replace").strip() if stderr else None,
+                "duration": round(end_time - start_time, 2),
+                "return_code": proc.returncode
+            }
+            
+        except asyncio.CancelledError:
+            if proc is not None and proc.returncode is None:
+                proc.kill()
+            raise
+        except asyncio.TimeoutError:
+            if proc is not None and proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            return {
+                "host": host,
+                "success": False,
+                "output": "",
+                "error": f"Ping timed out after {self.timeout * count} seconds",
+                "duration": self.timeout * count,
+                "return_code": -1
+            }
+        except Exception as e:
+            return {
+                "host": host,
+                "success": False,
+                "output": "",
+                "error": f"Ping error: {str(e)}",
+                "duration": 0,
+                "return_code": -1
+            }
+    
+    async def check_port_async(self, host: str, port: int) -> dict:
+        """
+        Asyncio counterpart of check_port; returns the same result dict.
+        
+        Args:
+            host: Hostname or IP address
+            port: Port number to check
+            
+        Returns:
+            Dictionary with port check results
+        """
+        dns = await self.dns.resolve_async(host)
+        if dns["error"]:
+            return {
+                "host": host,
+                "port": port,
+                "open": False,
+                "error": dns["error"],
+                "response_time": 0
+            }
+        
+        timeout = self.probe_timeout(host)
+        attempt = 0
+        while True:
+            if self.pacer:
+                await self.pacer.acquire_async(host)
+            started = time.perf_counter_ns()
+            try:
+                result = await self._connect_async(host, port, DnsCache.first_address(dns), timeout)
+            except OSError:  # Out of file descriptors: wait for other probes to release some
+                await asyncio.sleep(0.05)
+                continue
+            self._connect_finished(host, result, started)
+            timeout = self._retry_timeout(result, timeout, attempt)
+            if timeout is None:
+                return result
+            attempt += 1
+    
+    async def _connect_async(self, host: str, port: int, address: str, timeout: float) -> dict:
+        """
+        Attempt one TCP connect to a resolved address on the event loop.
+        
+        Raises:
+            OSError: If this process is out of file descriptors (FD_EXHAUSTED),
+                which says nothing about the port
+        """
+        try:
+            start_time = time.time()
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(address, port), timeout=timeout
+            )
+            end_time = time.time()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass  # Reset while closing; the connect itself succeeded
+            return {
+                "host": host,
+                "port": port,
+                "open": True,
+                "error": None,
+                "response_time": round((end_time - start_time) * 1000, 2)  # ms
+            }
+        except asyncio.TimeoutError:
+            return {
+                "host": host,
+                "port": port,
+                "open": False,
+                "error": "Connection timed out",
+                "response_time": timeout * 1000
+            }
+        except ConnectionRefusedError:
+            return {
+                "host": host,
+                "port": port,
+                "open": False,
+                "error": "Connection refused",
+                "response_time": 0
+            }
+        except socket.gaierror as e:
+            return {
+                "host": host,
+                "port": port,
+                "open": False,
+                "error": f"DNS resolution failed: {str(e)}",
+                "response_time": 0
+            }
+        except Exception as e:
+            if getattr(e, "errno", None) in self.FD_EXHAUSTED:
+                raise
+            return {
+                "host": host,
+                "port": port,
+                "open": False,
+                "error": str(e),
+                "response_time": 0
+            }
+    
+    async def scan_hosts_async(self, hosts: Iterable[str], ports: List[int],
+                               ping_count: int = 4, ping: bool = True,
+                               on_host_complete: Optional[Callable[[dict], None]] = None,
+                               on_probe: Optional[Callable[[str, Optional[int], dict], None]] = None,
+                               keep_results: bool = True,
+                               stop_when: Optional[Callable[[str, int, dict], bool]] = None,
+                               restored: Optional[dict] = None) -> List[dict]:
+        """
+        Probe every host x port pair (plus optional pings) concurrently.
+        
+        A fixed pool of `concurrency` worker tasks pulls jobs from a shared
+        generator, so the number of in-flight probes never exceeds the global
+        limit and jobs are only materialized as workers become free. A host is
+        reported through `on_host_complete` as soon as its last probe finishes,
+        independent of slower hosts.
+        
+        Args:
+            hosts: Target hostnames or IPs
+            ports: Port numbers to check on every host
+            ping_count: Number of ping packets to send per host
+            ping: Whether to ping each host
+            on_host_complete: Optional callback receiving each finished host result
+            on_probe: Optional callback receiving (host, port, result) for every probe
+                (port is None for pings) as soon as it completes
+            keep_results: Whether to retain port results for the returned host results
+            stop_when: Optional predicate receiving (host, port, result); once it
+                returns True the host's remaining probes are skipped or cancelled
+            restored: Optional checkpointed results (host -> {port or None: result})
+                that are replayed instead of probed
+            
+        Returns:
+            List of host results ({"host", "dns", "ping", "ports"}) in completion order
+        """
+        tracker = HostResultTracker(on_host_complete, dns=self.dns, on_probe=on_probe,
+                                    keep_results=keep_results, stop_when=stop_when)
+        job_iter = iter_host_jobs(tracker, hosts, ports, ping, restored)
+        
+        in_flight = {}  # host -> set of probe tasks
+        
+        def cancel_host(host):
+            for task in in_flight.pop(host, ()):
+                task.cancel()
+        
+        tracker.on_cancel = cancel_host
+        
+        async def worker():
+            for host, port in job_iter:
+                if port is None:
+                    task = asyncio.ensure_future(self.ping_host_async(host, ping_count))
+                else:
+                    task = asyncio.ensure_future(self.check_port_async(host, port))
+                in_flight.setdefault(host, set()).add(task)
+                await asyncio.wait({task})
+                in_flight.get(host, set()).discard(task)
+                if not in_flight.get(host, True):
+                    del in_flight[host]
+                if not task.cancelled():
+                    tracker.record(host, port, task.result())
+        
+        # Every in-flight connect holds a socket, so stay within the open-file limit
+        workers = self._raise_fd_limit(max(1, self.concurrency))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        return tracker.completed
+    
+    @staticmethod
+    def _raise_fd_limit(wanted: int) -> int:
+        """
+        Raise the soft open-file limit towards `wanted` where the OS allows it.
+        
+        Returns:
+            Number of sockets the scanner may keep open at once
+        """
+        try:
+            import resource
+        except ImportError:  # Windows: select() itself caps the socket count
+            return min(wanted, 500)
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        target = wanted + 64  # Headroom for stdio, the selector and DNS threads
+        if soft != resource.RLIM_INFINITY and soft < target:
+            new_soft = target if hard == resource.RLIM_INFINITY else min(target, hard)
+            try:
+                resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+                soft = new_soft
+            except (ValueError, OSError):
+                pass
+        if soft == resource.RLIM_INFINITY:
+            return wanted
+        return max(1, min(wanted, soft - 64))
+    
+    def _connect_result(self, host: str, port: int, code: int, elapsed: float,
+                        timeout: Optional[float] = None) -> dict:
+        """Build a check_port-style result from a connect() errno."""
+        if code == 0:
+            return {
+                "host": host,
+                "port": port,
+                "open": True,
+                "error": None,
+                "response_time": round(elapsed * 1000, 2)  # ms
+            }
+        if code == errno.ECONNREFUSED:
+            error = "Connection refused"
+        elif code == errno.ETIMEDOUT:
+            error = "Connection timed out"
+        else:
+            error = os.strerror(code)
+        return {
+            "host": host,
+            "port": port,
+            "open": False,
+            "error": error,
+            "response_time": (timeout or self.timeout) * 1000 if code == errno.ETIMEDOUT else 0
+        }
+    
+    def scan_hosts_selector(self, hosts: Iterable[str], ports: List[int],
+                            ping_count: int = 4, ping: bool = True,
+                            on_host_complete: Optional[Callable[[dict], None]] = None,
+                            on_probe: Optional[Callable[[str, Optional[int], dict], None]] = None,
+                            keep_results: bool = True,
+                            stop_when: Optional[Callable[[str, int, dict], bool]] = None,
+                            restored: Optional[dict] = None) -> List[dict]:
+        """
+        Probe every host x port pair with non-blocking connects on one thread.
+        
+        Up to `concurrency` connects are started in bulk and driven by the
+        `selectors` module (epoll on Linux). Each probe is classified when its
+        socket becomes writable, from SO_ERROR: open, refused, or another
+        error; probes still pending at their deadline (the host's probe
+        timeout) are reported as timed out (filtered). Memory stays flat as
+        only the in-flight sockets are held. Pings run on a small side pool
+        of `max_workers` threads.
+        
+        Args:
+            hosts: Target hostnames or IPs
+            ports: Port numbers to check on every host
+            ping_count: Number of ping packets to send per host
+            ping: Whether to ping each host
+            on_host_complete: Optional callback receiving each finished host result
+            on_probe: Optional callback receiving (host, port, result) for every probe
+                (port is None for pings) as soon as it completes
+            keep_results: Whether to retain port results for the returned host results
+            stop_when: Optional predicate receiving (host, port, result); once it
+                returns True the host's remaining probes are skipped or cancelled
+            restored: Optional checkpointed results (host -> {port or None: result})
+                that are replayed instead of probed
+            
+        Returns:
+            List of host results ({"host", "dns", "ping", "ports"}) in completion order
+        """
+        tracker = HostResultTracker(on_host_complete, dns=self.dns, on_probe=on_probe,
+                                    keep_results=keep_results, stop_when=stop_when)
+        job_iter = iter_host_jobs(tracker, hosts, ports, ping, restored)
+        limit = self._raise_fd_limit(max(1, self.concurrency))
+        in_progress = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY, 10035)  # 10035: WSAEWOULDBLOCK
+        
+        selector = selectors.DefaultSelector()
+        deadlines = []          # Heap of (deadline, id(sock), sock); per-host timeouts differ
+        awaiting_dns = deque()  # (host, port, dns future, attempt, timeout or None)
+        pings = {}              # ping future -> host
+        jobs_left = True
+        
+        def start_probe(host, port, dns, attempt, timeout):
+            if dns["error"]:
+                tracker.record(host, port, {
+                    "host": host, "port": port, "open": False,
+                    "error": dns["error"], "response_time": 0
+                })
+                return
+            address = DnsCache.first_address(dns)
+            family = socket.AF_INET6 if ":" in address else socket.AF_INET
+            try:
+                sock = socket.socket(family, socket.SOCK_STREAM)
+            except OSError as e:
+                if e.errno in self.FD_EXHAUSTED:
+                    # Not a port state: try again once other connects have released sockets
+                    awaiting_dns.append((host, port, self.dns.submit(host), attempt, timeout))
+                else:
+                    tracker.record(host, port, self._connect_result(host, port, e.errno or errno.EIO, 0))
+                return
+            sock.setblocking(False)
+            if timeout is None:
+                timeout = self.probe_timeout(host)
+            started = time.perf_counter_ns()
+            code = sock.connect_ex((address, port))
+            if code in in_progress:
+                selector.register(sock, selectors.EVENT_WRITE, (host, port, started, attempt, timeout))
+                heapq.heappush(deadlines, (time.perf_counter() + timeout, id(sock), sock))
+            else:
+                sock.close()
+                complete_probe(host, port, code, started, attempt, timeout)
+        
+        def complete_probe(host, port, code, started, attempt, timeout):
+            result = self._connect_result(host, port, code, (time.perf_counter_ns() - started) / 1e9, timeout)
+            self._connect_finished(host, result, started)
+            retry_timeout = self._retry_timeout(result, timeout, attempt)
+            if retry_timeout is not None:
+                awaiting_dns.append((host, port, self.dns.submit(host), attempt + 1, retry_timeout))
+            else:
+                tracker.record(host, port, result)
+        
+        def finish_probe(sock, code):
+            host, port, started, attempt, timeout = selector.unregister(sock).data
+            sock.close()
+            complete_probe(host, port, code, started, attempt, timeout)
+        
+        def cancel_host(host):
+            # Close the host's connects in flight; their deadline entries go stale
+            for key in list(selector.get_map().values()):
+                if key.data[0] == host:
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+            for _ in range(len(awaiting_dns)):
+                entry = awaiting_dns.popleft()
+                if entry[0] != host:
+                    awaiting_dns.append(entry)
+            for future, ping_host in pings.items():
+                if ping_host == host:
+                    future.cancel()
+        
+        tracker.on_cancel = cancel_host
+        
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as ping_pool:
+            while True:
+                # Top up with new jobs while below the in-flight limit
+                while jobs_left and len(selector.get_map()) + len(awaiting_dns) < limit:
+                    job = next(job_iter, None)
+                    if job is None:
+                        jobs_left = False
+                        break
+                    host, port = job
+                    if port is None:
+                        pings[ping_pool.submit(self.ping_host, host, ping_count)] = host
+                    else:
+                        awaiting_dns.append((host, port, self.dns.submit(host), 0, None))
+                
+                # Start probes (and retries) whose host name has resolved and whose pacing allows it
+                pace_wait = None
+                for _ in range(len(awaiting_dns)):
+                    if not awaiting_dns:
+                        break  # Emptied by a host stopping early
+                    entry = awaiting_dns.popleft()
+                    host, port, future, attempt, timeout = entry
+                    if future.done() and self.pacer and not future.result()["error"]:
+                        wait = self.pacer.try_acquire(host)
+                        if wait:
+                            pace_wait = wait if pace_wait is None else min(pace_wait, wait)
+                            awaiting_dns.append(entry)
+                            continue
+                    if future.done():
+                        start_probe(host, port, future.result(), attempt, timeout)
+                    else:
+                        awaiting_dns.append(entry)
+                
+                for future in [f for f in pings if f.done()]:
+                    host = pings.pop(future)
+                    if not future.cancelled():
+                        tracker.record(host, None, future.result())
+                
+                if not (jobs_left or selector.get_map() or awaiting_dns or pings):
+                    break
+                
+                # Wait for connects to complete, the next deadline, or pending DNS/pings
+                now = time.perf_counter()
+                wait_for = deadlines[0][0] - now if deadlines else 0.05
+                if awaiting_dns or pings:
+                    wait_for = min(wait_for, 0.05, pace_wait or 0.05)
+                if selector.get_map():
+                    for key, _ in selector.select(max(0, wait_for)):
+                        if key.fileobj.fileno() == -1:
+                            continue  # Cancelled by a host stopping early
+                        code = key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                        finish_probe(key.fileobj, code)
+                elif wait_for > 0:
+                    time.sleep(wait_for)
+                
+                # Expire probes that passed their deadline
+                now = time.perf_counter()
+                while deadlines and deadlines[0][0] <= now:
+                    _, _, sock = heapq.heappop(deadlines)
+                    if sock.fileno() != -1:
+                        finish_probe(sock, errno.ETIMEDOUT)
+                while deadlines and deadlines[0][2].fileno() == -1:
+                    heapq.heappop(deadlines)
+        
+        selector.close()
+        return tracker.completed
+    
+    def format_ping_results(self, ping_result: dict) -> str:
+        """Format ping results for display."""
+        if ping_result["success"]:
+            status = "✓ REACHABLE"
+            color = "\033[92m"  # Green
+        else:
+            status = "✗ UNREACHABLE"
+            color = "\033[91m"  # Red
+        
+        reset = "\033[0m"
+        
+        output = f"{color}{status}{reset} ({ping_result['duration']}s)"
+        
+        if ping_result.get("rtt_avg") is not None:
+            output += (f" rtt min/avg/max {ping_result['rtt_min']}/{ping_result['rtt_avg']}/"
+                       f"{ping_result['rtt_max']} ms, {ping_result['packet_loss']}% loss")
+        
+        if ping_result["error"]:
+            output += f"\n    Error: {ping_result['error']}"
+        
+        return output
+    
+    def format_dns_results(self, dns_result: dict) -> str:
+        """Format a host's DNS resolution for display."""
+        if dns_result["error"]:
+            return f"\033[91m✗ {dns_result['error']}\033[0m"
+        return f"{', '.join(dns_result['addresses'])} ({dns_result['dns_time']}ms)"
+    
+    def format_port_results(self, port_results: List[dict]) -> str:
+        """Format port scan results for display."""
+        if not port_results:
+            return ""
+        
+        output = []
+        open_ports = []
+        closed_ports = []
+        unresolved = 0
+        
+        for result in port_results:
+            if result["open"]:
+                open_ports.append(f"{result['port']} ({result['response_time']}ms)")
+            elif result["error"] and result["error"].startswith("DNS resolution failed"):
+                # Reported once per host rather than once per port
+                unresolved += 1
+            else:
+                error_msg = f" - {result['error']}" if result['error'] else ""
+                closed_ports.append(f"{result['port']}{error_msg}")
+        
+        if open_ports:
+            output.append(f"    \033[92m✓ OPEN PORTS:\033[0m {', '.join(open_ports)}")
+        
+        if closed_ports:
+            output.append(f"    \033[91m✗ CLOSED PORTS:\033[0m {', '.join(closed_ports)}")
+        
+        if unresolved:
+            output.append(f"    \033[91m✗ NOT PROBED:\033[0m {unresolved} port(s) - host name did not resolve")
+        
+        return "\n".join(output)
+
+class NdjsonWriter:
+    """
+    Streams probe results as newline-delimited JSON, one record per probe.
+    
+    Records are buffered and written out every `batch_size` records or
+    `flush_interval` seconds, whichever comes first, so consumers see results
+    live without a syscall per probe. Output goes to stdout or a file, and
+    is gzip-compressed when requested or when the file name ends in ".gz".
+    Not thread-safe; the scan engines report probes from a single thread.
+    """
+    
+    def __init__(self, path: Optional[str] = None, compress: bool = False,
+                 batch_size: int = 500, flush_interval: float = 1.0, append: bool = False):
+        compress = compress or bool(path and path.endswith(".gz"))
+        # Appending to a .gz file adds a gzip member; readers decompress them back to back
+        self._raw = open(path, "ab" if append else "wb") if path else sys.stdout.buffer
+        self._gzip = gzip.GzipFile(fileobj=self._raw, mode="wb") if compress else None
+        self.stream = io.TextIOWrapper(self._gzip or self._raw, encoding="utf-8",
+                                       newline="\n", write_through=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.records_written = 0
+        self._buffer = []
+        self._last_flush = time.monotonic()
+    
+    @staticmethod
+    def probe_record(host: str, port: Optional[int], result: dict) -> dict:
+        """Build the NDJSON record for one ping (port is None) or port probe."""
+        record = {"type": "ping" if port is None else "port",
+                  "timestamp": datetime.now(timezone.utc).isoformat()}
+        record.update(result)
+        record["host"] = host
+        return record
+    
+    @staticmethod
+    def dns_record(host_result: dict) -> Optional[dict]:
+        """Build the one NDJSON record of a host whose name did not resolve, else None."""
+        dns = host_result.get("dns")
+        if not dns or not dns["error"]:
+            return None
+        return {
+            "type": "dns",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "host": host_result["host"],
+            "error": dns["error"],
+            "dns_time": dns["dns_time"]
+        }
+    
+    def write_probe(self, host: str, port: Optional[int], result: dict) -> None:
+        """Queue one probe result; usable directly as an engine on_probe callback."""
+        self.write(self.probe_record(host, port, result))
+    
+    def write(self, record: dict) -> None:
+        """Queue one record, flushing when the batch is full or due."""
+        self._buffer.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        if (len(self._buffer) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+    
+    def flush(self) -> None:
+        """Write out buffered records and push them to the underlying stream."""
+        if self._buffer:
+            self.stream.write("\n".join(self._buffer) + "\n")
+            self.records_written += len(self._buffer)
+            self._buffer.clear()
+        if self._gzip:
+            self._gzip.flush()
+        self._raw.flush()
+        self._last_flush = time.monotonic()
+    
+    def close(self) -> None:
+        """Flush remaining records and close the output (stdout stays open)."""
+        self.flush()
+        self.stream.detach()
+        if self._gzip:
+            self._gzip.close()
+        if self._raw is not sys.stdout.buffer:
+            self._raw.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+class CheckpointJournal:
+    """
+    Append-only journal of finished probes, for resuming interrupted scans.
+    
+    Each finished probe is one compact JSON line: [host, port, open,
+    response_time, error] for ports, plus the original check time for
+    results inherited by --incremental, or [host, null, ping result] for pings.
+    It goes after a header line that records the port set and ping setting.
+    Lines are buffered and written out every `flush_interval` seconds or
+    `batch_size` probes. Registered flush hooks (e.g. the NDJSON writer)
+    run first, so the journal never claims a probe whose output was not
+    written yet. On resume, the journal is read back into `restored`
+    (host -> {port or None: result}). A truncated last line, left by a hard
+    kill, is ignored. Thread-safe.
+    """
+    
+    VERSION = 1
+    
+    def __init__(self, path: str, ports: "PortSet", ping: bool, resume: bool = False,
+                 flush_interval: float = 5.0, batch_size: int = 1000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.flush_hooks: List[Callable[[], None]] = []
+        self.restored = {}
+        header = {"pingport_journal": self.VERSION, "ports": str(ports), "ping": ping}
+        if resume and os.path.exists(path):
+            self._load(header)
+            self._file = open(path, "a", encoding="utf-8")
+        else:
+            self._file = open(path, "w", encoding="utf-8")
+            self._file.write(json.dumps(header) + "\n")
+            self._file.flush()
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _load(self, header: dict) -> None:
+        with open(self.path, encoding="utf-8") as f:
+            first = f.readline()
+            try:
+                recorded = json.loads(first)
+            except ValueError:
+                recorded = None
+            if not isinstance(recorded, dict) or recorded.get("pingport_journal") != self.VERSION:
+                raise ValueError(f"{self.path} is not a pingport checkpoint journal")
+            if recorded["ports"] != header["ports"] or recorded["ping"] != header["ping"]:
+                raise ValueError(f"{self.path} was written for ports {recorded['ports']} "
+                                 f"(ping {'on' if recorded['ping'] else 'off'}); "
+                                 f"resume with the same ports and ping setting")
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # Torn final line from an interrupted write
+                host, port = entry[0], entry[1]
+                if port is None:
+                    result = entry[2]
+                else:
+                    result = {"host": host, "port": port, "open": bool(entry[2]),
+                              "error": entry[4], "response_time": entry[3]}
+                    if len(entry) > 5:
+                        result.update(inherited=True, checked_at=entry[5])
+                self.restored.setdefault(host, {})[port] = result
+    
+    @property
+    def restored_probes(self) -> int:
+        return sum(len(done) for done in self.restored.values())
+    
+    def record_probe(self, host: str, port: Optional[int], result: dict) -> None:
+        """Journal one finished probe; usable directly as an on_probe callback."""
+        if port is None:
+            entry = [host, None, result]
+        else:
+            entry = [host, port, int(result["open"]), result["response_time"], result["error"]]
+            if result.get("inherited"):
+                entry.append(result["checked_at"])
+        with self._lock:
+            self._buffer.append(json.dumps(entry, separators=(",", ":")))
+            if (len(self._buffer) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+    
+    def _flush_locked(self, run_hooks: bool = True) -> None:
+        for hook in self.flush_hooks if run_hooks else ():
+            hook()
+        if self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._buffer.clear()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_flush = time.monotonic()
+    
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+    
+    def close(self) -> None:
+        """Write out buffered entries; outputs with flush hooks must already be closed."""
+        with self._lock:
+            if not self._file.closed:
+                self._flush_locked(run_hooks=False)
+                self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PortSet:
+    """
+    Ordered, de-duplicated set of ports stored as merged ranges.
+    
+    Iterating yields ports lazily in ascending order, so "1-65535" costs a
+    single range object rather than a 65k-element list, while len() and
+    membership tests stay O(number of ranges).
+    """
+    
+    def __init__(self, ranges: Iterable[Tuple[int, int]] = ()):
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        self.ranges = [range(start, end + 1) for start, end in merged]
+        self._starts = [r.start for r in self.ranges]
+        self._offsets = []  # Index of each range's first port within the set
+        offset = 0
+        for r in self.ranges:
+            self._offsets.append(offset)
+            offset += len(r)
+    
+    @classmethod
+    def parse(cls, port_input: str, ports: Iterable[int] = ()) -> "PortSet":
+        """
+        Build a PortSet from a range expression plus individual ports.
+        
+        Args:
+            port_input: String containing ports and ranges (e.g., "80,443,8000-8010")
+            ports: Additional individual port numbers
+            
+        Raises:
+            ValueError: If a port is malformed or outside 1-65535
+        """
+        bounds = [(port, port) for port in ports]
+        for part in port_input.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if '-' in part:
+                start, end = map(int, part.split('-', 1))
+            else:
+                start = end = int(part)
+            bounds.append((start, end))
+        for start, end in bounds:
+            if not 1 <= start <= end <= 65535:
+                raise ValueError(f"invalid port or range: {start}-{end}" if start != end else f"invalid port: {start}")
+        return cls(bounds)
+    
+    def __iter__(self) -> Iterator[int]:
+        return chain.from_iterable(self.ranges)
+    
+    def __len__(self) -> int:
+        return sum(len(r) for r in self.ranges)
+    
+    def __contains__(self, port: int) -> bool:
+        return any(port in r for r in self.ranges)
+    
+    def __str__(self) -> str:
+        return ", ".join(str(r.start) if len(r) == 1 else f"{r.start}-{r[-1]}" for r in self.ranges)
+    
+    def index(self, port: int) -> int:
+        """Position of a port within the set (its bit in a PortStateStore)."""
+        i = bisect_right(self._starts, port) - 1
+        if i < 0 or port not in self.ranges[i]:
+            raise ValueError(f"port {port} is not in the set")
+        return self._offsets[i] + port - self._starts[i]
+    
+    def port_at(self, index: int) -> int:
+        """Port at a position within the set; inverse of index()."""
+        i = bisect_right(self._offsets, index) - 1
+        return self._starts[i] + index - self._offsets[i]
+    
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PortSet) and self.ranges == other.ranges
+
+class PrioritizedPortSet(PortSet):
+    """
+    PortSet that iterates common service ports first, then the rest ascending.
+    
+    Used by health checks, where the first answering port settles the result:
+    probing 443 and 80 before 1-79 makes an early decision far more likely.
+    """
+    
+    # Most frequently open TCP ports, most likely first
+    COMMON_PORTS = (443, 80, 22, 8080, 8443, 3389, 21, 25, 53, 110, 143, 993, 995,
+                    3306, 5432, 1433, 1521, 6379, 27017, 9200, 5900, 445, 139, 23)
+    
+    def __iter__(self) -> Iterator[int]:
+        first = [port for port in self.COMMON_PORTS if port in self]
+        yield from first
+        skip = set(first)
+        for port in super().__iter__():
+            if port not in skip:
+                yield port
+
+class PortStateStore:
+    """
+    Compact per-host port results: state bitsets plus a response-time array.
+    
+    Each port of the scan's PortSet owns one bit in the open, closed and
+    filtered bitsets and one float32 slot in the response-time array, so a
+    full 65,535-port host costs about 280KB instead of 65k dicts. Error strings
+    are kept in a sparse side-table; the common "Connection refused" and
+    "Connection timed out" cases are implied by the state. Iterating renders
+    the check_port dict form on demand, in port order.
+    """
+    
+    OPEN = "open"
+    CLOSED = "closed"
+    FILTERED = "filtered"
+    STATES = (OPEN, CLOSED, FILTERED)
+    IMPLIED_ERRORS = {CLOSED: "Connection refused", FILTERED: "Connection timed out"}
+    
+    def __init__(self, host: str, ports: PortSet):
+        self.host = host
+        self.ports = ports
+        size = len(ports)
+        self.bits = {state: bytearray((size + 7) // 8) for state in self.STATES}
+        self.response_times = array('f', bytes(4 * size))  # ms
+        self.errors = {}  # port -> error string, only where not implied by the state
+    
+    @classmethod
+    def classify(cls, result: dict) -> str:
+        """Map a check_port result to open, closed (refused/error) or filtered (timed out)."""
+        if result["open"]:
+            return cls.OPEN
+        if result["error"] and "timed out" in result["error"]:
+            return cls.FILTERED
+        return cls.CLOSED
+    
+    def record(self, result: dict) -> None:
+        """Store one check_port result."""
+        port = result["port"]
+        index = self.ports.index(port)
+        byte, mask = index >> 3, 1 << (index & 7)
+        state = self.classify(result)
+        for name, bits in self.bits.items():
+            if name == state:
+                bits[byte] |= mask
+            else:
+                bits[byte] &= ~mask & 0xFF
+        self.response_times[index] = result["response_time"] or 0
+        if result["error"] and result["error"] != self.IMPLIED_ERRORS.get(state):
+            self.errors[port] = result["error"]
+        else:
+            self.errors.pop(port, None)
+    
+    def _indices(self, bits: bytearray) -> Iterator[int]:
+        for byte_index, byte in enumerate(bits):
+            if byte:
+                base = byte_index << 3
+                for bit in range(8):
+                    if byte >> bit & 1:
+                        yield base + bit
+    
+    def state(self, port: int) -> Optional[str]:
+        """State of a port, or None if it was not probed."""
+        index = self.ports.index(port)
+        for name, bits in self.bits.items():
+            if bits[index >> 3] >> (index & 7) & 1:
+                return name
+        return None
+    
+    def ports_in(self, state: str) -> Iterator[int]:
+        """Yield the ports in a given state, in ascending order."""
+        return (self.ports.port_at(i) for i in self._indices(self.bits[state]))
+    
+    def count(self, state: str) -> int:
+        return bin(int.from_bytes(self.bits[state], "little")).count("1")
+    
+    def _mask(self, state: str) -> int:
+        return int.from_bytes(self.bits[state], "little")
+    
+    def _ports_from_mask(self, mask: int) -> List[int]:
+        size = (len(self.ports) + 7) // 8
+        return [self.ports.port_at(i) for i in self._indices(mask.to_bytes(size, "little"))]
+    
+    def difference(self, other: "PortStateStore", state: str = OPEN) -> List[int]:
+        """Ports in `state` on this host but not on `other` (e.g. open on A, not on B)."""
+        if self.ports == other.ports:
+            return self._ports_from_mask(self._mask(state) & ~other._mask(state))
+        theirs = set(other.ports_in(state))
+        return [port for port in self.ports_in(state) if port not in theirs]
+    
+    def intersection(self, other: "PortStateStore", state: str = OPEN) -> List[int]:
+        """Ports in `state` on both hosts."""
+        if self.ports == other.ports:
+            return self._ports_from_mask(self._mask(state) & other._mask(state))
+        theirs = set(other.ports_in(state))
+        return [port for port in self.ports_in(state) if port in theirs]
+    
+    def result(self, port: int) -> Optional[dict]:
+        """Render one port in the check_port dict form, or None if not probed."""
+        state = self.state(port)
+        if state is None:
+            return None
+        return self._render(port, self.ports.index(port), state)
+    
+    def _render(self, port: int, index: int, state: str) -> dict:
+        return {
+            "host": self.host,
+            "port": port,
+            "open": state == self.OPEN,
+            "error": self.errors.get(port, self.IMPLIED_ERRORS.get(state)),
+            "response_time": round(self.response_times[index], 2)
+        }
+    
+    def error_messages(self) -> set:
+        """Distinct errors among the ports that are not open."""
+        messages = set(self.errors.values())
+        explicit = [self.state(port) for port in self.errors]
+        for state, implied in self.IMPLIED_ERRORS.items():
+            if self.count(state) > explicit.count(state):
+                messages.add(implied)
+        return messages
+    
+    def for_host(self, host: str) -> "PortStateStore":
+        """The same port results reported under another host name, sharing this store's arrays."""
+        store = copy.copy(self)
+        store.host = host
+        return store
+    
+    def __iter__(self) -> Iterator[dict]:
+        # One pass over the three bitsets together; a port's state is the bitset holding its bit
+        opened, closed, filtered = (self.bits[state] for state in self.STATES)
+        for byte_index, (o, c, f) in enumerate(zip(opened, closed, filtered)):
+            if not o | c | f:
+                continue
+            base = byte_index << 3
+            for bit in range(8):
+                mask = 1 << bit
+                if o & mask:
+                    state = self.OPEN
+                elif c & mask:
+                    state = self.CLOSED
+                elif f & mask:
+                    state = self.FILTERED
+                else:
+                    continue
+                yield self._render(self.ports.port_at(base + bit), base + bit, state)
+    
+    def __len__(self) -> int:
+        return sum(self.count(state) for state in self.STATES)
+
+class HealthCheck:
+    """
+    Per-host pass/fail decision for health-check scans (--until).
+    
+    In "any-open" mode a host is healthy as soon as one port is open; in
+    "all-open" mode it is unhealthy as soon as one port is not. `decided` is
+    passed to the engines as their stop_when predicate, so the remaining
+    probes of a decided host are skipped or cancelled instead of waiting
+    out their timeouts.
+    """
+    
+    MODES = ("any-open", "all-open")
+    
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.decisions = {}  # host -> (healthy, deciding port result), until the host is reported
+        self.healthy = 0
+        self.unhealthy = 0
+    
+    def decided(self, host: str, port: int, result: dict) -> bool:
+        """Whether this port result settles the host's health."""
+        if result["open"] == (self.mode == "any-open"):
+            self.decisions[host] = (result["open"], result)
+            return True
+        return False
+    
+    def host_record(self, host_result: dict) -> dict:
+        """Settle a completed host and describe the outcome as a record."""
+        healthy, deciding = self.decisions.pop(host_result["host"], (self.mode == "all-open", None))
+        dns = host_result.get("dns")
+        if dns and dns["error"]:
+            healthy, deciding = False, None  # Nothing was probed
+        if healthy:
+            self.healthy += 1
+        else:
+            self.unhealthy += 1
+        return {
+            "type": "health",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "host": host_result["host"],
+            "mode": self.mode,
+            "healthy": healthy,
+            "port": deciding["port"] if deciding else None,
+            "error": deciding["error"] if deciding else (dns["error"] if dns else None)
+        }
+    
+    @staticmethod
+    def format_record(record: dict) -> str:
+        """Render a health record as one colored report line."""
+        status = "\033[92m✓ HEALTHY\033[0m" if record["healthy"] else "\033[91m✗ UNHEALTHY\033[0m"
+        if record["port"] is None and record["error"]:
+            reason = record["error"]
+        elif record["port"] is None:
+            reason = "all ports open" if record["healthy"] else "no port open"
+        elif record["healthy"]:
+            reason = f"port {record['port']} open"
+        else:
+            reason = f"port {record['port']}: {record['error']}"
+        return f"🩺 Health ({record['mode']}): {status} - {reason}"
+    
+    @property
+    def exit_code(self) -> int:
+        """0 when every host passed, 1 otherwise."""
+        return 0 if self.unhealthy == 0 else 1
+
+
+class WatchMonitor:
+    """
+    Continuously re-probes a fixed set of targets and reports state changes.
+    
+    One long-lived NetworkChecker is reused across cycles, so resolved names
+    stay cached (subject to the DNS TTL). Each cycle's probes are spread
+    evenly over the interval instead of being fired in one burst. Only
+    transitions are emitted: host up/down from ping, and port open, closed
+    or filtered. In the first cycle, hosts and open ports are reported as a
+    baseline, while closed ports are not. A host whose name stops resolving
+    is reported once as unresolved, and its probes are skipped until it
+    resolves again.
+    """
+    
+    def __init__(self, checker: NetworkChecker, hosts: List[str], ports: PortSet,
+                 interval: float, ping_count: int = 4, ping: bool = True,
+                 emit: Optional[Callable[[dict], None]] = None,
+                 on_probe: Optional[Callable[[str, Optional[int], dict], None]] = None):
+        self.checker = checker
+        self.hosts = hosts
+        self.ports = ports
+        self.interval = interval
+        self.ping_count = ping_count
+        self.ping = ping
+        self.emit = emit or self.print_transition
+        self.on_probe = on_probe
+        self.cycle = 0
+        self._lock = threading.Lock()
+        self._ping_states = {}                                        # host -> "up"/"down"
+        self._unresolved = set()
+        self._port_states = {host: PortStateStore(host, ports) for host in hosts}
+    
+    @staticmethod
+    def print_transition(event: dict) -> None:
+        """Default emitter: one human-readable line per transition."""
+        target = event["host"] if event["port"] is None else f"{event['host']}:{event['port']}"
+        change = event["to"] if event["from"] is None else f"{event['from']} → {event['to']}"
+        detail = f" ({event['error']})" if event.get("error") else ""
+        print(f"[{event['timestamp']}] {target} {change}{detail}", flush=True)
+    
+    def _observe(self, host: str, port: Optional[int], result: dict) -> None:
+        """Compare a probe result with the previous state and emit any change."""
+        with self._lock:
+            if self.on_probe:
+                self.on_probe(host, port, result)
+            if port is None:
+                new_state = "up" if result["success"] else "down"
+                old_state = self._ping_states.get(host)
+                self._ping_states[host] = new_state
+                baseline = True
+            else:
+                store = self._port_states[host]
+                new_state = PortStateStore.classify(result)
+                old_state = store.state(port)
+                store.record(result)
+                baseline = new_state == PortStateStore.OPEN
+            
+            if old_state == new_state or (old_state is None and not baseline):
+                return
+            self.emit({
+                "type": "transition",
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "host": host,
+                "port": port,
+                "from": old_state,
+                "to": new_state,
+                "error": result.get("error") if new_state not in ("up", PortStateStore.OPEN) else None
+            })
+    
+    def _observe_dns(self, host: str, dns: dict) -> bool:
+        """Emit a host-level transition when its name stops or starts resolving; True if resolved."""
+        resolved = not dns["error"]
+        with self._lock:
+            if resolved != (host in self._unresolved):
+                return resolved
+            if resolved:
+                self._unresolved.discard(host)
+            else:
+                self._unresolved.add(host)
+            self.emit({
+                "type": "transition",
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "host": host,
+                "port": None,
+                "from": "unresolved" if resolved else None,
+                "to": "resolved" if resolved else "unresolved",
+                "error": dns["error"]
+            })
+        return resolved
+    
+    def _probe(self, host: str, port: Optional[int]) -> None:
+        if not self._observe_dns(host, self.checker.dns.resolve(host)):
+            return
+        if port is None:
+            result = self.checker.ping_host(host, self.ping_count)
+        else:
+            result = self.checker.check_port(host, port)
+        self._observe(host, port, result)
+    
+    def run_cycle(self) -> None:
+        """Probe every target once, pacing submissions evenly across the interval."""
+        jobs_per_host = len(self.ports) + (1 if self.ping else 0)
+        total = len(self.hosts) * jobs_per_host
+        spacing = self.interval / total if total else 0
+        cycle_start = time.monotonic()
+        
+        with ThreadPoolExecutor(max_workers=max(1, self.checker.max_workers)) as executor:
+            futures = []
+            for i, (host, port) in enumerate(
+                    (host, port) for host in self.hosts
+                    for port in chain([None] if self.ping else [], self.ports)):
+                delay = cycle_start + i * spacing - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(self._probe, host, port))
+                if len(futures) >= 1024:
+                    pending = []
+                    for future in futures:
+                        if future.done():
+                            future.result()  # A failed probe raises here instead of being dropped
+                        else:
+                            pending.append(future)
+                    futures = pending
+            for future in futures:
+                future.result()
+        self.cycle += 1
+    
+    def run(self, cycles: Optional[int] = None) -> None:
+        """Run cycles back to back, one per interval (or longer if probes overrun)."""
+        while cycles is None or self.cycle < cycles:
+            cycle_start = time.monotonic()
+            self.run_cycle()
+            remaining = self.interval - (time.monotonic() - cycle_start)
+            if remaining > 0 and (cycles is None or self.cycle < cycles):
+                time.sleep(remaining)
+
+class ScanHistory:
+    """
+    Local SQLite store of every probe result, for questions across many scans.
+    
+    Rows are appended in batched transactions on a WAL-mode database, every
+    `batch_size` probes or `flush_interval` seconds, whichever comes first,
+    so recording keeps up with fast engines and readers can query a running
+    scan without waiting long for its results. Probes are indexed by host/port/timestamp, timestamp and
+    state. Ping results are stored with a NULL port and state "up"/"down".
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS scans (
+            id INTEGER PRIMARY KEY,
+            started_at REAL NOT NULL,
+            finished_at REAL,
+            command TEXT
+        );
+        CREATE TABLE IF NOT EXISTS probes (
+            scan_id INTEGER NOT NULL REFERENCES scans(id),
+            ts REAL NOT NULL,
+            host TEXT NOT NULL,
+            port INTEGER,
+            state TEXT NOT NULL,
+            response_time REAL,
+            error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS probes_host_port_ts ON probes (host, port, ts);
+        CREATE INDEX IF NOT EXISTS probes_ts ON probes (ts);
+        CREATE INDEX IF NOT EXISTS probes_state ON probes (state, ts);
+    """
+    
+    def __init__(self, path: str, batch_size: int = 1000, flush_interval: float = 5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.scan_id = None
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+        self._rows = []
+        self._last_flush = time.monotonic()
+    
+    def begin_scan(self, command: str = "") -> int:
+        """Start a new scan record that subsequent probes are attached to."""
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO scans (started_at, command) VALUES (?, ?)", (time.time(), command)
+            )
+        self.scan_id = cursor.lastrowid
+        return self.scan_id
+    
+    @staticmethod
+    def probe_state(port: Optional[int], result: dict) -> str:
+        """State stored for a probe: up/down for pings, else open/closed/filtered."""
+        if port is None:
+            return "up" if result["success"] else "down"
+        return PortStateStore.classify(result)
+    
+    def record_probe(self, host: str, port: Optional[int], result: dict) -> None:
+        """Queue one probe result; usable directly as an engine on_probe callback."""
+        if result.get("inherited"):
+            return  # Carried over by --incremental, not a new observation
+        if port is None:
+            response_time = result.get("rtt_avg")
+            error = None if result["success"] else result.get("error")
+        else:
+            response_time = result["response_time"]
+            error = result["error"]
+        row = (self.scan_id, time.time(), host, port, self.probe_state(port, result), response_time, error)
+        with self._lock:
+            self._rows.append(row)
+            if (len(self._rows) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+    
+    def _flush_locked(self) -> None:
+        if self._rows:
+            with self.conn:
+                self.conn.executemany("INSERT INTO probes VALUES (?, ?, ?, ?, ?, ?, ?)", self._rows)
+            self._rows.clear()
+        self._last_flush = time.monotonic()
+    
+    def flush(self) -> None:
+        """Write queued rows in one transaction."""
+        with self._lock:
+            self._flush_locked()
+    
+    def close(self) -> None:
+        """Flush, mark the current scan finished and close the database."""
+        with self._lock:
+            self._flush_locked()
+            if self.scan_id is not None:
+                with self.conn:
+                    self.conn.execute("UPDATE scans SET finished_at = ? WHERE id = ?",
+                                      (time.time(), self.scan_id))
+            self.conn.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def flaps(self, host: str, port: Optional[int], limit: int = 10) -> List[dict]:
+        """
+        Most recent state changes of one host (port None) or host:port.
+        
+        Returns:
+            List of {"ts", "from", "to", "error"} dicts, newest first
+        """
+        port_clause = "port IS NULL" if port is None else "port = ?"
+        params = [host] if port is None else [host, port]
+        rows = self.conn.execute(f"""
+            SELECT ts, previous, state, error FROM (
+                SELECT ts, state, error, LAG(state) OVER (ORDER BY ts) AS previous
+                FROM probes WHERE host = ? AND {port_clause}
+            )
+            WHERE previous IS NOT NULL AND previous != state
+            ORDER BY ts DESC LIMIT ?
+        """, params + [limit]).fetchall()
+        return [{"ts": ts, "from": previous, "to": state, "error": error}
+                for ts, previous, state, error in rows]
+    
+    def latency_percentiles(self, days: float = 7, percentiles: Tuple[float, ...] = (50, 95, 99),
+                            host: Optional[str] = None) -> List[dict]:
+        """
+        Connect-latency percentiles (nearest rank) of open-port probes per host.
+        
+        Returns:
+            List of {"host", "samples", "p50", "p95", ...} dicts, sorted by host
+        """
+        params = [time.time() - days * 86400]
+        host_clause = ""
+        if host:
+            host_clause = "AND host = ?"
+            params.append(host)
+        rows = self.conn.execute(f"""
+            SELECT host, response_time FROM probes
+            WHERE state = 'open' AND port IS NOT NULL AND ts >= ? {host_clause}
+            ORDER BY host, response_time
+        """, params)
+        
+        summaries = []
+        
+        def summarize(name, values):
+            summary = {"host": name, "samples": len(values)}
+            for pct in percentiles:
+                rank = max(1, -(-len(values) * pct // 100))  # ceil(n * p / 100)
+                summary[f"p{pct:g}"] = round(values[int(rank) - 1], 2)
+            summaries.append(summary)
+        
+        current, values = None, []
+        for name, value in rows:
+            if name != current and values:
+                summarize(current, values)
+                values = []
+            current = name
+            values.append(value)
+        if values:
+            summarize(current, values)
+        return summaries
+    
+    def probes(self, host: str, port: Optional[int] = None, days: float = 7,
+               limit: int = 100) -> List[dict]:
+        """Most recent probe rows for a host (all ports unless one is given)."""
+        clauses, params = ["host = ?", "ts >= ?"], [host, time.time() - days * 86400]
+        if port is not None:
+            clauses.append("port = ?")
+            params.append(port)
+        rows = self.conn.execute(f"""
+            SELECT ts, port, state, response_time, error FROM probes
+            WHERE {' AND '.join(clauses)} ORDER BY ts DESC LIMIT ?
+        """, params + [limit]).fetchall()
+        return [{"ts": ts, "port": port, "state": state, "response_time": rt, "error": error}
+                for ts, port, state, rt, error in rows]
+
+class _HostBaseline:
+    """Baseline arrays of one host (see ScanBaseline)."""
+    
+    def __init__(self, size: int):
+        self.states = bytearray(size)
+        self.seen = array('d', bytes(8 * size))
+        self.since = array('d', bytes(8 * size))
+        self.response_times = array('f', bytes(4 * size))
+        self.errors = {}  # port -> error string, only where not implied by the state
+    
+    def observe(self, index: int, port: int, state: str, ts: float, response_time: float,
+                error: Optional[str]) -> None:
+        """Fold one probe into the baseline; older observations than the last are ignored."""
+        if ts < self.seen[index]:
+            return
+        code = ScanBaseline.STATES.index(state)
+        if self.states[index] != code:
+            self.states[index] = code
+            self.since[index] = ts
+        self.seen[index] = ts
+        self.response_times[index] = response_time or 0
+        if error and error != PortStateStore.IMPLIED_ERRORS.get(state):
+            self.errors[port] = error
+        else:
+            self.errors.pop(port, None)
+
+
+class ScanBaseline:
+    """
+    Last known state of each host:port from earlier scans, for --incremental.
+    
+    The source is a --history database or an NDJSON result file (plain or
+    gzip; appended runs are read in order). For every port of the scan's
+    PortSet the baseline keeps the last state, when the port was last really
+    probed (`seen`) and since when it has held that state (`since`), in flat
+    arrays indexed like a PortStateStore, about 21 bytes per port. History
+    databases are queried one host at a time as the scan reaches it; NDJSON
+    files are read once up front.
+    """
+    
+    STATES = (None,) + PortStateStore.STATES  # State codes stored per port; 0 = never probed
+    
+    def __init__(self, path: str, ports: "PortSet"):
+        self.path = path
+        self.ports = ports
+        self.conn = None
+        self.hosts = {}
+        with open(path, "rb") as f:
+            magic = f.read(16)
+        if magic.startswith(b"SQLite format 3"):
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            self._lock = threading.Lock()
+        else:
+            self._load_ndjson()
+    
+    def _load_ndjson(self) -> None:
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with opener(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Torn line from an interrupted run
+                port = record.get("port") if record.get("type") == "port" else None
+                if port is None or port not in self.ports:
+                    continue
+                host = record["host"]
+                baseline = self.hosts.get(host)
+                if baseline is None:
+                    baseline = self.hosts[host] = _HostBaseline(len(self.ports))
+                ts = datetime.fromisoformat(record.get("checked_at") or record["timestamp"]).timestamp()
+                baseline.observe(self.ports.index(port), port, PortStateStore.classify(record), ts,
+                                 record.get("response_time"), record.get("error"))
+    
+    def host(self, host: str) -> Optional[_HostBaseline]:
+        """Baseline of one host, or None if it was never scanned."""
+        if self.conn is None:
+            return self.hosts.get(host)
+        # For each port: its latest probe, and the first probe of its latest unchanged run
+        query = """
+            WITH last AS (
+                SELECT port, state, response_time, error, MAX(ts) AS seen FROM probes
+                WHERE host = :host AND port IS NOT NULL GROUP BY port
+            )
+            SELECT port, state, response_time, error, seen, (
+                SELECT MIN(ts) FROM probes p
+                WHERE p.host = :host AND p.port = last.port AND p.ts > COALESCE((
+                    SELECT MAX(ts) FROM probes q
+                    WHERE q.host = :host AND q.port = last.port AND q.state != last.state
+                ), 0)
+            ) FROM last
+        """
+        with self._lock:
+            rows = self.conn.execute(query, {"host": host}).fetchall()
+        baseline = None
+        for port, state, response_time, error, seen, since in rows:
+            if port not in self.ports:
+                continue
+            if baseline is None:
+                baseline = _HostBaseline(len(self.ports))
+            index = self.ports.index(port)
+            baseline.observe(index, port, state, since, response_time, error)
+            baseline.seen[index] = seen
+        return baseline
+    
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class IncrementalPlan:
+    """
+    Chooses which ports an incremental scan (--incremental) really probes.
+    
+    Used as the engines' `restored` mapping: for each host it returns a
+    HostPlan of the results to carry over instead of probing. A port is
+    probed fresh when it has no baseline, was open, changed state within
+    `stable_days`, was last probed more than `full_sweep_days` ago, or falls
+    into the `sample_rate` share of stable ports drawn for this run. Open and
+    recently changed ports are probed first. Every other port is stable
+    closed or filtered, and its last result is inherited, marked with
+    "inherited" and the "checked_at" time of the probe it came from.
+    Checkpointed probes (`restored`) take precedence over the plan. Samples
+    are drawn from a random.Random seeded with `seed`, so a run can be
+    repeated exactly.
+    
+    Engines may look a host up more than once, so each plan is built and
+    counted once, then cached until release() is called when the host has
+    been reported.
+    """
+    
+    def __init__(self, baseline: ScanBaseline, stable_days: float = 7, sample_rate: float = 0.05,
+                 full_sweep_days: float = 30, restored: Optional[dict] = None,
+                 seed: Optional[int] = None):
+        self.baseline = baseline
+        self.stable_days = stable_days
+        self.sample_rate = sample_rate
+        self.full_sweep_days = full_sweep_days
+        self.restored = restored or {}
+        self.random = random.Random(seed)
+        self.counts = {"inherited": 0, "open/changed": 0, "sampled": 0, "full sweep": 0, "new": 0}
+        self._plans = {}  # host -> HostPlan (None if nothing to carry over), until released
+        self._lock = threading.Lock()
+    
+    def get(self, host: str, default=None) -> Optional[HostPlan]:
+        """Plan for one host (default if there is nothing to carry over); the same plan until released."""
+        with self._lock:
+            if host in self._plans:
+                plan = self._plans[host]
+                return default if plan is None else plan
+        plan, counts = self._plan(host)
+        with self._lock:
+            # A concurrent lookup of the same host may have won; keep and count only its plan
+            if host in self._plans:
+                plan = self._plans[host]
+            else:
+                self._plans[host] = plan
+                for name, count in counts.items():
+                    self.counts[name] += count
+        return default if plan is None else plan
+    
+    def release(self, host: str) -> None:
+        """Forget the cached plan of a host that has been reported."""
+        with self._lock:
+            self._plans.pop(host, None)
+    
+    def _plan(self, host: str) -> Tuple[Optional[HostPlan], dict]:
+        counts = dict.fromkeys(self.counts, 0)
+        done = self.restored.get(host, {})
+        baseline = self.baseline.host(host)
+        if baseline is None:
+            counts["new"] = len(self.baseline.ports) - len(done)
+            return (HostPlan(done) if done else None), counts
+        plan = HostPlan(done)
+        ports = self.baseline.ports
+        now = time.time()
+        recent = now - self.stable_days * 86400
+        stale = now - self.full_sweep_days * 86400
+        for index, code in enumerate(baseline.states):
+            port = ports.port_at(index)
+            if port in done:
+                continue
+            state = ScanBaseline.STATES[code]
+            if state is None:
+                counts["new"] += 1
+            elif state == PortStateStore.OPEN or baseline.since[index] > recent:
+                counts["open/changed"] += 1
+                plan.first.append(port)
+            elif baseline.seen[index] < stale:
+                counts["full sweep"] += 1
+            elif self.random.random() < self.sample_rate:
+                counts["sampled"] += 1
+            else:
+                counts["inherited"] += 1
+                plan[port] = {
+                    "host": host,
+                    "port": port,
+                    "open": False,
+                    "error": baseline.errors.get(port, PortStateStore.IMPLIED_ERRORS[state]),
+                    "response_time": baseline.response_times[index],
+                    "inherited": True,
+                    "checked_at": datetime.fromtimestamp(baseline.seen[index], timezone.utc).isoformat(),
+                }
+                plan.emit.add(port)
+        return plan, counts
+    
+    def format_summary(self) -> str:
+        """Human-readable breakdown of fresh and inherited port results."""
+        counts = self.counts
+        fresh = sum(count for name, count in counts.items() if name != "inherited")
+        return (f"♻️  Incremental scan from {self.baseline.path}: {fresh} port(s) probed fresh "
+                f"({counts['open/changed']} open or recently changed, {counts['sampled']} sampled, "
+                f"{counts['full sweep']} past the {self.full_sweep_days:g}-day full sweep, "
+                f"{counts['new']} new), {counts['inherited']} inherited unprobed")
+
+def expand_target(spec: str) -> Iterator[str]:
+    """
+    Lazily expand one target specification into hosts.
+    
+    Supports CIDR blocks ("10.0.0.0/16"), address ranges ("10.0.0.1-10.0.0.50"
+    or "10.0.0.1-50" for the last octet), and plain hostnames or addresses.
+    
+    Raises:
+        ValueError: If a CIDR block or address range is malformed
+    """
+    spec = spec.strip()
+    if '/' in spec:
+        network = ipaddress.ip_network(spec, strict=False)
+        if network.num_addresses == 1:
+            yield str(network.network_address)
+        else:
+            yield from (str(address) for address in network.hosts())
+        return
+    
+    if '-' in spec:
+        first, last = spec.split('-', 1)
+        try:
+            start = ipaddress.ip_address(first)
+        except ValueError:
+            yield spec  # A hostname containing a hyphen
+            return
+        if last.isdigit() and start.version == 4:
+            last = first.rsplit('.', 1)[0] + '.' + last
+        end = ipaddress.ip_address(last)
+        if end.version != start.version or end < start:
+            raise ValueError(f"invalid address range: {spec}")
+        for value in range(int(start), int(end) + 1):
+            yield str(ipaddress.ip_address(value))
+        return
+    
+    yield spec
+
+def iter_host_file(path: str) -> Iterator[str]:
+    """
+    Lazily read target specifications from a host file.
+    
+    Blank lines and '#' comments (including inline comments, as in
+    sample_hosts.txt) are ignored.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                yield line
+
+def iter_targets(specs: Iterable[str] = (), host_files: Iterable[str] = ()) -> Iterator[str]:
+    """
+    Lazily expand command-line targets and host files into individual hosts.
+    
+    Nothing is materialized up front, so a /16 feeds the scan engines one
+    address at a time. Repeated plain entries are skipped; addresses produced
+    by overlapping CIDR blocks or ranges are not tracked, to keep memory flat.
+    Malformed blocks or ranges are reported on stderr and skipped.
+    """
+    seen = set()
+    for spec in chain(specs, chain.from_iterable(iter_host_file(path) for path in host_files)):
+        expandable = '/' in spec or '-' in spec
+        if not expandable:
+            if spec in seen:
+                continue
+            seen.add(spec)
+        try:
+            yield from expand_target(spec)
+        except ValueError as e:
+            print(f"Skipping invalid target '{spec}': {e}", file=sys.stderr)
+
+def print_host_result(checker: NetworkChecker, result: dict, first: bool = False) -> None:
+    """Print one completed host result ({"host", "dns", "ping", "ports"}) as a block."""
+    if not first:
+        print()  # Add spacing between hosts
+    
+    print(f"🔍 Checking: {result['host']}")
+    print("-" * 40)
+    
+    if result.get("worker"):
+        print(f"🛰  Scanned by: {result['worker']}")
+    
+    if result.get("alias_of"):
+        print(f"🔗 Same address as: {result['alias_of']} (results reused, not probed again)")
+    
+    if result.get("inherited"):
+        print(f"♻️  Inherited: {result['inherited']} stable port result(s) from earlier scans, not re-probed")
+    
+    dns = result.get("dns")
+    if dns and (dns["error"] or dns["dns_time"]):  # Skip IP literals
+        print(f"🧭 DNS: {checker.format_dns_results(dns)}")
+    
+    if result["ping"] is not None:
+        print("📡 Ping Test:")
+        print(f"    {checker.format_ping_results(result['ping'])}")
+    
+    if result["ports"]:
+        print("🔌 Port Scan:")
+        print(checker.format_port_results(result["ports"]))
+
+def parse_target(target: str) -> Tuple[str, Optional[int]]:
+    """Split "host", "host:port" or "[v6]:port" into (host, port)."""
+    if target.startswith('['):
+        host, _, rest = target[1:].partition(']')
+        return host, int(rest[1:]) if rest.startswith(':') else None
+    if target.count(':') == 1:
+        host, port = target.split(':')
+        return host, int(port)
+    return target, None
+
+def format_timestamp(ts: float) -> str:
+    return datetime.fromtimestamp(ts).isoformat(sep=" ", timespec="seconds")
+
+def history_main(argv: List[str]) -> None:
+    """Entry point for `pingport_cli.py history DB ...` queries."""
+    parser = argparse.ArgumentParser(
+        prog="pingport_cli.py history",
+        description="Query the scan history recorded with --history",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s scans.db flaps 10.0.0.5:443
+  %(prog)s scans.db latency --days 7 --percentile 95
+  %(prog)s scans.db show web01.local --days 1
+        """
+    )
+    parser.add_argument("database", help="SQLite history database written by --history")
+    queries = parser.add_subparsers(dest="query", required=True)
+    
+    flaps = queries.add_parser("flaps", help="When did a host or host:port last change state")
+    flaps.add_argument("target", help="host (ping state) or host:port")
+    flaps.add_argument("--limit", type=int, default=10, help="Number of changes to show (default: 10)")
+    
+    latency = queries.add_parser("latency", help="Connect latency percentiles per host")
+    latency.add_argument("--days", type=float, default=7, help="Look-back window in days (default: 7)")
+    latency.add_argument("--percentile", type=float, nargs="+", default=[50, 95, 99],
+                         help="Percentiles to report (default: 50 95 99)")
+    latency.add_argument("--host", type=str, default=None, help="Only report this host")
+    
+    show = queries.add_parser("show", help="Recent probe results for a host or host:port")
+    show.add_argument("target", help="host or host:port")
+    show.add_argument("--days", type=float, default=7, help="Look-back window in days (default: 7)")
+    show.add_argument("--limit", type=int, default=100, help="Number of rows to show (default: 100)")
+    
+    args = parser.parse_args(argv)
+    if not os.path.isfile(args.database):
+        parser.error(f"history database not found: {args.database}")
+    
+    history = ScanHistory(args.database)
+    try:
+        if args.query == "flaps":
+            host, port = parse_target(args.target)
+            changes = history.flaps(host, port, args.limit)
+            if not changes:
+                print(f"No state changes recorded for {args.target}")
+            for change in changes:
+                detail = f" ({change['error']})" if change["error"] else ""
+                print(f"{format_timestamp(change['ts'])}  {args.target}  {change['from']} → {change['to']}{detail}")
+        
+        elif args.query == "latency":
+            summaries = history.latency_percentiles(args.days, tuple(args.percentile), args.host)
+            columns = [f"p{pct:g}" for pct in args.percentile]
+            print(f"{'Host':<40} {'Samples':>8} " + " ".join(f"{c + ' ms':>10}" for c in columns))
+            for summary in summaries:
+                print(f"{summary['host']:<40} {summary['samples']:>8} "
+                      + " ".join(f"{summary[c]:>10}" for c in columns))
         
+        else:
+            host, port = parse_target(args.target)
+            for row in history.probes(host, port, args.days, args.limit):
+                target = host if row["port"] is None else f"{host}:{row['port']}"
+                latency_info = f" {row['response_time']}ms" if row["response_time"] else ""
+                detail = f" ({row['error']})" if row["error"] else ""
+                print(f"{format_timestamp(row['ts'])}  {target}  {row['state']}{latency_info}{detail}")
+    finally:
+        history.conn.close()
+
+def worker_main(argv: List[str]) -> None:
+    """Entry point for `pingport_cli.py worker ADDRESS`: scan units handed out by a coordinator."""
+    parser = argparse.ArgumentParser(
+        prog="pingport_cli.py worker",
+        description="Scan work units for a coordinator started with --serve",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s scanner01.example.com:7700 --name site-a
+  %(prog)s unix:/tmp/pingport.sock
+        """
+    )
+    parser.add_argument("address", help="Coordinator address: host:port or unix:/path")
+    parser.add_argument("--name", type=str, default=socket.gethostname(),
+                        help="Name reported with this worker's results (default: hostname)")
+    parser.add_argument("--token", type=str, default=os.environ.get("PINGPORT_TOKEN"),
+                        help="Shared token expected by the coordinator (default: $PINGPORT_TOKEN)")
+    cli = parser.parse_args(argv)
+    
+    try:
+        family, address = parse_endpoint(cli.address)
+        conn = socket.socket(family, socket.SOCK_STREAM)
+        conn.connect(address)
+    except (ValueError, OSError) as e:
+        print(f"Cannot connect to coordinator {cli.address}: {e}", file=sys.stderr)
+        sys.exit(1)
+    
+    send_lock = threading.Lock()
+    reader = conn.makefile("r", encoding="utf-8")
+    send_message(conn, {"type": "hello", "name": cli.name, "token": cli.token}, send_lock)
+    config = json.loads(reader.readline() or "{}")
+    if config.get("type") != "config":
+        print(f"Coordinator refused this worker: {config.get('error', 'connection closed')}", file=sys.stderr)
+        sys.exit(1)
+    
+    args = argparse.Namespace(procs=1, profile=False, **config["options"])
+    port_set = PrioritizedPortSet if config["prioritized"] else PortSet
+    ports = port_set.parse(config["ports"])
+    checker = build_checker(args)
+    if checker.ping_engine == "icmp" and not args.no_ping and not checker.icmp.available():
+        print(f"Cannot scan with --ping-engine icmp: {IcmpPinger.UNAVAILABLE}", file=sys.stderr)
+        conn.close()
+        sys.exit(1)
+    stopped = threading.Event()
+    
+    def heartbeat():
+        while not stopped.wait(config["heartbeat"]):
+            try:
+                send_message(conn, {"type": "heartbeat"}, send_lock)
+            except OSError:
+                return
+    
+    threading.Thread(target=heartbeat, daemon=True).start()
+    units = 0
+    in_unit = False
+    try:
+        while True:
+            send_message(conn, {"type": "request"}, send_lock)
+            line = reader.readline()
+            if not line:
+                break  # Coordinator finished
+            reply = json.loads(line)
+            if reply["type"] == "done":
+                break
+            if reply["type"] == "error":
+                print(f"Coordinator dropped this worker: {reply['error']}", file=sys.stderr)
+                sys.exit(1)
+            if reply["type"] == "wait":
+                time.sleep(1)
+                continue
+            
+            lease = reply["lease"]
+            in_unit = True
+            batch = []
+            
+            def flush():
+                if batch:
+                    send_message(conn, {"type": "probes", "lease": lease, "items": list(batch)}, send_lock)
+                    batch.clear()
+            
+            def on_probe(host, port, result):
+                if port is not None:  # Pings travel with the host message
+                    batch.append((host, port, result))
+                    if len(batch) >= ShardedScan.PROBE_BATCH:
+                        flush()
+            
+            def on_host_complete(result):
+                flush()
+                send_message(conn, {"type": "host", "lease": lease, "host": result["host"],
+                                    "dns": result["dns"], "ping": result["ping"]}, send_lock)
+            
+            run_engine(checker, args, reply["hosts"], ports,
+                       on_host_complete=on_host_complete, on_probe=on_probe, keep_results=False,
+                       health=HealthCheck(args.until) if args.until else None)
+            send_message(conn, {"type": "unit_done", "lease": lease}, send_lock)
+            in_unit = False
+            units += 1
+            print(f"{cli.name}: finished unit {lease} ({len(reply['hosts'])} host(s))", file=sys.stderr)
+    except (OSError, ValueError) as e:
+        # Between units a hung-up coordinator just means the scan has finished
+        if in_unit or not isinstance(e, ConnectionError):
+            print(f"Lost coordinator connection: {e}", file=sys.stderr)
+            sys.exit(1)
+    finally:
+        stopped.set()
+        conn.close()
+        checker.dns.shutdown()
+    print(f"{cli.name}: done after {units} unit(s)", file=sys.stderr)
+
+def combine_probe_callbacks(callbacks: List[Callable[[str, Optional[int], dict], None]]):
+    """Fan one on_probe stream out to several sinks (None if there are none)."""
+    if not callbacks:
+        return None
+    if len(callbacks) == 1:
+        return callbacks[0]
+    
+    def on_probe(host, port, result):
+        for callback in callbacks:
+            callback(host, port, result)
+    return on_probe
+
+def parse_endpoint(spec: str) -> Tuple[int, object]:
+    """
+    Parse a coordinator address: "unix:/path/to.sock", "host:port" or "[v6]:port".
+    
     Returns:
-        List of individual port numbers
-    """
-    ports = []
-    for part in port_input.split(','):
-        part = part.strip()
-        if '-' in part:
-            start, end = map(int, part.split('-', 1))
-            ports.extend(range(start, end + 1))
+        (address family, socket address)
+    """
+    if spec.startswith("unix:"):
+        return socket.AF_UNIX, spec[len("unix:"):]
+    host, sep, port = spec.rpartition(":")
+    if not sep or not port.isdigit():
+        raise ValueError(f"expected host:port or unix:/path, got {spec!r}")
+    host = host.strip("[]") or "0.0.0.0"
+    return (socket.AF_INET6 if ":" in host else socket.AF_INET), (host, int(port))
+
+
+def send_message(sock: socket.socket, message: dict, lock: Optional[threading.Lock] = None) -> None:
+    """Send one newline-delimited JSON message of the coordinator protocol."""
+    data = (json.dumps(message, separators=(",", ":")) + "\n").encode()
+    if lock:
+        with lock:
+            sock.sendall(data)
+    else:
+        sock.sendall(data)
+
+
+class ScanCoordinator:
+    """
+    Hands work units of a scan to remote workers and merges their results (--serve).
+    
+    Workers (`pingport_cli.py worker ADDRESS`) connect over TCP or a Unix
+    socket and speak newline-delimited JSON. After a hello they receive the
+    scan options, then repeatedly request a unit (a few hosts) and stream its
+    probe results back, followed by a "host" message for each finished host.
+    
+    Each unit is leased to one worker. Any message from that worker renews
+    the lease, and workers send heartbeats while they scan. When a worker
+    disconnects or its lease expires, the hosts it has not finished go back
+    to the queue for another worker. Results from the stale lease are
+    discarded. A host's results are committed only when its "host" message
+    arrives, so every host is reported exactly once, tagged with the worker
+    that scanned it.
+    """
+    
+    # Scan options the workers adopt from the coordinator's command line
+    FORWARDED_OPTIONS = ("timeout", "ping_count", "parallel", "no_ping", "workers", "engine",
+                         "ping_engine", "dns_ttl", "concurrency", "adaptive_timeout",
+                         "min_timeout", "retries", "rate", "host_rate", "min_rate", "until")
+    # Fields every streamed port result must carry
+    PROBE_FIELDS = {"open", "error", "response_time"}
+    
+    def __init__(self, args: argparse.Namespace, hosts: Iterable[str], ports: "PortSet",
+                 unit_size: int = 8, lease: float = 30, token: Optional[str] = None,
+                 on_host_complete: Optional[Callable[[dict], None]] = None,
+                 on_probe: Optional[Callable[[str, Optional[int], dict], None]] = None,
+                 health: Optional["HealthCheck"] = None, restored: Optional[dict] = None):
+        self.args = args
+        self.restored = restored or {}
+        self.ports = ports
+        self.unit_size = unit_size
+        self.lease = lease
+        self.token = token
+        self.on_host_complete = on_host_complete
+        self.on_probe = on_probe
+        self.health = health
+        self._hosts = iter(hosts)
+        self._exhausted = False
+        self._requeued = deque()  # Host lists of units whose lease was lost
+        self._leases = {}         # lease id -> {"worker", "hosts", "expires", "probes"}
+        self._next_lease = 1
+        self._lock = threading.Lock()
+        self._connections = {}    # Live worker connection -> its send lock
+        self.units_by_worker = {}
+        self.reassigned = 0
+    
+    def _config(self) -> dict:
+        options = {name: getattr(self.args, name) for name in self.FORWARDED_OPTIONS}
+        return {"type": "config", "options": options, "ports": str(self.ports),
+                "prioritized": isinstance(self.ports, PrioritizedPortSet),
+                "heartbeat": self.lease / 3}
+    
+    def _lease_unit(self, worker: str) -> dict:
+        """Lease the next unit to a worker, or tell it to wait or stop."""
+        with self._lock:
+            if self._requeued:
+                hosts = self._requeued.popleft()
+            else:
+                hosts = []
+                while not self._exhausted and len(hosts) < self.unit_size:
+                    host = next(self._hosts, None)
+                    if host is None:
+                        self._exhausted = True
+                    elif len(self.restored.get(host, ())) == len(self.ports) + (not self.args.no_ping):
+                        self._report(self._new_result(host, None, None, "checkpoint"))  # Finished before
+                    else:
+                        hosts.append(host)
+            if not hosts:
+                # Units may still come back from workers that fail
+                return {"type": "wait" if self._leases else "done"}
+            lease_id = self._next_lease
+            self._next_lease += 1
+            self._leases[lease_id] = {
+                "worker": worker,
+                "hosts": set(hosts),
+                "expires": time.monotonic() + self.lease,
+                "probes": {},  # host -> buffered (port, result) pairs
+            }
+            return {"type": "unit", "lease": lease_id, "hosts": hosts}
+    
+    def _release(self, lease_id: int) -> None:
+        """Return a lost lease's unfinished hosts to the queue (lock held)."""
+        unit = self._leases.pop(lease_id, None)
+        if unit and unit["hosts"]:
+            self._requeued.append(sorted(unit["hosts"]))
+            self.reassigned += 1
+    
+    def _expire_leases(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for lease_id in [l for l, unit in self._leases.items() if unit["expires"] < now]:
+                print(f"Lease {lease_id} held by {self._leases[lease_id]['worker']} expired; "
+                      f"reassigning its hosts", file=sys.stderr)
+                self._release(lease_id)
+    
+    def _renew(self, worker: str) -> None:
+        expires = time.monotonic() + self.lease
+        with self._lock:
+            for unit in self._leases.values():
+                if unit["worker"] == worker:
+                    unit["expires"] = expires
+    
+    def _new_result(self, host: str, dns: Optional[dict], ping: Optional[dict], worker: str) -> dict:
+        """Start a host result, seeded with any probes restored from a checkpoint."""
+        done = self.restored.get(host, {})
+        result = {
+            "host": host,
+            "dns": dns,
+            "ping": done.get(None, ping),
+            "ports": PortStateStore(host, self.ports),
+            "worker": worker,
+        }
+        for port, probe in done.items():
+            if port is not None:
+                result["ports"].record(probe)
+                if self.health:
+                    self.health.decided(host, port, probe)
+        return result
+    
+    def _report(self, result: dict) -> None:
+        if self.on_host_complete:
+            self.on_host_complete(result)
+    
+    def _commit_host(self, worker: str, message: dict) -> None:
+        """Report a finished host from its buffered probes (lock held)."""
+        unit = self._leases.get(message["lease"])
+        host, dns, ping = message["host"], message["dns"], message["ping"]
+        if unit is None or unit["worker"] != worker or host not in unit["hosts"]:
+            return  # Stale lease: the host was handed to another worker
+        unit["hosts"].discard(host)
+        done = self.restored.get(host, {})
+        result = self._new_result(host, dns, ping, worker)
+        if ping is not None and None not in done and self.on_probe:
+            self.on_probe(host, None, dict(ping, worker=worker))
+        for port, probe in unit["probes"].pop(host, []):
+            if port in done:
+                continue  # Already reported before the scan was resumed
+            result["ports"].record(probe)
+            if self.health:
+                self.health.decided(host, port, probe)
+            if self.on_probe:
+                self.on_probe(host, port, dict(probe, worker=worker))
+        self._report(result)
+    
+    def _authorized(self, hello) -> bool:
+        """Whether a worker's first message is a hello carrying the expected token."""
+        if not isinstance(hello, dict) or hello.get("type") != "hello":
+            return False
+        if not self.token:
+            return True
+        token = hello.get("token")
+        return isinstance(token, str) and hmac.compare_digest(token.encode(), self.token.encode())
+    
+    def _check_probes(self, items: list) -> None:
+        """Reject probe results a unit could not have produced, before any is buffered."""
+        for host, port, probe in items:
+            if port not in self.ports or not isinstance(probe, dict) or not self.PROBE_FIELDS <= probe.keys():
+                raise TypeError(f"malformed probe result for {host}:{port}")
+    
+    def _serve_worker(self, conn: socket.socket) -> None:
+        """Speak the protocol with one connected worker until it leaves."""
+        worker = None
+        send_lock = threading.Lock()
+        try:
+            reader = conn.makefile("r", encoding="utf-8")
+            hello = json.loads(reader.readline() or "{}")
+            if not self._authorized(hello):
+                send_message(conn, {"type": "error", "error": "bad hello or token"})
+                return
+            with self._lock:
+                worker = name = hello.get("name") or "worker"
+                suffix = 2
+                while worker in self.units_by_worker:  # Keep names unique per connection
+                    worker = f"{name}#{suffix}"
+                    suffix += 1
+                self.units_by_worker[worker] = 0
+                self._connections[conn] = send_lock
+            send_message(conn, self._config(), send_lock)
+            
+            for line in reader:
+                message = json.loads(line)
+                if not isinstance(message, dict):
+                    raise TypeError("message is not a JSON object")
+                kind = message.get("type")
+                self._renew(worker)
+                if kind == "request":
+                    send_message(conn, self._lease_unit(worker), send_lock)
+                elif kind == "probes":
+                    self._check_probes(message["items"])
+                    with self._lock:
+                        unit = self._leases.get(message["lease"])
+                        if unit is not None and unit["worker"] == worker:
+                            for host, port, probe in message["items"]:
+                                unit["probes"].setdefault(host, []).append((port, probe))
+                elif kind == "host":
+                    with self._lock:
+                        self._commit_host(worker, message)
+                elif kind == "unit_done":
+                    with self._lock:
+                        unit = self._leases.get(message["lease"])
+                        if unit is not None and unit["worker"] == worker:
+                            self._leases.pop(message["lease"])
+                            self.units_by_worker[worker] += 1
+                            if unit["hosts"]:  # Stopped without finishing every host
+                                self._requeued.append(sorted(unit["hosts"]))
+        except (KeyError, TypeError) as e:
+            # A malformed message: tell the worker, then drop it; its leases are handed out again
+            print(f"Worker {worker or 'connection'} sent a malformed message ({e!r}); dropping it", file=sys.stderr)
+            try:
+                send_message(conn, {"type": "error", "error": f"malformed message: {e!r}"}, send_lock)
+            except OSError:
+                pass
+        except (OSError, ValueError) as e:
+            if not self._finished():  # Workers may hang up once told the scan is done
+                print(f"Worker {worker or 'connection'} failed: {e}", file=sys.stderr)
+        finally:
+            conn.close()
+            if worker:
+                with self._lock:
+                    self._connections.pop(conn, None)
+                    for lease_id in [l for l, unit in self._leases.items() if unit["worker"] == worker]:
+                        self._release(lease_id)
+    
+    def _finished(self) -> bool:
+        with self._lock:
+            return self._exhausted and not self._leases and not self._requeued
+    
+    def _dismiss_workers(self, threads: List[threading.Thread], grace: float = 5) -> None:
+        """Tell every connected worker the scan is done and wait for them to hang up."""
+        with self._lock:
+            connections = list(self._connections.items())
+        for conn, send_lock in connections:
+            try:
+                send_message(conn, {"type": "done"}, send_lock)
+            except OSError:
+                pass  # Already gone
+        deadline = time.monotonic() + grace
+        for thread in threads:
+            thread.join(max(0, deadline - time.monotonic()))
+    
+    def serve(self, endpoint: str) -> None:
+        """Listen on endpoint and run until every host has been reported."""
+        family, address = parse_endpoint(endpoint)
+        listener = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_UNIX:
+            if os.path.exists(address):
+                os.unlink(address)
         else:
-            ports.append(int(part))
-    return sorted(set(ports))  # Remove duplicates and sort
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(address)
+        listener.listen()
+        listener.settimeout(0.5)
+        print(f"Coordinator listening on {endpoint} - start workers with: "
+              f"pingport_cli.py worker {endpoint}", file=sys.stderr)
+        threads = []
+        try:
+            while not self._finished():
+                try:
+                    conn, _ = listener.accept()
+                except socket.timeout:
+                    self._expire_leases()
+                    continue
+                conn.settimeout(None)
+                threads = [thread for thread in threads if thread.is_alive()]
+                threads.append(threading.Thread(target=self._serve_worker, args=(conn,), daemon=True))
+                threads[-1].start()
+                self._expire_leases()
+            self._dismiss_workers(threads)
+        finally:
+            listener.close()
+            if family == socket.AF_UNIX and os.path.exists(address):
+                os.unlink(address)
+    
+    def format_summary(self) -> str:
+        with self._lock:
+            per_worker = ", ".join(f"{worker}: {units}" for worker, units in sorted(self.units_by_worker.items()))
+            return (f"🛰  Workers: {len(self.units_by_worker)} ({per_worker or 'none'} unit(s)), "
+                    f"{self.reassigned} unit(s) reassigned")
+
+
+def build_checker(args: argparse.Namespace, shards: int = 1) -> NetworkChecker:
+    """
+    Create the NetworkChecker described by the command line.
+    
+    Without --parallel the thread engine gets a single worker, so hosts and
+    their probes run one at a time in the given order. With `shards` > 1 (a --procs worker) the global --rate budget is split
+    evenly between the workers; per-target limits stay as given, since every
+    host is scanned by a single worker.
+    """
+    pacer = None
+    if args.rate:
+        pacer = ProbePacer(args.rate / shards, host_rate=args.host_rate or args.rate,
+                           min_rate=args.min_rate / shards, feedback_delay=args.timeout)
+    sequential = args.engine == "thread" and not args.parallel
+    return NetworkChecker(timeout=args.timeout,
+                          max_workers=1 if sequential else args.workers,
+                          concurrency=args.concurrency, ping_engine=args.ping_engine,
+                          dns_ttl=args.dns_ttl, profile=args.profile, pacer=pacer,
+                          adaptive_timeout=args.adaptive_timeout,
+                          min_timeout=args.min_timeout, retries=args.retries)
+
+
+def _shard_worker(options: dict, tasks, results) -> None:
+    """
+    Body of a --procs worker process.
+    
+    Scans the hosts it pulls from `tasks` with its own NetworkChecker and the
+    selected engine, and sends results to `results`: ("probes", [...]) batches
+    when the parent streams per-probe output, then ("host", result) once
+    each host completes, and finally ("exit", stats) or ("error", traceback).
+    """
+    import traceback
+    
+    args = argparse.Namespace(**options["args"])
+    try:
+        checker = build_checker(args, shards=args.procs)
+        args.procs = 1
+        args.no_dedupe = True  # The parent already handed out one host per address
+        pacer = checker.pacer
+        health = HealthCheck(args.until) if args.until else None
+        batch = []
+        
+        def flush():
+            if batch:
+                results.put(("probes", list(batch)))
+                batch.clear()
+        
+        def on_probe(host, port, result):
+            # Port results travel as tuples; only pings keep their dict
+            if port is not None:
+                result = (result["open"], result["error"], result["response_time"],
+                          result.get("checked_at"))
+            batch.append((host, port, result))
+            if len(batch) >= ShardedScan.PROBE_BATCH:
+                flush()
+        
+        def on_host_complete(result):
+            flush()
+            if health:
+                result["health"] = health.decisions.pop(result["host"], None)
+            results.put(("host", result))
+        
+        restored = {}
+        
+        def iter_hosts():
+            while True:
+                chunk = tasks.get()
+                if chunk is None:
+                    return
+                for host, done in chunk:
+                    if done is not None:  # An empty HostPlan still orders the host's ports
+                        restored[host] = done
+                    yield host
+        
+        run_engine(checker, args, iter_hosts(), options["ports"],
+                   on_host_complete=on_host_complete,
+                   on_probe=on_probe if options["stream_probes"] else None,
+                   keep_results=options["keep_results"], health=health, restored=restored)
+        flush()
+        profiler = checker.profiler
+        results.put(("exit", {
+            "profile": (profiler.global_phases, profiler.host_phases) if profiler else None,
+            "pacer": pacer.stats() if pacer else None
+        }))
+    except BaseException:
+        results.put(("error", traceback.format_exc()))
+
+
+class ShardedScan:
+    """
+    Runs a scan across worker processes (--procs), one engine per process.
+    
+    A feeder thread expands the target stream in the parent and hands hosts
+    to the workers in small chunks through a bounded queue, so idle workers
+    pick up the next chunk and a single busy host cannot stall the others.
+    Every host is scanned entirely by one worker. Its probe results and its
+    completed host result come back over one result queue in the order that
+    worker produced them. Port results are sent as tuples and port states as
+    the compact PortStateStore. Workers are started by a fork server (or
+    spawned) rather than forked from the parent, which already runs
+    resolver threads.
+    """
+    
+    HOSTS_PER_TASK = 4
+    PROBE_BATCH = 256
+    
+    def __init__(self, checker: NetworkChecker, args: argparse.Namespace, procs: int):
+        self.checker = checker
+        self.args = args
+        self.procs = procs
+    
+    def run(self, hosts: Iterable[str], ports: "PortSet",
+            on_host_complete: Optional[Callable[[dict], None]] = None,
+            on_probe: Optional[Callable[[str, Optional[int], dict], None]] = None,
+            keep_results: bool = True, health: Optional["HealthCheck"] = None,
+            restored: Optional[dict] = None) -> List[dict]:
+        """
+        Scan hosts x ports in `procs` worker processes.
+        
+        Checkpointed probes in `restored` travel with their host's chunk.
+        
+        Returns:
+            List of host results ({"host", "dns", "ping", "ports"}) in completion order
+        """
+        import multiprocessing
+        
+        # Never fork this process: its DNS resolver and ICMP receiver threads may hold locks
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        options = {
+            "args": vars(self.args),
+            "ports": ports,
+            "stream_probes": on_probe is not None,
+            "keep_results": keep_results,
+        }
+        tasks = context.Queue(maxsize=self.procs * 4)
+        results = context.Queue()
+        workers = [context.Process(target=_shard_worker, args=(options, tasks, results), daemon=True)
+                   for _ in range(self.procs)]
+        for worker in workers:
+            worker.start()
+        
+        def feed():
+            chunk = []
+            for host in hosts:
+                chunk.append((host, restored.get(host) if restored is not None else None))
+                if len(chunk) == self.HOSTS_PER_TASK:
+                    tasks.put(chunk)
+                    chunk = []
+            if chunk:
+                tasks.put(chunk)
+            for _ in workers:
+                tasks.put(None)
+        
+        threading.Thread(target=feed, daemon=True).start()
+        
+        completed = []
+        running = len(workers)
+        while running:
+            try:
+                kind, payload = results.get(timeout=1)
+            except queue.Empty:  # Check that no worker died silently
+                if any(w.exitcode not in (None, 0) for w in workers):
+                    raise RuntimeError("a --procs worker process exited unexpectedly")
+                continue
+            if kind == "probes":
+                for host, port, result in payload:
+                    if port is not None:
+                        is_open, error, response_time, checked_at = result
+                        result = {"host": host, "port": port, "open": is_open,
+                                  "error": error, "response_time": response_time}
+                        if checked_at:
+                            result.update(inherited=True, checked_at=checked_at)
+                    on_probe(host, port, result)
+            elif kind == "host":
+                decision = payload.pop("health", None)
+                if health and decision is not None:
+                    health.decisions[payload["host"]] = decision
+                if keep_results:
+                    completed.append(payload)
+                if on_host_complete:
+                    on_host_complete(payload)
+            elif kind == "exit":
+                running -= 1
+                if payload["profile"] and self.checker.profiler:
+                    self.checker.profiler.merge(*payload["profile"])
+                if payload["pacer"] and self.checker.pacer:
+                    self.checker.pacer.absorb(payload["pacer"])
+            elif kind == "error":
+                for worker in workers:
+                    worker.terminate()
+                raise RuntimeError(f"--procs worker failed:\n{payload}")
+        
+        for worker in workers:
+            worker.join()
+        return completed
+
+
+class AliasFanout:
+    """
+    Probes each resolved address once when several targets resolve to it.
+    
+    Targets are resolved ahead of the engines through the scan's DnsCache,
+    with up to LOOKAHEAD lookups in flight. The first target that resolves to
+    an address is scanned; later targets with the same address become its
+    aliases and are not handed to the engine. When the scanned host
+    completes, its result is reported again for every alias, tagged with
+    "alias_of", and so is each of its probe results when probes are streamed.
+    The last MAX_RETAINED scanned results are kept for aliases that turn up
+    after their address was already scanned. Those are reported with the next
+    completed host, or by flush() when the scan ends.
+    """
+    
+    LOOKAHEAD = 64
+    MAX_RETAINED = 256
+    
+    def __init__(self, dns: DnsCache, ports: "PortSet", ping: bool = True,
+                 on_host_complete: Optional[Callable[[dict], None]] = None,
+                 on_probe: Optional[Callable[[str, Optional[int], dict], None]] = None,
+                 keep_results: bool = True, health: Optional[HealthCheck] = None,
+                 restored: Optional[dict] = None):
+        self.dns = dns
+        self.ports = ports
+        self.ping = ping
+        self.user_host_complete = on_host_complete
+        self.user_probe = on_probe
+        self.keep_results = keep_results
+        self.health = health
+        # Only checkpointed probes matter here: inherited results of an IncrementalPlan
+        # reach on_probe like fresh ones, and aliases are never planned since they are not probed
+        self.checkpoint = restored.restored if isinstance(restored, IncrementalPlan) else (restored or {})
+        self.aliases = 0
+        self._primaries = {}            # address -> host being scanned for it
+        self._scanning = {}             # host -> {"address", "aliases", "stream"}
+        self._finished = OrderedDict()  # address -> (host result, ping, ports, health decision)
+        self._late = deque()            # (alias, finished entry) seen after the address was scanned
+        self._lock = threading.Lock()
+    
+    def hosts(self, targets: Iterable[str]) -> Iterator[str]:
+        """Yield the targets to scan, holding back those whose address is already covered."""
+        window = deque()
+        for host in targets:
+            window.append((host, self.dns.submit(host)))
+            if len(window) >= self.LOOKAHEAD:
+                yield from self._admit(*window.popleft())
+        while window:
+            yield from self._admit(*window.popleft())
+    
+    def _admit(self, host: str, future: Future) -> Iterator[str]:
+        try:
+            entry = future.result()
+        except Exception:
+            entry = None
+        address = DnsCache.first_address(entry) if entry and not entry["error"] else None
+        if address is None:
+            yield host  # Unresolvable targets fail on their own
+            return
+        with self._lock:
+            primary = self._primaries.get(address)
+            if primary is not None and primary != host:
+                self._scanning[primary]["aliases"].append(host)
+                self.aliases += 1
+                return
+            finished = self._finished.get(address)
+            if finished is not None and finished[0]["host"] != host:
+                self._late.append((host, finished))
+                self.aliases += 1
+                return
+            stream = None
+            if self.user_probe and not self.keep_results:
+                # Host results carry no ports when only probes are streamed; keep our own copy
+                stream = [None, PortStateStore(host, self.ports)]
+                for port, result in self.checkpoint.get(host, {}).items():
+                    if port is None:
+                        stream[0] = result
+                    elif port in self.ports:
+                        stream[1].record(result)
+            self._primaries[address] = host
+            self._scanning[host] = {"address": address, "aliases": [], "stream": stream}
+        yield host
+    
+    def on_probe(self, host: str, port: Optional[int], result: dict) -> None:
+        """Pass a probe result on, keeping a copy while aliases may still need it."""
+        scanning = self._scanning.get(host)
+        if scanning is not None and scanning["stream"] is not None:
+            if port is None:
+                scanning["stream"][0] = result
+            else:
+                scanning["stream"][1].record(result)
+        self.user_probe(host, port, result)
+    
+    def on_host_complete(self, result: dict) -> None:
+        """Report a scanned host, then every alias of its address."""
+        host = result["host"]
+        decision = self.health.decisions.get(host) if self.health else None
+        finished = None
+        with self._lock:
+            scanning = self._scanning.pop(host, None)
+            if scanning is not None:
+                del self._primaries[scanning["address"]]
+                ping, ports = scanning["stream"] or (result["ping"], result["ports"])
+                finished = (result, ping, ports, decision)
+                self._finished[scanning["address"]] = finished
+                while len(self._finished) > self.MAX_RETAINED:
+                    self._finished.popitem(last=False)
+        if self.user_host_complete:
+            self.user_host_complete(result)
+        for alias in scanning["aliases"] if scanning else ():
+            self._report_alias(alias, finished)
+        self.flush()
+    
+    def flush(self) -> None:
+        """Report aliases that appeared after their address was scanned."""
+        while self._late:
+            self._report_alias(*self._late.popleft())
+    
+    def _report_alias(self, alias: str, finished: tuple) -> None:
+        result, ping, ports, decision = finished
+        primary = result["host"]
+        done = self.checkpoint.get(alias, {})
+        if self.user_probe:
+            if ping is not None and self.ping and None not in done:
+                self.user_probe(alias, None, dict(ping, host=alias, alias_of=primary))
+            for probe in ports or ():
+                if probe["port"] not in done:  # Already reported before a resume
+                    self.user_probe(alias, probe["port"], dict(probe, host=alias, alias_of=primary))
+        if self.health and decision is not None:
+            self.health.decisions[alias] = decision
+        if self.user_host_complete:
+            self.user_host_complete(dict(result, host=alias, dns=self.dns.lookup(alias),
+                                         alias_of=primary))
+
+
+def run_engine(checker: NetworkChecker, args: argparse.Namespace,
+               hosts: Iterable[str], ports: List[int],
+               on_host_complete: Optional[Callable[[dict], None]] = None,
+               on_probe: Optional[Callable[[str, Optional[int], dict], None]] = None,
+               keep_results: bool = True,
+               health: Optional[HealthCheck] = None,
+               restored: Optional[dict] = None) -> List[dict]:
+    """
+    Run the scan engine selected on the command line over hosts x ports.
+    
+    Unless --no-dedupe is given, targets that resolve to the same address are
+    probed once and reported under every name (see AliasFanout).
+    """
+    if isinstance(restored, IncrementalPlan):
+        # A host's plan stays cached while it is scanned; drop it once the host is reported
+        report = on_host_complete
+        
+        def on_host_complete(result: dict) -> None:
+            restored.release(result["host"])
+            if report:
+                report(result)
+    
+    if getattr(args, "no_dedupe", True):
+        return dispatch_engine(checker, args, hosts, ports, on_host_complete, on_probe,
+                               keep_results, health, restored)
+    fanout = AliasFanout(checker.dns, ports, not args.no_ping, on_host_complete, on_probe,
+                         keep_results, health, restored)
+    results = dispatch_engine(checker, args, fanout.hosts(hosts), ports, fanout.on_host_complete,
+                              fanout.on_probe if on_probe else None, keep_results, health, restored)
+    fanout.flush()
+    return results
+
+def dispatch_engine(checker: NetworkChecker, args: argparse.Namespace,
+                    hosts: Iterable[str], ports: List[int],
+                    on_host_complete: Optional[Callable[[dict], None]] = None,
+                    on_probe: Optional[Callable[[str, Optional[int], dict], None]] = None,
+                    keep_results: bool = True,
+                    health: Optional[HealthCheck] = None,
+                    restored: Optional[dict] = None) -> List[dict]:
+    """Hand hosts x ports to the coordinator, the worker processes or the local engine."""
+    if getattr(args, "serve", None):
+        coordinator = ScanCoordinator(args, hosts, ports, unit_size=args.unit_size,
+                                      lease=args.lease, token=args.token,
+                                      on_host_complete=on_host_complete, on_probe=on_probe,
+                                      health=health, restored=restored)
+        coordinator.serve(args.serve)
+        print(coordinator.format_summary(), file=sys.stderr)
+        return []
+    if args.procs > 1:
+        return ShardedScan(checker, args, args.procs).run(
+            hosts, ports, on_host_complete=on_host_complete, on_probe=on_probe,
+            keep_results=keep_results, health=health, restored=restored)
+    options = {
+        "ping_count": args.ping_count,
+        "ping": not args.no_ping,
+        "on_host_complete": on_host_complete,
+        "on_probe": on_probe,
+        "keep_results": keep_results,
+        "stop_when": health.decided if health else None,
+        "restored": restored
+    }
+    if args.engine == "async":
+        return asyncio.run(checker.scan_hosts_async(hosts, ports, **options))
+    if args.engine == "select":
+        return checker.scan_hosts_selector(hosts, ports, **options)
+    # Schedule ping and port probes from every host on one shared pool
+    return checker.scan_hosts_parallel(hosts, ports, **options)
 
 def main():
+    if sys.argv[1:2] == ["history"]:
+        history_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["worker"]:
+        worker_main(sys.argv[2:])
+        return
+    
     parser = argparse.ArgumentParser(
         description="Enhanced Network Connectivity Checker - Test ping and port connectivity",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -225,8 +3905,16 @@ def main():
 Examples:
   %(prog)s --hosts google.com github.com
   %(prog)s --hosts 192.168.1.1 --ports 80 443 22
+  %(prog)s --hosts 192.168.1.0/24 10.0.0.1-10.0.0.50 --host-file sample_hosts.txt --ports 22
   %(prog)s --hosts example.com --port-ranges "80,443,8000-8010"
   %(prog)s --hosts server.local --ports 22 --timeout 5 --parallel
+  %(prog)s --hosts 10.0.0.1 10.0.0.2 --port-ranges "1-1024" --engine async
+  %(prog)s --hosts 10.0.0.1 --port-ranges "1-65535" --engine select --output ndjson --output-file scan.ndjson.gz
+  %(prog)s --hosts critical-server.com --ports 80 443 --watch 300
+  %(prog)s --hosts lb1.local lb2.local --ports 80 443 8080 --until any-open --no-ping
+  %(prog)s --hosts 10.0.0.5 --ports 443 --history scans.db
+  %(prog)s history scans.db flaps 10.0.0.5:443
+  %(prog)s --hosts 10.0.0.0/16 --ports 22 443 --serve 0.0.0.0:7700   (then: %(prog)s worker HOST:7700)
         """
     )
 
@@ -234,8 +3922,15 @@ Examples:
         "--hosts",
         nargs="+",
         type=str,
-        help="List of hosts to check (hostnames or IP addresses)",
-        required=True
+        help="List of hosts to check (hostnames, IP addresses, CIDR blocks like 10.0.0.0/24, "
+             "or ranges like 10.0.0.1-10.0.0.50)"
+    )
+    
+    parser.add_argument(
+        "--host-file",
+        action="append",
+        type=str,
+        help="File with one host, CIDR block or range per line ('#' comments allowed); may be repeated"
     )
 
     parser.add_argument(
@@ -285,63 +3980,424 @@ Examples:
         default=10,
         help="Number of parallel workers for port scanning (default: 10)"
     )
+    
+    parser.add_argument(
+        "--engine",
+        choices=["thread", "async", "select"],
+        default="thread",
+        help="Scan engine: 'thread' (default), 'async' (asyncio) or 'select' "
+             "(non-blocking connects on one thread) to probe all hosts and ports concurrently"
+    )
+    
+    parser.add_argument(
+        "--ping-engine",
+        choices=["auto", "icmp", "subprocess"],
+        default="auto",
+        help="Ping with in-process ICMP sockets ('icmp'), the system ping command "
+             "('subprocess'), or ICMP when permitted ('auto', default)"
+    )
+    
+    parser.add_argument(
+        "--dns-ttl",
+        type=float,
+        default=300,
+        help="Seconds to cache resolved host names (default: 300)"
+    )
+    
+    parser.add_argument(
+        "--watch",
+        type=float,
+        metavar="INTERVAL",
+        default=None,
+        help="Keep re-checking every INTERVAL seconds, spreading probes over the interval "
+             "and reporting only state changes"
+    )
+    
+    parser.add_argument(
+        "--output",
+        choices=["text", "ndjson"],
+        default="text",
+        help="Output format: 'text' report (default) or 'ndjson', one JSON record per probe streamed as it completes"
+    )
+    
+    parser.add_argument(
+        "--output-file",
+        type=str,
+        default=None,
+        help="Write NDJSON output to this file instead of stdout (gzip-compressed if it ends in .gz)"
+    )
+    
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="Gzip-compress NDJSON output"
+    )
+    
+    parser.add_argument(
+        "--procs",
+        type=int,
+        default=1,
+        help="Shard hosts across this many worker processes, each running its own engine, "
+             "to use more than one CPU core (default: 1)"
+    )
+    
+    parser.add_argument(
+        "--serve",
+        type=str,
+        metavar="ADDRESS",
+        default=None,
+        help="Coordinate a distributed scan: listen on host:port or unix:/path and hand the "
+             "targets to workers started with '%(prog)s worker ADDRESS' instead of scanning locally"
+    )
+    
+    parser.add_argument(
+        "--unit-size",
+        type=int,
+        default=8,
+        help="With --serve, hosts per work unit leased to a worker (default: 8)"
+    )
+    
+    parser.add_argument(
+        "--lease",
+        type=float,
+        default=30,
+        help="With --serve, seconds without word from a worker before its unit is reassigned (default: 30)"
+    )
+    
+    parser.add_argument(
+        "--token",
+        type=str,
+        default=os.environ.get("PINGPORT_TOKEN"),
+        help="With --serve, shared token workers must present (default: $PINGPORT_TOKEN)"
+    )
+    
+    parser.add_argument(
+        "--until",
+        choices=HealthCheck.MODES,
+        default=None,
+        help="Health-check mode: probe common service ports first and stop probing a host once "
+             "'any-open' or 'all-open' is decided; exit code 0 only if every host passes"
+    )
+    
+    parser.add_argument(
+        "--adaptive-timeout",
+        action="store_true",
+        help="Derive each host's connect timeout from its measured RTT (ping and answered "
+             "connects), using --timeout as the ceiling; shortened timeouts are retried"
+    )
+    
+    parser.add_argument(
+        "--min-timeout",
+        type=float,
+        default=0.1,
+        help="With --adaptive-timeout, the shortest connect timeout in seconds (default: 0.1)"
+    )
+    
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=2,
+        help="With --adaptive-timeout, retries for probes that time out before --timeout, "
+             "each with a doubled timeout (default: 2)"
+    )
+    
+    parser.add_argument(
+        "--rate",
+        type=float,
+        metavar="PPS",
+        default=None,
+        help="Pace TCP probes to at most PPS per second overall, adapting the rate down "
+             "when probes start timing out (default: unpaced)"
+    )
+    
+    parser.add_argument(
+        "--host-rate",
+        type=float,
+        metavar="PPS",
+        default=None,
+        help="With --rate, the per-target probe rate ceiling (default: same as --rate)"
+    )
+    
+    parser.add_argument(
+        "--min-rate",
+        type=float,
+        metavar="PPS",
+        default=1,
+        help="With --rate, the floor the adaptive rate never drops below (default: 1)"
+    )
+    
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time the DNS, connect and ping phases and print p50/p95/p99 latency summaries"
+    )
+    
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        metavar="FILE",
+        default=None,
+        help="Journal every finished probe to FILE every few seconds, so an interrupted scan "
+             "can be continued with --resume"
+    )
+    
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="With --checkpoint, skip the probes already in the journal and append to "
+             "--output-file and the journal instead of overwriting them"
+    )
+    
+    parser.add_argument(
+        "--history",
+        type=str,
+        metavar="DB",
+        default=None,
+        help="Append every probe result to this SQLite history database "
+             "(query it with: %(prog)s history DB ...)"
+    )
+    
+    parser.add_argument(
+        "--no-dedupe",
+        action="store_true",
+        help="Probe every target name separately, even when several resolve to the same address"
+    )
+    
+    parser.add_argument(
+        "--incremental",
+        type=str,
+        metavar="SOURCE",
+        default=None,
+        help="Incremental rescan: reuse the results in SOURCE (a --history database or an NDJSON "
+             "output file) and only probe open, recently changed, new and sampled ports; "
+             "stable closed/filtered ports inherit their last result"
+    )
+    
+    parser.add_argument(
+        "--stable-days",
+        type=float,
+        default=7,
+        help="With --incremental, ports unchanged for this many days count as stable (default: 7)"
+    )
+    
+    parser.add_argument(
+        "--sample-rate",
+        type=float,
+        default=0.05,
+        help="With --incremental, share of stable ports re-probed anyway on each run (default: 0.05)"
+    )
+    
+    parser.add_argument(
+        "--full-sweep",
+        type=float,
+        metavar="DAYS",
+        default=30,
+        help="With --incremental, re-probe every port not actually probed for this many days (default: 30)"
+    )
+    
+    parser.add_argument(
+        "--sample-seed",
+        type=int,
+        help="With --incremental, seed for drawing the --sample-rate ports, to repeat a run's sample"
+    )
+    
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=500,
+        help="Maximum in-flight probes across all hosts for the async and select engines (default: 500)"
+    )
 
     args = parser.parse_args()
 
-    # Combine individual ports and port ranges
-    all_ports = args.ports.copy()
-    if args.port_ranges:
-        try:
-            range_ports = parse_port_ranges(args.port_ranges)
-            all_ports.extend(range_ports)
-        except ValueError as e:
-            print(f"Error parsing port ranges: {e}", file=sys.stderr)
-            sys.exit(1)
+    if not args.hosts and not args.host_file:
+        parser.error("at least one of --hosts or --host-file is required")
+    for path in args.host_file or []:
+        if not os.path.isfile(path):
+            parser.error(f"host file not found: {path}")
+
+    # Combine individual ports and port ranges; duplicates are removed and ranges stay lazy
+    try:
+        port_set = PrioritizedPortSet if args.until else PortSet
+        all_ports = port_set.parse(args.port_ranges, args.ports)
+    except ValueError as e:
+        print(f"Error parsing port ranges: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.until and not all_ports:
+        parser.error("--until requires --ports or --port-ranges")
+    if args.until and args.watch:
+        parser.error("--until cannot be combined with --watch")
+    health = HealthCheck(args.until) if args.until else None
     
-    # Remove duplicates and sort
-    all_ports = sorted(set(all_ports))
+    # Expand CIDR blocks, address ranges and host files as the engines consume them
+    targets = iter_targets(args.hosts or [], args.host_file or [])
 
-    # Initialize checker
-    checker = NetworkChecker(timeout=args.timeout, max_workers=args.workers)
+    for name in ("rate", "host_rate", "min_rate"):
+        value = getattr(args, name)
+        if value is not None and value <= 0:
+            parser.error(f"--{name.replace('_', '-')} must be positive")
+    if args.min_timeout <= 0 or args.retries < 0:
+        parser.error("--min-timeout must be positive and --retries non-negative")
+    if args.procs < 1:
+        parser.error("--procs must be at least 1")
+    if args.procs > 1 and args.watch:
+        parser.error("--procs cannot be combined with --watch")
+    if args.resume and not args.checkpoint:
+        parser.error("--resume requires --checkpoint FILE")
+    if args.checkpoint and args.watch:
+        parser.error("--checkpoint cannot be combined with --watch")
+    if args.incremental:
+        if args.watch or args.until or args.serve:
+            parser.error("--incremental cannot be combined with --watch, --until or --serve")
+        if not 0 <= args.sample_rate <= 1 or args.stable_days < 0 or args.full_sweep <= 0:
+            parser.error("--sample-rate must be between 0 and 1, --stable-days non-negative "
+                         "and --full-sweep positive")
+    if (args.output_file or args.gzip) and args.output != "ndjson":
+        parser.error("--output-file and --gzip require --output ndjson")
+    if args.serve:
+        if args.watch or args.procs > 1:
+            parser.error("--serve cannot be combined with --watch or --procs")
+        if args.unit_size < 1 or args.lease <= 0:
+            parser.error("--unit-size must be at least 1 and --lease positive")
+        try:
+            parse_endpoint(args.serve)
+        except ValueError as e:
+            parser.error(f"--serve: {e}")
 
-    print(f"Network Connectivity Checker")
-    print(f"{'=' * 60}")
-    print(f"Timeout: {args.timeout}s | Ping Count: {args.ping_count}")
-    if all_ports:
-        print(f"Ports to check: {', '.join(map(str, all_ports))}")
-    print(f"Parallel scanning: {'Enabled' if args.parallel else 'Disabled'}")
-    print()
+    checker = build_checker(args)
+    # Checked once up front instead of failing mid-scan; with --serve only the workers ping
+    if checker.ping_engine == "icmp" and not args.no_ping and not args.serve and not checker.icmp.available():
+        parser.error(f"--ping-engine icmp: {IcmpPinger.UNAVAILABLE}")
 
-    # Process each host
-    for i, host in enumerate(args.hosts):
-        if i > 0:
-            print()  # Add spacing between hosts
+    with ExitStack() as stack:
+        journal = None
+        restored = None
+        if args.checkpoint:
+            try:
+                journal = stack.enter_context(CheckpointJournal(
+                    args.checkpoint, all_ports, ping=not args.no_ping, resume=args.resume))
+            except (OSError, ValueError) as e:
+                print(f"Error opening checkpoint: {e}", file=sys.stderr)
+                sys.exit(1)
+            restored = journal.restored
+            if args.resume:
+                print(f"Resuming: {journal.restored_probes} probe(s) on {len(restored)} host(s) "
+                      f"already done in {args.checkpoint}", file=sys.stderr)
+            
+            def note_resume(exc_type, exc, tb):
+                if exc_type is KeyboardInterrupt:
+                    print(f"\nProgress saved to {args.checkpoint}; add --resume to continue.", file=sys.stderr)
+            
+            stack.push(note_resume)
         
-        print(f"🔍 Checking: {host}")
-        print("-" * 40)
+        plan = None
+        if args.incremental:
+            try:
+                baseline = stack.enter_context(ScanBaseline(args.incremental, all_ports))
+            except (OSError, ValueError, sqlite3.Error) as e:
+                print(f"Error reading incremental baseline: {e}", file=sys.stderr)
+                sys.exit(1)
+            restored = plan = IncrementalPlan(baseline, args.stable_days, args.sample_rate,
+                                              args.full_sweep, restored=restored, seed=args.sample_seed)
         
-        # Ping test
-        if not args.no_ping:
-            print("📡 Ping Test:")
-            ping_result = checker.ping_host(host, args.ping_count)
-            print(f"    {checker.format_ping_results(ping_result)}")
+        # Optional sinks that see every probe result, whatever the output mode
+        probe_sinks = []
+        if args.history:
+            history = stack.enter_context(ScanHistory(args.history))
+            history.begin_scan(" ".join(sys.argv[1:]))
+            probe_sinks.append(history.record_probe)
+            if journal:
+                # Rows are committed before the journal claims their probes, so none is lost on resume
+                journal.flush_hooks.append(history.flush)
+        # The journal goes last, so a probe is only journaled once every other sink has it
+        journal_sink = [journal.record_probe] if journal else []
+        on_probe = combine_probe_callbacks(probe_sinks + journal_sink)
+        # Summaries are printed last, even if the scan is interrupted; kept off stdout for NDJSON
+        summary_stream = sys.stderr if args.output == "ndjson" else sys.stdout
+        if checker.profiler:
+            stack.callback(lambda: print("\n" + checker.profiler.format_summary(), file=summary_stream))
+        if checker.pacer:
+            stack.callback(lambda: print("\n" + checker.pacer.format_summary(), file=summary_stream))
+        if plan is not None:
+            stack.callback(lambda: print("\n" + plan.format_summary(), file=summary_stream))
         
-        # Port checks
+        if args.watch:
+            hosts = list(targets)
+            if args.output == "ndjson":
+                with NdjsonWriter(args.output_file, compress=args.gzip, batch_size=1) as writer:
+                    WatchMonitor(checker, hosts, all_ports, args.watch, args.ping_count,
+                                 not args.no_ping, emit=writer.write, on_probe=on_probe).run()
+                return
+            print(f"Watching {len(hosts)} host(s) x {len(all_ports)} port(s) every {args.watch}s "
+                  f"- reporting changes only")
+            WatchMonitor(checker, hosts, all_ports, args.watch, args.ping_count,
+                         not args.no_ping, on_probe=on_probe).run()
+            return
+
+        if args.output == "ndjson":
+            # Stream one record per probe; nothing is retained per host
+            with NdjsonWriter(args.output_file, compress=args.gzip, append=args.resume) as writer:
+                if journal:
+                    journal.flush_hooks.append(writer.flush)
+                
+                def on_host_complete(result):
+                    dns_record = NdjsonWriter.dns_record(result)
+                    if dns_record:
+                        writer.write(dns_record)
+                    if health:
+                        writer.write(health.host_record(result))
+                
+                run_engine(checker, args, targets, all_ports, on_host_complete=on_host_complete,
+                           on_probe=combine_probe_callbacks(probe_sinks + [writer.write_probe] + journal_sink),
+                           keep_results=False, health=health, restored=restored)
+            if health:
+                sys.exit(health.exit_code)
+            return
+
+        print(f"Network Connectivity Checker")
+        print(f"{'=' * 60}")
+        if args.adaptive_timeout:
+            print(f"Timeout: adaptive {args.min_timeout:g}-{args.timeout}s, up to {args.retries} "
+                  f"retries | Ping Count: {args.ping_count}")
+        else:
+            print(f"Timeout: {args.timeout}s | Ping Count: {args.ping_count}")
         if all_ports:
-            print("🔌 Port Scan:")
-            
-            if args.parallel and len(all_ports) > 1:
-                port_results = checker.scan_ports_parallel(host, all_ports)
-            else:
-                port_results = []
-                for port in all_ports:
-                    port_results.append(checker.check_port(host, port))
-            
-            formatted_results = checker.format_port_results(port_results)
-            if formatted_results:
-                print(formatted_results)
-            else:
-                print("    No port results available")
+            print(f"Ports to check: {all_ports} ({len(all_ports)} ports)")
+        if args.engine in ("async", "select"):
+            print(f"Engine: {args.engine} (concurrency {args.concurrency})")
+        else:
+            parallel_info = f"Enabled ({args.workers} workers across all hosts)" if args.parallel else "Disabled"
+            print(f"Parallel scanning: {parallel_info}")
+        if args.procs > 1:
+            print(f"Processes: {args.procs} (hosts sharded across worker processes)")
+        if args.serve:
+            print(f"Distributed: coordinating workers on {args.serve} ({args.unit_size} hosts per unit)")
+        if checker.pacer:
+            print(f"Pacing: adaptive, up to {args.rate:g} probes/s"
+                  + (f" ({args.host_rate:g}/s per target)" if args.host_rate else ""))
+        if plan is not None:
+            print(f"Incremental: baseline {args.incremental}, stable after {args.stable_days:g} days, "
+                  f"{args.sample_rate:.0%} sampled, full sweep every {args.full_sweep:g} days")
+        print()
+
+        printed = []
+        
+        def on_host_complete(result):
+            print_host_result(checker, result, first=not printed)
+            if health:
+                print(HealthCheck.format_record(health.host_record(result)))
+            printed.append(result["host"])
+        
+        if health:
+            run_engine(checker, args, targets, all_ports, on_host_complete=on_host_complete,
+                       on_probe=on_probe, health=health, restored=restored)
+            print()
+            print(f"Health check ({args.until}): {health.healthy} of "
+                  f"{health.healthy + health.unhealthy} host(s) healthy")
+            sys.exit(health.exit_code)
+        
+        run_engine(checker, args, targets, all_ports,
+                   on_host_complete=on_host_complete, on_probe=on_probe, restored=restored)
 
 if __name__ == "__main__":
     try:
@@ -5,21 +5,765 @@ A user-friendly graphical interface for network connectivity testing.
 """
 
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, scrolledtext
+from tkinter import ttk, filedialog, messagebox
 import subprocess
 import socket
+import selectors
+import errno
 import threading
 import time
 import platform
+import bisect
+import re
+from array import array
+from itertools import islice
 import json
 import csv
+import gzip
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed, wait, FIRST_COMPLETED
 from typing import List, Dict, Any
 import os
+import queue
 import sys
 
+from pingport_cli import AliasFanout, DnsCache, IcmpPinger, NdjsonWriter, PortSet, PortStateStore
+
+class ResultsModel:
+    """
+    Per-host scan results and the filtered, sorted rows the results table shows.
+    
+    Records are the host result dicts built by scan_host(), kept in arrival
+    order; their port results stay in a PortStateStore and are only rendered
+    as dicts when a host is expanded or exported. Rows are what the table scrolls through: a record index for each
+    visible host, followed by (index, line) pairs for its detail lines while
+    the host is expanded. Detail lines are only built when a host is expanded.
+    
+    Records are indexed as they arrive (host name trigrams, open ports, port
+    states, error classes and failed pings), so a filter is an intersection of
+    index postings rather than a pass over every record.
+    """
+    
+    COLUMNS = ("#0", "ping", "open", "closed", "details")
+    PORT_PREVIEW = 10  # Open ports listed in a host row before "+N more"
+    
+    def __init__(self):
+        self.records = []
+        self.summaries = []      # Per record: (host, ping, open, closed, details, tag)
+        self.sort_column = None  # None keeps arrival order
+        self.sort_descending = False
+        self.sorted = []         # Every record index, ascending by sort key
+        self._keys = []          # (sort key, index) parallel to self.sorted
+        self.filter = None       # (search, failed pings only, failed ports only), or None
+        self.clauses = []        # Parsed search of the current filter
+        self.order = self.sorted  # Record indexes that pass the filter, in sort order
+        self._order_keys = []    # (sort key, index) parallel to a filtered, sorted self.order
+        self.expanded = {}       # Record index -> detail lines
+        self._rows = None
+        
+        # Search index, kept up to date as records arrive. Postings are record
+        # indexes in arrival order, stored as compact arrays.
+        self.hosts_lower = []
+        self.trigrams = {}       # Host name trigram -> records
+        self.open_ports = {}     # Port -> records with that port open
+        self.states = {state: array('I') for state in PortStateStore.STATES}  # State -> records with a port in it
+        self.errors = {}         # Error class -> records with a port that failed that way
+        self.failed_pings = array('I')
+    
+    def clear(self):
+        """Drop all records but keep the filter; the records list itself is kept, since callers share it."""
+        self.records.clear()
+        self.summaries.clear()
+        self.sorted.clear()
+        self._keys.clear()
+        self.order = [] if self.filter else self.sorted
+        self._order_keys = []
+        self.expanded.clear()
+        self._rows = None
+        self.hosts_lower.clear()
+        self.trigrams.clear()
+        self.open_ports.clear()
+        self.states = {state: array('I') for state in PortStateStore.STATES}
+        self.errors.clear()
+        self.failed_pings = array('I')
+    
+    def add(self, result):
+        """Append a host result, index it and place it in the view if it passes the filter."""
+        index = len(self.records)
+        self.records.append(result)
+        self.summaries.append(self.summarize(result))
+        self._index(index, result)
+        
+        if self.sort_column is None:
+            self.sorted.append(index)
+            if self.filter and self.matches(index):
+                self.order.append(index)
+        else:
+            key = (self.sort_key(index), index)
+            position = bisect.bisect(self._keys, key)
+            self._keys.insert(position, key)
+            self.sorted.insert(position, index)
+            if self.filter and self.matches(index):
+                position = bisect.bisect(self._order_keys, key)
+                self._order_keys.insert(position, key)
+                self.order.insert(position, index)
+        self._rows = None
+    
+    def _index(self, index, result):
+        host = result["host"].lower()
+        self.hosts_lower.append(host)
+        for trigram in {host[i:i + 3] for i in range(len(host) - 2)}:
+            self.trigrams.setdefault(trigram, array('I')).append(index)
+        
+        ports = result["ports"]
+        for state in PortStateStore.STATES:
+            if ports.count(state):
+                self.states[state].append(index)
+        for port in ports.ports_in(PortStateStore.OPEN):
+            self.open_ports.setdefault(port, array('I')).append(index)
+        for error in {self.error_class(error) for error in ports.error_messages()}:
+            self.errors.setdefault(error, array('I')).append(index)
+        
+        if result["ping"] and not result["ping"]["success"]:
+            self.failed_pings.append(index)
+    
+    @staticmethod
+    def error_class(error):
+        """Error message without its errno prefix, e.g. "connection refused"."""
+        return re.sub(r"^\[Errno -?\d+\]\s*", "", str(error)).lower()
+    
+    @staticmethod
+    def parse_query(text):
+        """
+        Split a search into clauses that must all match.
+        
+        Plain words match host names (and open ports, for numbers);
+        "port:443", "state:filtered" and "error:refused" match port results.
+        """
+        clauses = []
+        for word in text.lower().split():
+            field, _, value = word.partition(":")
+            if field == "port" and value.isdigit():
+                clauses.append(("port", int(value)))
+            elif field in ("state", "error") and value:
+                clauses.append((field, value))
+            else:
+                clauses.append(("text", word))
+        return clauses
+    
+    def set_filter(self, text="", failed_pings=False, failed_ports=False):
+        """Show only hosts matching a search and the failed ping/port toggles."""
+        clauses = self.parse_query(text)
+        self._rows = None
+        if not clauses and not failed_pings and not failed_ports:
+            self.filter = None
+            self.order = self.sorted
+            return
+        self.filter = (text, failed_pings, failed_ports)
+        self.clauses = clauses
+        
+        # Each clause and toggle is a set of records; the view is their intersection
+        candidates = [self._candidates(clause) for clause in clauses]
+        if failed_pings:
+            candidates.append(set(self.failed_pings))
+        if failed_ports:
+            candidates.append(set(self.states[PortStateStore.CLOSED]).union(self.states[PortStateStore.FILTERED]))
+        candidates.sort(key=len)
+        visible = candidates[0]
+        for other in candidates[1:]:
+            if not visible:
+                break
+            visible &= other
+        
+        if self.sort_column is None:
+            self.order = sorted(visible)
+        else:
+            self._order_keys = [key for key in self._keys if key[1] in visible]
+            self.order = [i for _, i in self._order_keys]
+    
+    def _candidates(self, clause):
+        kind, value = clause
+        if kind == "port":
+            return set(self.open_ports.get(value, ()))
+        if kind == "state":
+            return set().union(*(self.states[s] for s in PortStateStore.STATES if s.startswith(value)))
+        if kind == "error":
+            return set().union(*(records for error, records in self.errors.items() if value in error))
+        
+        # Host substring: intersect the postings of its trigrams, then confirm
+        if len(value) < 3:
+            hosts = {i for i, host in enumerate(self.hosts_lower) if value in host}
+        else:
+            trigrams = sorted((self.trigrams.get(value[i:i + 3], ()) for i in range(len(value) - 2)), key=len)
+            hosts = set(trigrams[0])
+            for postings in trigrams[1:]:
+                if not hosts:
+                    break
+                hosts.intersection_update(postings)
+            if len(value) > 3:
+                hosts = {i for i in hosts if value in self.hosts_lower[i]}
+        if value.isdigit():
+            hosts.update(self.open_ports.get(int(value), ()))
+        return hosts
+    
+    def matches(self, index):
+        """Whether one record passes the current filter (used for records added while filtering)."""
+        _, failed_pings, failed_ports = self.filter
+        result = self.records[index]
+        if failed_pings and not (result["ping"] and not result["ping"]["success"]):
+            return False
+        ports = result["ports"]
+        states = {state for state in PortStateStore.STATES if ports.count(state)}
+        if failed_ports and not states - {PortStateStore.OPEN}:
+            return False
+        open_ports = set(ports.ports_in(PortStateStore.OPEN))
+        for kind, value in self.clauses:
+            if kind == "port":
+                found = value in open_ports
+            elif kind == "state":
+                found = any(state.startswith(value) for state in states)
+            elif kind == "error":
+                found = any(value in self.error_class(error) for error in ports.error_messages())
+            else:
+                found = value in self.hosts_lower[index] or (value.isdigit() and int(value) in open_ports)
+            if not found:
+                return False
+        return True
+    
+    def sort_by(self, column):
+        """Cycle `column` through ascending, descending and back to scan order."""
+        if column != self.sort_column:
+            self.sort_column, self.sort_descending = column, False
+        elif not self.sort_descending:
+            # Same order, read backwards
+            self.sort_descending = True
+            self._rows = None
+            return
+        else:
+            self.sort_column, self.sort_descending = None, False
+        self._rebuild()
+    
+    def toggle(self, index):
+        """Expand or collapse the detail lines of a record."""
+        if index in self.expanded:
+            del self.expanded[index]
+        else:
+            self.expanded[index] = self.detail_lines(self.records[index])
+        self._rows = None
+    
+    @property
+    def rows(self):
+        """Rows in display order; rebuilt lazily after the view changed."""
+        if self._rows is None:
+            order = reversed(self.order) if self.sort_descending else self.order
+            if not self.expanded and not self.sort_descending:
+                self._rows = self.order
+            else:
+                rows = []
+                for index in order:
+                    rows.append(index)
+                    if index in self.expanded:
+                        rows.extend((index, line) for line in range(len(self.expanded[index])))
+                self._rows = rows
+        return self._rows
+    
+    def cells(self, row):
+        """Tree text, column values and tags of one row."""
+        if isinstance(row, int):
+            host, ping, open_count, closed_count, details, tag = self.summaries[row]
+            arrow = "▾" if row in self.expanded else "▸"
+            return f"{arrow} {host}", (ping, open_count, closed_count, details), (tag,)
+        index, line = row
+        label, text, tag = self.expanded[index][line]
+        return f"      {label}", ("", "", "", text), (tag, "detail")
+    
+    def sort_key(self, index):
+        """Sort key of a record for the current sort column."""
+        host, ping, open_count, closed_count, details, tag = self.summaries[index]
+        if self.sort_column == "#0":
+            return host.lower()
+        if self.sort_column == "ping":
+            ping_result = self.records[index]["ping"]
+            if ping_result is None:
+                return (2, 0)
+            return (0 if ping_result["success"] else 1, ping_result["duration"])
+        if self.sort_column == "open":
+            return open_count or 0
+        if self.sort_column == "closed":
+            return closed_count or 0
+        return details.lower()
+    
+    def _rebuild(self):
+        if self.sort_column is None:
+            self._keys = []
+            self.sorted[:] = range(len(self.records))
+        else:
+            self._keys = sorted((self.sort_key(i), i) for i in range(len(self.records)))
+            self.sorted[:] = [i for _, i in self._keys]
+        if self.filter:
+            self.set_filter(*self.filter)
+        self._rows = None
+    
+    @classmethod
+    def summarize(cls, result):
+        """Column values of a host row."""
+        dns = result.get("dns")
+        ping = result["ping"]
+        ports = result["ports"]
+        open_count = ports.count(PortStateStore.OPEN)
+        
+        if ping is None:
+            ping_cell = "skipped"
+        elif ping["success"]:
+            ping_cell = f"✓ {ping['duration']}s"
+        else:
+            ping_cell = "✗ unreachable"
+        
+        if result.get("alias_of"):
+            details = f"Same address as {result['alias_of']}"
+        elif dns and dns["error"]:
+            details = f"DNS: {dns['error']}"
+        else:
+            preview = [ports.result(port) for port in islice(ports.ports_in(PortStateStore.OPEN), cls.PORT_PREVIEW)]
+            details = ", ".join(f"{p['port']} ({p['response_time']}ms)" for p in preview)
+            if open_count > cls.PORT_PREVIEW:
+                details += f" +{open_count - cls.PORT_PREVIEW} more"
+        
+        if (dns and dns["error"]) or (ping and not ping["success"]):
+            tag = "error"
+        elif open_count:
+            tag = "success"
+        else:
+            tag = "info" if result.get("alias_of") else ""
+        counts = (open_count, len(ports) - open_count) if ports else ("", "")
+        return (result["host"], ping_cell) + counts + (details, tag)
+    
+    @staticmethod
+    def detail_lines(result):
+        """(label, text, tag) lines shown under an expanded host."""
+        lines = [("Time", result["timestamp"], "info")]
+        if result.get("alias_of"):
+            lines.append(("Alias", f"Same address as {result['alias_of']}: results reused, not probed again", "info"))
+        
+        # DNS results (skipped for IP literals)
+        dns = result.get("dns")
+        if dns and dns["error"]:
+            lines.append(("DNS", f"✗ {dns['error']}", "error"))
+        elif dns and dns["dns_time"]:
+            lines.append(("DNS", f"{', '.join(dns['addresses'])} ({dns['dns_time']}ms)", "info"))
+        
+        ping = result["ping"]
+        if ping and ping["success"]:
+            lines.append(("Ping", f"✓ REACHABLE ({ping['duration']}s)", "success"))
+        elif ping:
+            lines.append(("Ping", f"✗ UNREACHABLE ({' '.join(str(ping['output']).split())})", "error"))
+        
+        for port in result["ports"]:
+            if port["open"]:
+                lines.append((f"Port {port['port']}", f"open ({port['response_time']}ms)", "success"))
+            else:
+                lines.append((f"Port {port['port']}", f"closed ({port['error']})", "error"))
+        
+        if "traceroute" in result:
+            tag = "info" if result["traceroute"]["success"] else "error"
+            for number, line in enumerate(result["traceroute"]["output"].splitlines() or [""]):
+                lines.append(("Traceroute" if number == 0 else "", line, tag))
+        return lines
+
+
+class ResultsTable:
+    """
+    Virtual ttk.Treeview over a ResultsModel.
+    
+    Only the rows that fit in the widget exist as Treeview items. Scrolling and
+    new results rewrite those items in place, so a redraw costs the same with
+    ten hosts or a hundred thousand. The scrollbar is driven from the model.
+    """
+    
+    HEADINGS = {"#0": ("Host", 240), "ping": ("Ping", 110), "open": ("Open", 60),
+                "closed": ("Closed", 60), "details": ("Details", 360)}
+    
+    def __init__(self, parent, model):
+        self.model = model
+        self.top = 0            # First row shown
+        self.capacity = 20      # Rows that fit in the widget
+        self.follow = True      # Keep the newest rows in view while they stream in
+        self.selected = None    # Selected row (record index or (index, line))
+        self.slots = []         # Treeview items, one per visible row
+        self.shown = []         # (row, cells) currently written to each slot
+        
+        self.tree = ttk.Treeview(parent, columns=ResultsModel.COLUMNS[1:], show="tree headings",
+                                 selectmode="browse")
+        self.scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
+        
+        for column, (title, width) in self.HEADINGS.items():
+            self.tree.heading(column, text=title, anchor=tk.W, command=lambda c=column: self.sort_by(c))
+            self.tree.column(column, width=width, anchor=tk.W, stretch=column == "details")
+        
+        # Configure tags for colored rows
+        self.tree.tag_configure("success", foreground="green")
+        self.tree.tag_configure("error", foreground="red")
+        self.tree.tag_configure("info", foreground="blue")
+        self.tree.tag_configure("detail", font=('Consolas', 9))
+        
+        self.rowheight = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<Double-1>", self.on_double_click)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll_by(-3 if e.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll_by(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_by(3))
+        for key, step in (("<Up>", -1), ("<Down>", 1), ("<Prior>", "page-up"), ("<Next>", "page-down"),
+                          ("<Home>", "home"), ("<End>", "end")):
+            self.tree.bind(key, lambda e, s=step: self.move_selection(s))
+        self.tree.bind("<Return>", lambda e: self.toggle_selected())
+        self.tree.bind("<space>", lambda e: self.toggle_selected())
+    
+    def refresh(self):
+        """Redraw the visible window after the model changed."""
+        rows = self.model.rows
+        last_top = max(0, len(rows) - self.capacity)
+        self.top = last_top if self.follow else min(self.top, last_top)
+        visible = rows[self.top:self.top + self.capacity]
+        
+        # Grow or shrink the item pool to the window size
+        while len(self.slots) < len(visible):
+            self.slots.append(self.tree.insert("", tk.END))
+            self.shown.append(None)
+        while len(self.slots) > len(visible):
+            self.tree.delete(self.slots.pop())
+            self.shown.pop()
+        
+        for position, row in enumerate(visible):
+            cells = self.model.cells(row)
+            if self.shown[position] != (row, cells):
+                text, values, tags = cells
+                self.tree.item(self.slots[position], text=text, values=values, tags=tags)
+                self.shown[position] = (row, cells)
+        
+        selected = [self.slots[i] for i, row in enumerate(visible) if row == self.selected]
+        if tuple(selected) != tuple(self.tree.selection()):
+            self.tree.selection_set(selected)
+        
+        if rows:
+            self.scrollbar.set(self.top / len(rows), min(1.0, (self.top + self.capacity) / len(rows)))
+        else:
+            self.scrollbar.set(0, 1)
+    
+    def reset(self):
+        """Scroll back to the top, e.g. after sorting or filtering."""
+        self.top = 0
+        self.follow = False
+        self.refresh()
+    
+    def clear(self):
+        """Forget the scroll position and selection of a cleared model."""
+        self.top = 0
+        self.follow = True
+        self.selected = None
+        self.refresh()
+    
+    def sort_by(self, column):
+        """Heading click: sort the model by `column` and show the first rows."""
+        self.model.sort_by(column)
+        for name, (title, _) in self.HEADINGS.items():
+            arrow = ""
+            if name == self.model.sort_column:
+                arrow = " ▼" if self.model.sort_descending else " ▲"
+            self.tree.heading(name, text=title + arrow)
+        self.reset()
+    
+    def scroll_to(self, top):
+        """Show rows starting at `top`; following resumes once the last row is in view."""
+        last_top = max(0, len(self.model.rows) - self.capacity)
+        self.top = max(0, min(int(top), last_top))
+        self.follow = self.top >= last_top
+        self.refresh()
+    
+    def scroll_by(self, rows):
+        self.scroll_to(self.top + rows)
+        return "break"
+    
+    def on_scrollbar(self, action, amount, unit=None):
+        """Scrollbar command: ("moveto", fraction) or ("scroll", n, "units"/"pages")."""
+        if action == "moveto":
+            self.scroll_to(float(amount) * len(self.model.rows))
+        else:
+            self.scroll_by(int(amount) * (self.capacity if unit == "pages" else 1))
+    
+    def on_resize(self, event):
+        # The heading takes about one row of the widget's height
+        self.capacity = max(1, event.height // self.rowheight - 1)
+        self.refresh()
+    
+    def row_at(self, item):
+        """Model row shown in a Treeview item, or None."""
+        if item in self.slots:
+            position = self.slots.index(item)
+            if self.shown[position]:
+                return self.shown[position][0]
+        return None
+    
+    def on_select(self, event):
+        selection = self.tree.selection()
+        if selection:
+            self.selected = self.row_at(selection[0])
+    
+    def on_double_click(self, event):
+        row = self.row_at(self.tree.identify_row(event.y))
+        if row is not None:
+            self.selected = row
+            self.toggle_selected()
+        return "break"
+    
+    def toggle_selected(self):
+        """Expand or collapse the selected host (or the host of a selected detail line)."""
+        if self.selected is None:
+            return "break"
+        index = self.selected if isinstance(self.selected, int) else self.selected[0]
+        self.model.toggle(index)
+        self.selected = index
+        self.follow = False
+        self.refresh()
+        return "break"
+    
+    def move_selection(self, step):
+        """Keyboard navigation over all rows, scrolling the window as needed."""
+        rows = self.model.rows
+        if not rows:
+            return "break"
+        try:
+            position = rows.index(self.selected)
+        except ValueError:
+            position = self.top
+            step = 0
+        if step == "page-up":
+            position -= self.capacity
+        elif step == "page-down":
+            position += self.capacity
+        elif step == "home":
+            position = 0
+        elif step == "end":
+            position = len(rows) - 1
+        else:
+            position += step
+        position = max(0, min(position, len(rows) - 1))
+        self.selected = rows[position]
+        if position < self.top:
+            self.scroll_to(position)
+        elif position >= self.top + self.capacity:
+            self.scroll_to(position - self.capacity + 1)
+        else:
+            self.refresh()
+        return "break"
+
+
+class ResultsExporter:
+    """
+    Writes host results to a file on a background thread.
+    
+    Records are streamed one at a time: each is reduced to the chosen fields,
+    written and dropped, so an export never builds the whole document in
+    memory. Files ending in ".gz" are gzip-compressed. The Tk thread polls
+    `done` for progress and sets `cancelled` to abort; a cancelled or failed
+    export removes its partial file.
+    """
+    
+    FORMATS = {
+        "txt": ("Text Report", ".txt"),
+        "json": ("JSON Data", ".json"),
+        "jsonl": ("JSON Lines, one host per line", ".jsonl"),
+        "csv": ("CSV Summary", ".csv"),
+    }
+    # (field, label, selected by default); host, timestamp and alias_of are always exported
+    FIELDS = (
+        ("dns", "DNS answers", True),
+        ("ping", "Ping results", True),
+        ("ports", "Port results", True),
+        ("ping_output", "Raw ping output", False),
+        ("traceroute", "Traceroute output", False),
+    )
+    
+    def __init__(self, records, filename, format_type, fields):
+        self.records = list(records)  # References only; results added later are not exported
+        self.filename = filename
+        self.format_type = format_type
+        self.fields = set(fields)
+        self.total = len(self.records)
+        self.done = 0
+        self.error = None
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+    
+    def start(self):
+        self.thread.start()
+    
+    def finished(self):
+        return not self.thread.is_alive()
+    
+    def run(self):
+        try:
+            if self.format_type == "jsonl":
+                with NdjsonWriter(self.filename) as writer:
+                    for record in self.iter_records():
+                        writer.write(record)
+            else:
+                opener = gzip.open if self.filename.endswith(".gz") else open
+                with opener(self.filename, 'wt', encoding='utf-8', newline='') as f:
+                    getattr(self, f"write_{self.format_type}")(f)
+        except Exception as e:
+            self.error = e
+        if self.error or self.cancelled.is_set():
+            try:
+                os.remove(self.filename)
+            except OSError:
+                pass
+    
+    def iter_records(self):
+        """Yield each record reduced to the selected fields, counting progress."""
+        for result in self.records:
+            if self.cancelled.is_set():
+                return
+            yield self.project(result)
+            self.done += 1
+    
+    def project(self, result):
+        """Copy of a host result with only the selected fields."""
+        record = {"host": result["host"], "timestamp": result["timestamp"]}
+        if result.get("alias_of"):
+            record["alias_of"] = result["alias_of"]
+        if "dns" in self.fields:
+            record["dns"] = result.get("dns")
+        if "ping" in self.fields or "ping_output" in self.fields:
+            ping = result["ping"]
+            if ping and "ping_output" not in self.fields:
+                ping = {key: value for key, value in ping.items() if key != "output"}
+            elif ping and "ping" not in self.fields:
+                ping = {"output": ping["output"]}
+            record["ping"] = ping
+        if "ports" in self.fields:
+            record["ports"] = list(result["ports"])  # Rendered per record, dropped once written
+        if "traceroute" in self.fields and "traceroute" in result:
+            record["traceroute"] = result["traceroute"]
+        return record
+    
+    def write_txt(self, f):
+        """Formatted text report."""
+        f.write("Network Connectivity Checker - Scan Report\n")
+        f.write("=" * 50 + "\n")
+        f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"Total Hosts Scanned: {self.total}\n\n")
+        
+        for record in self.iter_records():
+            f.write(f"Host: {record['host']}\n")
+            f.write(f"Timestamp: {record['timestamp']}\n")
+            if record.get("alias_of"):
+                f.write(f"Same address as: {record['alias_of']}\n")
+            f.write("-" * 30 + "\n")
+            
+            dns = record.get("dns")
+            if dns and dns["error"]:
+                f.write(f"DNS: FAILED ({dns['error']})\n")
+            elif dns and dns["dns_time"]:
+                f.write(f"DNS: {', '.join(dns['addresses'])} ({dns['dns_time']}ms)\n")
+            
+            ping = record.get("ping")
+            if ping and "success" in ping:
+                status = "REACHABLE" if ping['success'] else "UNREACHABLE"
+                f.write(f"Ping: {status} ({ping['duration']}s)\n")
+            if ping and ping.get("output"):
+                f.write(f"Ping Output:\n{ping['output']}\n")
+            
+            if record.get("ports"):
+                open_ports = [p for p in record['ports'] if p['open']]
+                closed_ports = [p for p in record['ports'] if not p['open']]
+                
+                if open_ports:
+                    port_list = ", ".join([f"{p['port']}({p['response_time']}ms)" for p in open_ports])
+                    f.write(f"Open Ports: {port_list}\n")
+                
+                if closed_ports:
+                    port_list = ", ".join([str(p['port']) for p in closed_ports])
+                    f.write(f"Closed Ports: {port_list}\n")
+            
+            if "traceroute" in record:
+                f.write(f"Traceroute:\n{record['traceroute']['output']}\n")
+            
+            f.write("\n")
+    
+    def write_json(self, f):
+        """One JSON document, written record by record; each host result is one compact line."""
+        scan_info = {
+            "timestamp": datetime.now().isoformat(),
+            "total_hosts": self.total,
+            "version": "2.0",
+            "fields": sorted(self.fields)
+        }
+        f.write('{\n  "scan_info": ')
+        f.write(json.dumps(scan_info, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+        f.write(',\n  "results": [')
+        for number, record in enumerate(self.iter_records()):
+            f.write(",\n    " if number else "\n    ")
+            f.write(json.dumps(record, ensure_ascii=False))
+        f.write("\n  ]\n}\n")
+    
+    def write_csv(self, f):
+        """One row per host; columns follow the selected fields."""
+        writer = csv.writer(f)
+        
+        # Header
+        header = ['Host', 'Timestamp']
+        if "dns" in self.fields:
+            header.append('DNS_Addresses')
+        if "ping" in self.fields:
+            header += ['Ping_Status', 'Ping_Duration']
+        if "ports" in self.fields:
+            header += ['Open_Ports', 'Closed_Ports', 'Total_Ports']
+        if "ping_output" in self.fields:
+            header.append('Ping_Output')
+        if "traceroute" in self.fields:
+            header.append('Traceroute')
+        writer.writerow(header)
+        
+        # Data rows
+        for record in self.iter_records():
+            row = [record['host'], record['timestamp']]
+            ping = record.get('ping')
+            
+            if "dns" in self.fields:
+                dns = record['dns']
+                row.append(' '.join(dns['addresses']) if dns and not dns['error'] else '')
+            
+            # Ping info
+            if "ping" in self.fields:
+                if ping:
+                    row += ['REACHABLE' if ping['success'] else 'UNREACHABLE', ping['duration']]
+                else:
+                    row += ['SKIPPED', 0]
+            
+            # Port info
+            if "ports" in self.fields:
+                open_ports = [str(p['port']) for p in record['ports'] if p['open']]
+                closed_ports = [str(p['port']) for p in record['ports'] if not p['open']]
+                row += [','.join(open_ports), ','.join(closed_ports), len(record['ports'])]
+            
+            if "ping_output" in self.fields:
+                row.append(ping['output'] if ping else '')
+            if "traceroute" in self.fields:
+                row.append(record['traceroute']['output'] if 'traceroute' in record else '')
+            
+            writer.writerow(row)
+
+
 class NetworkCheckerGUI:
+    # Scan threads never touch Tk; the Tk loop applies their queued updates in batches
+    DRAIN_INTERVAL = 100  # ms between batches
+    DRAIN_BUDGET = 0.05   # seconds of work per batch, so input events keep flowing
+    FILTER_DELAY = 150    # ms of typing pause before the search filter runs
+    CONNECT_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY, 10035)  # 10035: WSAEWOULDBLOCK
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Network Connectivity Checker v2.0")
@@ -32,8 +776,20 @@ class NetworkCheckerGUI:
         # Variables
         self.is_scanning = False
         self.scan_thread = None
-        self.results = []
+        self.model = ResultsModel()
+        self.results = self.model.records  # Host result dicts in arrival order
+        self.unfinished_scan = None  # Settings and remaining hosts of a stopped scan
+        self.updates = queue.Queue()  # ("result", host result) / ("done", message) / ("error", message)
+        self.scan_total = 0
+        self.scan_done = 0
+        self.filter_job = None  # Pending debounced apply_filter()
+        self.stop_signal = Future()  # Completed by Stop; wakes the scan worker's waits
+        self.cancel_wakeup = socket.socketpair()  # Readable once Stop is pressed; wakes pending connects
+        self.children = set()  # ping/traceroute processes Stop has to kill
+        self.children_lock = threading.Lock()
         self.os_type = platform.system().lower()
+        self.icmp = IcmpPinger()
+        self.dns = DnsCache()
         
         # Create GUI
         self.create_widgets()
@@ -129,6 +885,12 @@ class NetworkCheckerGUI:
         workers_spinbox = ttk.Spinbox(options_frame, from_=1, to=100, width=5, textvariable=self.workers_var)
         workers_spinbox.grid(row=1, column=3, sticky=tk.W, padx=(10, 0), pady=(10, 0))
         
+        # Hosts scanned at once with parallel scanning; their port checks share the workers
+        ttk.Label(options_frame, text="Hosts at once:").grid(row=1, column=4, sticky=tk.W, padx=(20, 0), pady=(10, 0))
+        self.host_workers_var = tk.StringVar(value="8")
+        host_workers_spinbox = ttk.Spinbox(options_frame, from_=1, to=256, width=5, textvariable=self.host_workers_var)
+        host_workers_spinbox.grid(row=1, column=5, sticky=tk.W, padx=(10, 0), pady=(10, 0))
+        
         # Control buttons
         button_frame = ttk.Frame(main_frame)
         button_frame.grid(row=4, column=0, columnspan=3, pady=(0, 10))
@@ -168,8 +930,10 @@ class NetworkCheckerGUI:
         search_entry.grid(row=0, column=1, sticky=(tk.W, tk.E))
         search_frame.columnconfigure(1, weight=1)
 
-        self.search_button = ttk.Button(search_frame, text="Apply Filter", command=self.apply_filter, state='disabled')
-        self.search_button.grid(row=0, column=2, padx=(5, 0))
+        # Filter as you type, once typing pauses
+        self.search_var.trace_add("write", lambda *args: self.schedule_filter())
+        self.filter_info_var = tk.StringVar()
+        ttk.Label(search_frame, textvariable=self.filter_info_var, width=22).grid(row=0, column=2, padx=(5, 0))
 
         self.clear_filter_button = ttk.Button(search_frame, text="Clear Filter", command=self.clear_filter, state='disabled')
         self.clear_filter_button.grid(row=0, column=3, padx=(5, 0))
@@ -178,8 +942,10 @@ class NetworkCheckerGUI:
         self.show_failed_ping_var = tk.BooleanVar()
         self.show_failed_ports_var = tk.BooleanVar()
 
-        ttk.Checkbutton(search_frame, text="Show Failed Pings Only", variable=self.show_failed_ping_var).grid(row=1, column=1, sticky=tk.W, pady=(5, 0))
-        ttk.Checkbutton(search_frame, text="Show Failed Ports Only", variable=self.show_failed_ports_var).grid(row=1, column=2, sticky=tk.W, pady=(5, 0))
+        ttk.Checkbutton(search_frame, text="Show Failed Pings Only", variable=self.show_failed_ping_var,
+                        command=self.apply_filter).grid(row=1, column=1, sticky=tk.W, pady=(5, 0))
+        ttk.Checkbutton(search_frame, text="Show Failed Ports Only", variable=self.show_failed_ports_var,
+                        command=self.apply_filter).grid(row=1, column=2, sticky=tk.W, pady=(5, 0))
 
         # Results display
         results_frame = ttk.LabelFrame(main_frame, text="Scan Results", padding="10")
@@ -187,19 +953,15 @@ class NetworkCheckerGUI:
         results_frame.columnconfigure(0, weight=1)
         results_frame.rowconfigure(0, weight=1)
         
-        # Results text area with scrollbar
-        self.results_text = scrolledtext.ScrolledText(results_frame, wrap=tk.WORD, font=('Consolas', 9))
-        self.results_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        # Scan info line above the table
+        self.scan_info_var = tk.StringVar()
+        ttk.Label(results_frame, textvariable=self.scan_info_var, style='Header.TLabel').grid(
+            row=0, column=0, columnspan=2, sticky=tk.W, pady=(0, 5))
+        results_frame.rowconfigure(0, weight=0)
+        results_frame.rowconfigure(1, weight=1)
         
-        # Configure text tags for colored output
-        self.results_text.tag_configure("success", foreground="green")
-        self.results_text.tag_configure("error", foreground="red")
-        self.results_text.tag_configure("header", font=('Consolas', 9, 'bold'))
-        self.results_text.tag_configure("info", foreground="blue")
-
-        # For restoring original content
-        self.full_results_text = ""
-
+        # One row per host; double-click or Enter shows its details
+        self.table = ResultsTable(results_frame, self.model)
     
     def browse_host_file(self):
         """Open file dialog to select host file."""
@@ -280,17 +1042,47 @@ class NetworkCheckerGUI:
         
         return sorted(set(ports))
     
-    def ping_host(self, host, count=4):
+    def run_command(self, cmd, timeout):
+        """subprocess.run() for ping and traceroute, registered so Stop can kill the process."""
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        with self.children_lock:
+            self.children.add(proc)
+        if not self.is_scanning:  # Stopped while starting it
+            proc.kill()
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            raise
+        finally:
+            with self.children_lock:
+                self.children.discard(proc)
+        return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+    
+    def ping_host(self, host, timeout, count=4):
         """Ping a host and return results."""
         try:
-            timeout = int(self.timeout_var.get())
+            dns = self.dns.resolve(host)
+            if dns["error"]:
+                return {"host": host, "success": False, "duration": 0, "output": dns["error"]}
+            
+            # Prefer the in-process ICMP engine; fall back to the ping command
+            ipv4_address = DnsCache.first_address(dns, ipv4_only=True)
+            if ipv4_address and self.icmp.available():
+                ping = self.icmp.ping(host, count, timeout=timeout, address=ipv4_address,
+                                      cancelled=lambda: not self.is_scanning)
+                ping["output"] = ping["output"] if ping["success"] else (ping["error"] or ping["output"])
+                return ping
+            
+            address = DnsCache.first_address(dns)
             if self.os_type == "windows":
-                cmd = ["ping", "-n", str(count), host]
+                cmd = ["ping", "-n", str(count), address]
             else:
-                cmd = ["ping", "-c", str(count), host]
+                cmd = ["ping", "-c", str(count), address]
             
             start_time = time.time()
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout * count)
+            result = self.run_command(cmd, timeout=timeout * count)
             end_time = time.time()
             
             return {
@@ -307,12 +1099,33 @@ class NetworkCheckerGUI:
                 "output": str(e)
             }
     
-    def check_port(self, host, port):
+    def check_port(self, host, port, timeout):
         """Check if a port is open on a host."""
         try:
-            timeout = int(self.timeout_var.get())
+            dns = self.dns.resolve(host)
+            if dns["error"]:
+                return {"host": host, "port": port, "open": False, "response_time": 0, "error": dns["error"]}
+            
+            address = DnsCache.first_address(dns)
+            family = socket.AF_INET6 if ":" in address else socket.AF_INET
             start_time = time.time()
-            with socket.create_connection((host, port), timeout=timeout):
+            with socket.socket(family, socket.SOCK_STREAM) as sock:
+                # Non-blocking connect, so Stop can abandon it instead of waiting out the timeout
+                sock.setblocking(False)
+                code = sock.connect_ex((address, port))
+                if code in self.CONNECT_IN_PROGRESS:
+                    # A selector rather than select.select(), which fails on descriptors above FD_SETSIZE
+                    with selectors.DefaultSelector() as selector:
+                        selector.register(self.cancel_wakeup[0], selectors.EVENT_READ)
+                        selector.register(sock, selectors.EVENT_WRITE)
+                        events = selector.select(timeout)
+                    if any(key.fileobj is self.cancel_wakeup[0] for key, _ in events):
+                        raise ConnectionAbortedError("Scan cancelled")
+                    if not events:
+                        raise socket.timeout("timed out")
+                    code = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if code:
+                    raise OSError(code, os.strerror(code))
                 end_time = time.time()
                 return {
                     "host": host,
@@ -330,138 +1143,184 @@ class NetworkCheckerGUI:
                 "error": str(e)
             }
     
-    def scan_host(self, host, ports):
-        """Scan a single host for ping and ports."""
+    def scan_host(self, host, ports, options, port_pool=None):
+        """Scan a single host for ping and the ports of a PortSet, on `port_pool` if one is shared by all hosts."""
         result = {
             "host": host,
             "timestamp": datetime.now().isoformat(),
+            "dns": None,
             "ping": None,
-            "ports": []
+            "ports": PortStateStore(host, ports)
         }
         
-        # Update progress
-        self.root.after(0, lambda: self.progress_var.set(f"Scanning {host}..."))
+        # Resolve once; ping, ports and traceroute reuse the cached answer
+        result["dns"] = self.dns.resolve(host)
+        if result["dns"]["error"]:
+            return result  # Reported once as a DNS failure; nothing to probe
         
-        # Ping test
-        if not self.skip_ping_var.get():
-            result["ping"] = self.ping_host(host)
+        # Ping test; Stop may have been pressed while resolving
+        if not options["skip_ping"] and self.is_scanning:
+            result["ping"] = self.ping_host(host, options["timeout"])
         
         # Port checks
         if ports:
-            if self.parallel_var.get():
+            if port_pool:
                 # Parallel port scanning
-                workers = min(int(self.workers_var.get()), len(ports))
-                with ThreadPoolExecutor(max_workers=workers) as executor:
-                    future_to_port = {executor.submit(self.check_port, host, port): port for port in ports}
-                    for future in as_completed(future_to_port):
-                        if not self.is_scanning:  # Check if scan was cancelled
-                            break
-                        result["ports"].append(future.result())
+                future_to_port = {port_pool.submit(self.check_port, host, port, options["timeout"]): port for port in ports}
+                for future in as_completed(future_to_port):
+                    if not self.is_scanning:  # Check if scan was cancelled
+                        for pending in future_to_port:
+                            pending.cancel()
+                        break
+                    result["ports"].record(future.result())
             else:
                 # Sequential port scanning
                 for port in ports:
                     if not self.is_scanning:  # Check if scan was cancelled
                         break
-                    result["ports"].append(self.check_port(host, port))
+                    result["ports"].record(self.check_port(host, port, options["timeout"]))
 
         # Traceroute if selected
-        if self.traceroute_var.get():
+        if options["traceroute"] and self.is_scanning:
             result["traceroute"] = self.traceroute_host(host)
-
-        # Sort ports by number
-        result["ports"].sort(key=lambda x: x["port"])
         
         return result
     
-    def display_result(self, result):
-        """Display scan result in the text widget."""
-        host = result["host"]
+    def scan_worker(self, hosts, ports, options, settings):
+        """
+        Worker function for scanning hosts.
         
-        # Host header
-        self.results_text.insert(tk.END, f"\n{'='*60}\n", "header")
-        self.full_results_text += f"\n{'='*60}\n"
-
-        self.results_text.insert(tk.END, f"🔍 Host: {host}\n", "header")
-        self.full_results_text += f"🔍 Host: {host}\n"
-
-        self.results_text.insert(tk.END, f"Time: {result['timestamp']}\n", "info")
-        self.full_results_text += f"Time: {result['timestamp']}\n"
-
-        self.results_text.insert(tk.END, "-" * 40 + "\n")
-        self.full_results_text += "-" * 40 + "\n"
-
+        With parallel scanning, up to "Hosts at once" hosts are scanned
+        concurrently and their port checks share one pool of "Workers"
+        threads; otherwise hosts and ports are checked one at a time. Results
+        are queued for drain_updates() instead of being scheduled on the Tk
+        loop one by one. `options` is the read_scan_options() snapshot taken
+        when the scan started. Names that resolve to an already scanned
+        address reuse its result, through the CLI's AliasFanout.
+        """
+        ports = PortSet((port, port) for port in ports)
+        finished = set()  # Hosts whose result was queued
+        lock = threading.Lock()
         
-        # Ping results
-        if result["ping"]:
-            ping = result["ping"]
-            if ping["success"]:
-                self.full_results_text += f"Ping: ✓ REACHABLE ({ping['duration']}s)\n"
-            else:
-                self.full_results_text += f"Ping: ✗ UNREACHABLE ({ping['output']})\n"
-
+        def publish(result):
+            if result.get("alias_of"):
+                result = self.alias_result(result)
+            with lock:
+                finished.add(result["host"])
+            self.updates.put(("result", result))
         
-        # Port results
-        if result["ports"]:
-            open_ports = [p for p in result["ports"] if p["open"]]
-            closed_ports = [p for p in result["ports"] if not p["open"]]
-            
-            if open_ports:
-                port_list = ", ".join([f"{p['port']} ({p['response_time']}ms)" for p in open_ports])
-                open_line = f"Open Ports: {port_list}"
-                self.results_text.insert(tk.END, f"{open_line}\n", "success")
-                self.full_results_text += f"{open_line}\n"  # <-- Add this
-
+        fanout = AliasFanout(self.dns, ports, not options["skip_ping"], on_host_complete=publish)
+        
+        def scan_one(host, port_pool):
+            if not self.is_scanning:
+                return
             
-            if closed_ports:
-                port_list = ", ".join([f"{p['port']} ({p['error']})" for p in closed_ports])
-                closed_line = f"Closed Ports: {port_list}"
-                self.results_text.insert(tk.END, f"{closed_line}\n", "error")
-                self.full_results_text += f"{closed_line}\n"
-
+            # Scan host; a host cut short by Stop is dropped (with its aliases) and rescanned on resume
+            result = self.scan_host(host, ports, options, port_pool)
+            if self.is_scanning:
+                fanout.on_host_complete(result)
         
-        # Traceroute output
-        if "traceroute" in result:
-            traceroute_output = result["traceroute"]["output"]
-            self.results_text.insert(tk.END, "\nTraceroute:\n", "info")
-            self.results_text.insert(tk.END, traceroute_output + "\n", "info" if result["traceroute"]["success"] else "error")
-            self.full_results_text += f"Traceroute:\n{traceroute_output}\n"
-
-
-        # Auto-scroll to bottom
-        self.results_text.see(tk.END)
-    
-    def scan_worker(self, hosts, ports):
-        """Worker function for scanning hosts."""
         try:
-            total_hosts = len(hosts)
+            if options["parallel"]:
+                host_budget = options["host_workers"]
+                workers = options["workers"]
+            else:
+                host_budget = workers = 1
             
-            for i, host in enumerate(hosts):
-                if not self.is_scanning:
-                    break
+            with ThreadPoolExecutor(max_workers=host_budget) as host_pool, \
+                    ThreadPoolExecutor(max_workers=workers) as port_pool:
+                port_pool = port_pool if options["parallel"] else None
+                pending = set()
                 
-                # Update progress
-                progress_text = f"Scanning {i+1}/{total_hosts}: {host}"
-                self.root.after(0, lambda t=progress_text: self.progress_var.set(t))
+                def settle(backlog):
+                    # Wait until at most `backlog` hosts are pending, or Stop is pressed
+                    nonlocal pending
+                    while len(pending) > backlog and self.is_scanning:
+                        done, pending = wait(pending | {self.stop_signal}, return_when=FIRST_COMPLETED)
+                        pending.discard(self.stop_signal)
+                        for future in done - {self.stop_signal}:
+                            future.result()
                 
-                # Scan host
-                result = self.scan_host(host, ports)
-                self.results.append(result)
+                for host in fanout.hosts(hosts):
+                    # Keep a short backlog so huge host lists are not submitted up front
+                    settle(host_budget * 2 - 1)
+                    if not self.is_scanning:
+                        break
+                    pending.add(host_pool.submit(scan_one, host, port_pool))
+                settle(0)
                 
-                # Display result
-                self.root.after(0, lambda r=result: self.display_result(r))
+                # Stopped: hosts that have not started are dropped, running ones wind down
+                for future in pending:
+                    future.cancel()
+            fanout.flush()
             
             # Scan completed
             if self.is_scanning:
-                self.root.after(0, lambda: self.progress_var.set(f"Scan completed - {len(hosts)} hosts processed"))
+                self.updates.put(("done", f"Scan completed - {len(hosts)} hosts processed"))
             else:
-                self.root.after(0, lambda: self.progress_var.set("Scan cancelled"))
+                self.unfinished_scan = {"settings": settings,
+                                        "hosts": [h for h in hosts if h not in finished]}
+                self.updates.put(("done", "Scan cancelled"))
                 
         except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("Scan Error", f"An error occurred during scanning: {e}"))
+            self.updates.put(("error", f"An error occurred during scanning: {e}"))
+    
+    @staticmethod
+    def alias_result(result):
+        """Give an alias reported by AliasFanout its own timestamp and per-port host."""
+        return dict(result, timestamp=datetime.now().isoformat(),
+                    ports=result["ports"].for_host(result["host"]))
+    
+    def drain_updates(self):
+        """Apply queued scan updates on the Tk thread, then reschedule while scanning."""
+        deadline = time.monotonic() + self.DRAIN_BUDGET
+        finished = None
+        displayed = False
+        while time.monotonic() < deadline:
+            try:
+                kind, payload = self.updates.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "result":
+                self.model.add(payload)
+                self.scan_done += 1
+                displayed = True
+            elif kind == "error":
+                messagebox.showerror("Scan Error", payload)
+                finished = "Scan failed"
+            else:
+                finished = payload
         
-        finally:
-            # Re-enable controls
-            self.root.after(0, self.scan_finished)
+        if displayed:
+            self.table.refresh()
+            self.update_filter_info()
+        if finished is not None:
+            self.progress_var.set(finished)
+            self.scan_finished()
+            return
+        if self.is_scanning:
+            self.progress_var.set(f"Scanning: {self.scan_done}/{self.scan_total} hosts done")
+        self.root.after(self.DRAIN_INTERVAL, self.drain_updates)
+    
+    def read_scan_options(self):
+        """
+        Snapshot the scan options on the Tk thread; scan threads only see this copy.
+        
+        Returns:
+            Dictionary of plain option values, or None if a number is invalid
+        """
+        try:
+            return {
+                "timeout": max(1, int(self.timeout_var.get())),
+                "workers": max(1, int(self.workers_var.get())),
+                "host_workers": max(1, int(self.host_workers_var.get())),
+                "parallel": self.parallel_var.get(),
+                "skip_ping": self.skip_ping_var.get(),
+                "traceroute": self.traceroute_var.get(),
+            }
+        except ValueError:
+            messagebox.showwarning("Invalid Options", "Timeout, Workers and Hosts at once must be whole numbers.")
+            return None
     
     def start_scan(self):
         """Start the network scan."""
@@ -471,33 +1330,66 @@ class NetworkCheckerGUI:
         if not hosts:
             messagebox.showwarning("No Hosts", "Please specify at least one host to scan.")
             return
+        options = self.read_scan_options()
+        if options is None:
+            return
+        
+        # A stopped scan with the same settings can pick up where it left off
+        settings = (tuple(hosts), tuple(ports), options["skip_ping"], options["traceroute"])
+        unfinished, self.unfinished_scan = self.unfinished_scan, None
+        if unfinished and unfinished["settings"] == settings and messagebox.askyesno(
+                "Resume Scan",
+                f"The last scan was stopped with {len(unfinished['hosts'])} of {len(hosts)} hosts "
+                f"left.\n\nResume it and keep the results so far?"):
+            hosts = unfinished["hosts"]
+        else:
+            self.model.clear()
+            self.table.clear()
+        
+        # Names are resolved once per scan
+        self.dns.shutdown()
+        self.dns = DnsCache()
         
-        # Clear previous results
-        self.results.clear()
+        # Fresh cancellation signals; the previous scan's threads have all finished
+        self.stop_signal = Future()
+        for sock in self.cancel_wakeup:
+            sock.close()
+        self.cancel_wakeup = socket.socketpair()
         
         # Update UI
         self.is_scanning = True
+        self.updates = queue.Queue()
+        self.scan_total = len(hosts)
+        self.scan_done = 0
         self.scan_button.config(state='disabled')
         self.stop_button.config(state='normal')
         self.progress_bar.start()
         self.progress_var.set("Starting scan...")
 
-        self.search_button.config(state='normal')
         self.clear_filter_button.config(state='normal')
         
-        # Add scan info to results
-        self.results_text.insert(tk.END, f"\n🚀 Network Scan Started - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n", "header")
-        self.results_text.insert(tk.END, f"Hosts: {len(hosts)} | Ports: {len(ports)}\n", "info")
-        self.results_text.insert(tk.END, f"Options: Parallel={self.parallel_var.get()}, Skip Ping={self.skip_ping_var.get()}\n", "info")
+        # Show scan info above the results
+        self.scan_info_var.set(
+            f"🚀 Scan started {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | Hosts: {len(hosts)} | "
+            f"Ports: {len(ports)} | Parallel={options['parallel']}, Skip Ping={options['skip_ping']}")
         
         # Start scan in separate thread
-        self.scan_thread = threading.Thread(target=self.scan_worker, args=(hosts, ports), daemon=True)
+        self.scan_thread = threading.Thread(target=self.scan_worker, args=(hosts, ports, options, settings), daemon=True)
         self.scan_thread.start()
+        self.root.after(self.DRAIN_INTERVAL, self.drain_updates)
     
     def stop_scan(self):
-        """Stop the current scan."""
+        """Stop the current scan, abandoning connects, pings and traceroutes in flight."""
         self.is_scanning = False
         self.progress_var.set("Stopping scan...")
+        if self.stop_signal.done():
+            return
+        self.stop_signal.set_result(None)
+        self.cancel_wakeup[1].send(b"\0")
+        self.icmp.interrupt()
+        with self.children_lock:
+            for proc in self.children:
+                proc.kill()
     
     def scan_finished(self):
         """Called when scan is finished or stopped."""
@@ -508,11 +1400,12 @@ class NetworkCheckerGUI:
     
     def clear_results(self):
         """Clear the results display and data."""
-        self.results_text.delete(1.0, tk.END)
-        self.results.clear()
-        self.full_results_text = ""  # <-- This line ensures no leftover filters are applied
+        self.model.clear()
+        self.table.clear()
+        self.update_filter_info()
+        self.unfinished_scan = None
+        self.scan_info_var.set("")
         self.progress_var.set("Results cleared")
-        self.search_button.config(state='disabled')
         self.clear_filter_button.config(state='disabled')
 
     
@@ -522,167 +1415,95 @@ class NetworkCheckerGUI:
             messagebox.showwarning("No Results", "No scan results to export.")
             return
         
-        # Ask user for export format
+        # Ask user for export format and fields
         export_window = tk.Toplevel(self.root)
         export_window.title("Export Results")
-        export_window.geometry("300x200")
         export_window.transient(self.root)
         export_window.grab_set()
         
         ttk.Label(export_window, text="Select export format:", font=('Arial', 10, 'bold')).pack(pady=10)
         
         format_var = tk.StringVar(value="txt")
+        for format_type, (label, extension) in ResultsExporter.FORMATS.items():
+            ttk.Radiobutton(export_window, text=f"{label} ({extension})", variable=format_var,
+                            value=format_type).pack(anchor=tk.W, padx=20)
+        
+        compress_var = tk.BooleanVar()
+        ttk.Checkbutton(export_window, text="Compress with gzip (.gz)", variable=compress_var).pack(
+            anchor=tk.W, padx=20, pady=(5, 0))
         
-        ttk.Radiobutton(export_window, text="Text Report (.txt)", variable=format_var, value="txt").pack(anchor=tk.W, padx=20)
-        ttk.Radiobutton(export_window, text="JSON Data (.json)", variable=format_var, value="json").pack(anchor=tk.W, padx=20)
-        ttk.Radiobutton(export_window, text="CSV Summary (.csv)", variable=format_var, value="csv").pack(anchor=tk.W, padx=20)
+        ttk.Label(export_window, text="Include:", font=('Arial', 10, 'bold')).pack(pady=(10, 5))
+        field_vars = {}
+        for field, label, selected in ResultsExporter.FIELDS:
+            field_vars[field] = tk.BooleanVar(value=selected)
+            ttk.Checkbutton(export_window, text=label, variable=field_vars[field]).pack(anchor=tk.W, padx=20)
         
         button_frame = ttk.Frame(export_window)
         button_frame.pack(pady=20)
         
         def do_export():
+            fields = [field for field, var in field_vars.items() if var.get()]
             export_window.destroy()
-            self.export_to_file(format_var.get())
+            self.export_to_file(format_var.get(), compress_var.get(), fields)
         
         ttk.Button(button_frame, text="Export", command=do_export).pack(side=tk.LEFT, padx=(0, 10))
-        ttk.Button(button_frame, text="Cancel", command=export_window.destroy).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Cancel", command=export_window.destroy).pack(side=tk.LEFT, padx=(0, 20))
     
-    def export_to_file(self, format_type):
-        """Export results to specified format."""
+    def export_to_file(self, format_type, compress=False, fields=None):
+        """Ask for a file name and export results to it in the background."""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        label, extension = ResultsExporter.FORMATS[format_type]
+        if compress:
+            extension += ".gz"
         
-        if format_type == "txt":
-            filename = filedialog.asksaveasfilename(
-                defaultextension=".txt",
-                initialfile=f"network_scan_{timestamp}.txt",
-                filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
-            )
-            if filename:
-                self.export_text_report(filename)
-        
-        elif format_type == "json":
-            filename = filedialog.asksaveasfilename(
-                defaultextension=".json",
-                initialfile=f"network_scan_{timestamp}.json",
-                filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
-            )
-            if filename:
-                self.export_json_data(filename)
-        
-        elif format_type == "csv":
-            filename = filedialog.asksaveasfilename(
-                defaultextension=".csv",
-                initialfile=f"network_scan_{timestamp}.csv",
-                filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
-            )
-            if filename:
-                self.export_csv_summary(filename)
-    
-    def export_text_report(self, filename):
-        """Export results as formatted text report."""
-        try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write("Network Connectivity Checker - Scan Report\n")
-                f.write("=" * 50 + "\n")
-                f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Total Hosts Scanned: {len(self.results)}\n\n")
-                
-                for result in self.results:
-                    f.write(f"Host: {result['host']}\n")
-                    f.write(f"Timestamp: {result['timestamp']}\n")
-                    f.write("-" * 30 + "\n")
-                    
-                    if result['ping']:
-                        ping = result['ping']
-                        status = "REACHABLE" if ping['success'] else "UNREACHABLE"
-                        f.write(f"Ping: {status} ({ping['duration']}s)\n")
-                    
-                    if result['ports']:
-                        open_ports = [p for p in result['ports'] if p['open']]
-                        closed_ports = [p for p in result['ports'] if not p['open']]
-                        
-                        if open_ports:
-                            port_list = ", ".join([f"{p['port']}({p['response_time']}ms)" for p in open_ports])
-                            f.write(f"Open Ports: {port_list}\n")
-                        
-                        if closed_ports:
-                            port_list = ", ".join([str(p['port']) for p in closed_ports])
-                            f.write(f"Closed Ports: {port_list}\n")
-                    
-                    f.write("\n")
-            
-            messagebox.showinfo("Export Success", f"Report exported to:\n{filename}")
-            
-        except Exception as e:
-            messagebox.showerror("Export Error", f"Failed to export report: {e}")
-    
-    def export_json_data(self, filename):
-        """Export results as JSON data."""
-        try:
-            export_data = {
-                "scan_info": {
-                    "timestamp": datetime.now().isoformat(),
-                    "total_hosts": len(self.results),
-                    "version": "2.0"
-                },
-                "results": self.results
-            }
-            
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, indent=2, ensure_ascii=False)
-            
-            messagebox.showinfo("Export Success", f"JSON data exported to:\n{filename}")
-            
-        except Exception as e:
-            messagebox.showerror("Export Error", f"Failed to export JSON: {e}")
-    
-    def export_csv_summary(self, filename):
-        """Export results as CSV summary."""
-        try:
-            with open(filename, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                
-                # Header
-                writer.writerow(['Host', 'Timestamp', 'Ping_Status', 'Ping_Duration', 'Open_Ports', 'Closed_Ports', 'Total_Ports'])
-                
-                # Data rows
-                for result in self.results:
-                    host = result['host']
-                    timestamp = result['timestamp']
-                    
-                    # Ping info
-                    if result['ping']:
-                        ping_status = 'REACHABLE' if result['ping']['success'] else 'UNREACHABLE'
-                        ping_duration = result['ping']['duration']
-                    else:
-                        ping_status = 'SKIPPED'
-                        ping_duration = 0
-                    
-                    # Port info
-                    if result['ports']:
-                        open_ports = [str(p['port']) for p in result['ports'] if p['open']]
-                        closed_ports = [str(p['port']) for p in result['ports'] if not p['open']]
-                        open_ports_str = ','.join(open_ports)
-                        closed_ports_str = ','.join(closed_ports)
-                        total_ports = len(result['ports'])
-                    else:
-                        open_ports_str = ''
-                        closed_ports_str = ''
-                        total_ports = 0
-                    
-                    writer.writerow([host, timestamp, ping_status, ping_duration, 
-                                   open_ports_str, closed_ports_str, total_ports])
-            
-            messagebox.showinfo("Export Success", f"CSV summary exported to:\n{filename}")
-            
-        except Exception as e:
-            messagebox.showerror("Export Error", f"Failed to export CSV: {e}")
+        filename = filedialog.asksaveasfilename(
+            defaultextension=extension,
+            initialfile=f"network_scan_{timestamp}{extension}",
+            filetypes=[(f"{label} files", f"*{extension}"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        if fields is None:
+            fields = [field for field, _, selected in ResultsExporter.FIELDS if selected]
+        
+        exporter = ResultsExporter(self.results, filename, format_type, fields)
+        exporter.start()
+        self.export_button.config(state='disabled')
+        
+        # Progress window; the export runs on while the main window stays usable
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title("Exporting Results")
+        progress_window.transient(self.root)
+        progress_label = ttk.Label(progress_window, text=f"Exporting to {os.path.basename(filename)}...")
+        progress_label.pack(padx=20, pady=(15, 5))
+        progress_bar = ttk.Progressbar(progress_window, mode='determinate', length=300,
+                                       maximum=max(exporter.total, 1))
+        progress_bar.pack(padx=20, pady=5)
+        ttk.Button(progress_window, text="Cancel", command=exporter.cancelled.set).pack(pady=(5, 15))
+        progress_window.protocol("WM_DELETE_WINDOW", exporter.cancelled.set)
+        
+        def poll():
+            progress_bar['value'] = exporter.done
+            progress_label.config(text=f"Exported {exporter.done} of {exporter.total} hosts")
+            if not exporter.finished():
+                self.root.after(self.DRAIN_INTERVAL, poll)
+                return
+            progress_window.destroy()
+            self.export_button.config(state='normal')
+            if exporter.error:
+                messagebox.showerror("Export Error", f"Failed to export results: {exporter.error}")
+            elif exporter.cancelled.is_set():
+                self.progress_var.set("Export cancelled")
+            else:
+                messagebox.showinfo("Export Success", f"{exporter.total} hosts exported to:\n{filename}")
+        
+        poll()
     
     def on_closing(self):
         """Handle application closing."""
         if self.is_scanning:
             if messagebox.askokcancel("Quit", "A scan is in progress. Do you want to quit anyway?"):
-                self.is_scanning = False
+                self.stop_scan()
                 self.root.destroy()
         else:
             self.root.destroy()
@@ -690,12 +1511,16 @@ class NetworkCheckerGUI:
     def traceroute_host(self, host):
         """Run traceroute or tracert on the host."""
         try:
+            dns = self.dns.resolve(host)
+            if dns["error"]:
+                return {"success": False, "output": dns["error"]}
+            host = DnsCache.first_address(dns)
+            
             if self.os_type == "windows":
-                cmd = f"tracert {host}"
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=30, shell=True)
+                cmd = ["tracert", host]
             else:
                 cmd = ["traceroute", host]
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+            result = self.run_command(cmd, timeout=30)
 
             output = (result.stdout or "") + ("\n" + result.stderr if result.stderr else "")
             return {
@@ -708,77 +1533,35 @@ class NetworkCheckerGUI:
                 "output": str(e)
             }
         
+    def schedule_filter(self):
+        """Debounce typing in the search box: filter once it pauses for FILTER_DELAY."""
+        if self.filter_job:
+            self.root.after_cancel(self.filter_job)
+        self.filter_job = self.root.after(self.FILTER_DELAY, self.apply_filter)
+    
     def apply_filter(self):
-        """Filter the displayed results based on search input and checkboxes."""
-        search_term = self.search_var.get().strip().lower()
-        show_failed_ping_only = self.show_failed_ping_var.get()
-        show_failed_ports_only = self.show_failed_ports_var.get()
-
-        filtered_lines = []
-        host_block = []
-
-        for line in self.full_results_text.splitlines():
-            if line.startswith("=" * 60):  # Start of a new host section
-                if host_block:
-                    # Evaluate the previous block before starting a new one
-                    block_text = "\n".join(host_block).lower()
-                    include = True
-
-                    if search_term and search_term not in block_text:
-                        include = False
-
-                    # Ping check logic
-                    if show_failed_ping_only:
-                        if "ping:" not in block_text:
-                            include = False  # No ping line = skipped = exclude
-                        elif "ping: ✓ reachable" in block_text:
-                            include = False  # Success = exclude
-
-                    # Port check logic
-                    if show_failed_ports_only:
-                        if "closed ports:" not in block_text:
-                            include = False  # No closed ports = exclude
-
-                    if include:
-                        filtered_lines.extend(host_block)
-
-                host_block = [line]  # start a new host block
-            else:
-                host_block.append(line)
-
-        # Handle the last host block
-        if host_block:
-            block_text = "\n".join(host_block).lower()
-            include = True
-
-            if search_term and search_term not in block_text:
-                include = False
-
-            if show_failed_ping_only:
-                if "ping:" not in block_text:
-                    include = False
-                elif "ping: ✓ reachable" in block_text:
-                    include = False
-
-            if show_failed_ports_only:
-                if "closed ports:" not in block_text:
-                    include = False
-
-            if include:
-                filtered_lines.extend(host_block)
-
-        # Display
-        self.results_text.delete("1.0", tk.END)
-        self.results_text.insert(tk.END, "\n".join(filtered_lines))
-
-
+        """Filter the results table based on search input and checkboxes."""
+        if self.filter_job:
+            self.root.after_cancel(self.filter_job)
+            self.filter_job = None
+        self.model.set_filter(self.search_var.get(), self.show_failed_ping_var.get(),
+                              self.show_failed_ports_var.get())
+        self.table.reset()
+        self.update_filter_info()
+    
+    def update_filter_info(self):
+        """Show how many hosts pass the filter."""
+        if self.model.filter:
+            self.filter_info_var.set(f"{len(self.model.order)} of {len(self.results)} hosts")
+        else:
+            self.filter_info_var.set("")
+    
     def clear_filter(self):
-        """Clear the search filter and restore full results."""
-        self.results_text.delete("1.0", tk.END)
-        self.results_text.insert(tk.END, self.full_results_text)
+        """Clear the search filter and checkboxes and show all results."""
         self.search_var.set("")
-
-
+        self.show_failed_ping_var.set(False)
+        self.show_failed_ports_var.set(False)
+        self.apply_filter()
 
 
 def main():
@@ -0,0 +1,58 @@
+"""Shared fixtures: the scripts' directory on sys.path, the loopback fixture and a CLI launcher."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPT_DIR)
+
+CLI = os.path.join(SCRIPT_DIR, "pingport_cli.py")
+
+from pingport_bench import LoopbackFixture  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def loopback():
+    """Two loopback addresses x 20 ports with open, closed and filtered ports."""
+    fixture = LoopbackFixture(hosts=2, ports=20, base_port=23000, open_every=4, filtered_every=10)
+    fixture.start()
+    yield fixture
+    fixture.stop()
+
+class Cli:
+    """Runs pingport_cli.py in subprocesses, killing any still running at teardown."""
+    
+    def __init__(self):
+        self.started = []
+    
+    @staticmethod
+    def command(*args) -> list:
+        return [sys.executable, CLI, *map(str, args)]
+    
+    def run(self, *args, timeout: float = 60) -> subprocess.CompletedProcess:
+        """Run to completion, returning the captured text output."""
+        return subprocess.run(self.command(*args), capture_output=True, text=True, timeout=timeout)
+    
+    def start(self, *args) -> subprocess.Popen:
+        """Start in the background with stdout and stderr piped."""
+        proc = subprocess.Popen(self.command(*args), stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, text=True)
+        self.started.append(proc)
+        return proc
+    
+    def close(self) -> None:
+        for proc in self.started:
+            if proc.poll() is None:
+                proc.kill()
+                proc.communicate()
+
+
+@pytest.fixture
+def cli():
+    """Launcher for the command-line scanner."""
+    launcher = Cli()
+    yield launcher
+    launcher.close()
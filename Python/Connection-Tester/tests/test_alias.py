@@ -0,0 +1,65 @@
+"""AliasFanout scans each resolved address once and reports the result for every alias."""
+
+from concurrent.futures import Future
+
+from pingport_cli import AliasFanout, PortSet
+
+PORTS = PortSet.parse("80-81")
+
+
+class FakeDns:
+    """Answers from a fixed table of host -> address (None for lookup failures)."""
+    
+    def __init__(self, table):
+        self.table = table
+    
+    def submit(self, host):
+        address = self.table[host]
+        future = Future()
+        future.set_result({"host": host, "addresses": [address] if address else [],
+                           "error": None if address else "DNS resolution failed", "dns_time": 0})
+        return future
+    
+    def lookup(self, host):
+        return self.submit(host).result()
+
+
+def port_result(host, port, is_open):
+    return {"host": host, "port": port, "open": is_open,
+            "error": None if is_open else "Connection refused", "response_time": 1.0}
+
+
+def scan(fanout, host):
+    """Stand in for an engine that streams probes and keeps no host results."""
+    probes = {None: {"host": host, "success": True}, 80: port_result(host, 80, True),
+              81: port_result(host, 81, False)}
+    for port, result in probes.items():
+        fanout.on_probe(host, port, result)
+    fanout.on_host_complete({"host": host, "dns": None, "ping": None, "ports": None})
+
+
+def test_aliases_are_reported_without_being_scanned():
+    dns = FakeDns({"a": "10.0.0.1", "b": "10.0.0.1", "c": "10.0.0.2", "d": None, "e": "10.0.0.1"})
+    hosts, probes = [], []
+    fanout = AliasFanout(dns, PORTS, ping=True, on_host_complete=hosts.append,
+                         on_probe=lambda host, port, result: probes.append((host, port, result)),
+                         keep_results=False)
+
+    scanned = list(fanout.hosts(["a", "b", "c", "d"]))
+    assert scanned == ["a", "c", "d"]  # Unresolvable targets are left to fail on their own
+    assert fanout.aliases == 1
+
+    scan(fanout, "a")
+    assert [(r["host"], r.get("alias_of")) for r in hosts] == [("a", None), ("b", "a")]
+    alias_probes = [(port, result) for host, port, result in probes if host == "b"]
+    assert [port for port, _ in alias_probes] == [None, 80, 81]
+    assert alias_probes[0][1] == {"host": "b", "success": True, "alias_of": "a"}
+    assert [result["open"] for _, result in alias_probes[1:]] == [True, False]
+    assert all(result["alias_of"] == "a" for _, result in alias_probes)
+
+    # An alias turning up after its address was scanned is reported on flush()
+    hosts.clear()
+    assert list(fanout.hosts(["e"])) == []
+    fanout.flush()
+    assert [(r["host"], r["alias_of"]) for r in hosts] == [("e", "a")]
+    assert fanout.aliases == 2
@@ -0,0 +1,83 @@
+"""CheckpointJournal records every probe and restores them on resume."""
+
+import json
+import sqlite3
+import time
+
+import pytest
+
+from pingport_cli import CheckpointJournal, PortSet
+
+
+def port_result(host, port, open_=False, error="Connection refused", response_time=0.0):
+    return {"host": host, "port": port, "open": open_, "error": error, "response_time": response_time}
+
+
+def ping_result(host, success=True):
+    return {"host": host, "success": success, "duration": 1.0, "output": "ok", "rtt_avg": 0.25}
+
+
+def test_checkpoint_journal_resume_restores_every_probe(tmp_path):
+    path = str(tmp_path / "scan.journal")
+    ports = PortSet.parse("80-82")
+    inherited = dict(port_result("b", 82), inherited=True, checked_at="2026-01-02T03:04:05")
+    probes = [
+        ("a", None, ping_result("a")),
+        ("a", 80, port_result("a", 80, open_=True, error=None, response_time=2.5)),
+        ("a", 81, port_result("a", 81, error="Connection timed out")),
+        ("b", 82, inherited),
+    ]
+    with CheckpointJournal(path, ports, ping=True, batch_size=2) as journal:
+        for host, port, result in probes:
+            journal.record_probe(host, port, result)
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('["b",80,1,')  # Torn last line of a hard kill
+
+    with CheckpointJournal(path, ports, ping=True, resume=True) as journal:
+        assert journal.restored == {"a": {None: probes[0][2], 80: probes[1][2], 81: probes[2][2]},
+                                    "b": {82: inherited}}
+        assert journal.restored_probes == 4
+
+
+def test_checkpoint_journal_refuses_other_settings(tmp_path):
+    path = str(tmp_path / "scan.journal")
+    CheckpointJournal(path, PortSet.parse("80"), ping=True).close()
+    with pytest.raises(ValueError):
+        CheckpointJournal(path, PortSet.parse("81"), ping=True, resume=True)
+    with pytest.raises(ValueError):
+        CheckpointJournal(path, PortSet.parse("80"), ping=False, resume=True)
+
+
+def test_checkpoint_journal_without_resume_starts_over(tmp_path):
+    path = str(tmp_path / "scan.journal")
+    ports = PortSet.parse("80")
+    with CheckpointJournal(path, ports, ping=False) as journal:
+        journal.record_probe("a", 80, port_result("a", 80))
+    with CheckpointJournal(path, ports, ping=False) as journal:
+        pass
+    with CheckpointJournal(path, ports, ping=False, resume=True) as journal:
+        assert journal.restored == {}
+
+
+def test_history_holds_every_journaled_probe_after_a_kill(loopback, cli, tmp_path):
+    journal_path = tmp_path / "scan.journal"
+    history_path = tmp_path / "history.db"
+    # One worker and slow filtered ports: the journal's first timed flush comes well before the end
+    scan = cli.start("--hosts", *loopback.addresses, "--port-ranges", str(loopback.ports).replace(" ", ""),
+                     "--no-ping", "--timeout", 3, "--checkpoint", journal_path, "--history", history_path)
+    deadline = time.monotonic() + 30
+    journaled = []
+    while len(journaled) < 2 and time.monotonic() < deadline and scan.poll() is None:
+        time.sleep(0.1)
+        if journal_path.exists():
+            journaled = journal_path.read_text(encoding="utf-8").splitlines()
+    scan.kill()
+    scan.communicate()
+    assert len(journaled) >= 2, "the journal was not flushed before the scan ended"
+
+    entries = [json.loads(line) for line in journaled[1:]]
+    conn = sqlite3.connect(history_path)
+    recorded = set(conn.execute("SELECT host, port FROM probes"))
+    conn.close()
+    assert {(entry[0], entry[1]) for entry in entries} <= recorded
@@ -0,0 +1,95 @@
+"""A distributed scan (--serve) with two workers covers every host once and exits cleanly."""
+
+import json
+import socket
+import time
+from collections import Counter
+
+import pytest
+
+from pingport_cli import PortStateStore
+
+
+def test_two_workers_cover_every_probe_once(loopback, cli, tmp_path):
+    socket_path = tmp_path / "coordinator.sock"
+    output = tmp_path / "results.ndjson"
+    hosts = [f"127.0.0.{i}" for i in range(1, 21)]
+    ports = list(loopback.ports)[:4]  # Open and closed ports only, so nothing waits for a timeout
+    coordinator = cli.start("--hosts", *hosts, "--port-ranges", f"{ports[0]}-{ports[-1]}",
+                            "--no-ping", "--timeout", 1, "--serve", f"unix:{socket_path}",
+                            "--unit-size", 3, "--output", "ndjson", "--output-file", output)
+    deadline = time.monotonic() + 10
+    while not socket_path.exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert socket_path.exists(), "coordinator did not start listening"
+
+    workers = [cli.start("worker", f"unix:{socket_path}", "--name", name) for name in ("a", "b")]
+    for worker in workers:
+        _, stderr = worker.communicate(timeout=60)
+        assert worker.returncode == 0, stderr
+    _, stderr = coordinator.communicate(timeout=30)
+    assert coordinator.returncode == 0, stderr
+
+    with open(output, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert Counter((r["host"], r["port"]) for r in records) == Counter(
+        {(host, port): 1 for host in hosts for port in ports})
+    assert {r["worker"] for r in records} <= {"a", "b"}
+    for record in records:
+        expected = loopback.expected.get((record["host"], record["port"]), PortStateStore.CLOSED)
+        assert PortStateStore.classify(record) == expected
+
+
+def wait_for_socket(path):
+    deadline = time.monotonic() + 10
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert path.exists(), "coordinator did not start listening"
+
+
+def exchange(path, *messages):
+    """Send messages on a fresh connection; return the replies until the coordinator hangs up."""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.connect(str(path))
+    conn.settimeout(10)
+    with conn, conn.makefile("rw", encoding="utf-8") as stream:
+        for message in messages:
+            stream.write((message if isinstance(message, str) else json.dumps(message)) + "\n")
+        stream.flush()
+        return [json.loads(line) for line in stream]
+
+
+MALFORMED = [
+    {"type": "host", "lease": 1},                                      # No host
+    {"type": "probes", "lease": 1, "items": [["127.0.0.1", 9, {}]]},   # Port outside the scan, no result
+    '["not", "an", "object"]',
+]
+
+
+@pytest.mark.parametrize("malformed", MALFORMED)
+def test_bad_token_and_malformed_messages_are_refused(loopback, cli, tmp_path, malformed):
+    socket_path = tmp_path / "coordinator.sock"
+    output = tmp_path / "results.ndjson"
+    hosts = [f"127.0.0.{i}" for i in range(1, 5)]
+    ports = list(loopback.ports)[:2]
+    coordinator = cli.start("--hosts", *hosts, "--port-ranges", f"{ports[0]}-{ports[-1]}",
+                            "--no-ping", "--timeout", 1, "--serve", f"unix:{socket_path}", "--token", "secret",
+                            "--unit-size", 2, "--output", "ndjson", "--output-file", output)
+    wait_for_socket(socket_path)
+
+    assert exchange(socket_path, {"type": "hello", "name": "x", "token": "wrong"}) == [
+        {"type": "error", "error": "bad hello or token"}]
+    assert exchange(socket_path, {"type": "hello", "name": "x", "token": 7})[0]["type"] == "error"
+    replies = exchange(socket_path, {"type": "hello", "name": "x", "token": "secret"}, {"type": "request"}, malformed)
+    assert [reply["type"] for reply in replies] == ["config", "unit", "error"]
+
+    # The dropped worker's unit is handed out again
+    worker = cli.start("worker", f"unix:{socket_path}", "--token", "secret")
+    _, stderr = worker.communicate(timeout=60)
+    assert worker.returncode == 0, stderr
+    _, stderr = coordinator.communicate(timeout=30)
+    assert coordinator.returncode == 0, stderr
+    with open(output, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert Counter((r["host"], r["port"]) for r in records) == Counter(
+        {(host, port): 1 for host in hosts for port in ports})
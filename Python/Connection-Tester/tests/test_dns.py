@@ -0,0 +1,58 @@
+"""DnsCache shares one lookup per name and answers IP literals without one."""
+
+import asyncio
+
+import pytest
+
+from pingport_cli import DnsCache
+
+
+@pytest.fixture
+def dns():
+    cache = DnsCache(ttl=60, workers=2)
+    yield cache
+    cache.shutdown()
+
+
+def test_repeated_requests_share_one_lookup(dns):
+    assert dns.lookup("localhost") is None
+    future = dns.submit("localhost")
+    assert dns.submit("localhost") is future
+    entry = future.result(timeout=10)
+    assert entry["error"] is None and "127.0.0.1" in entry["addresses"]
+    assert dns.lookup("localhost") == entry
+    assert dns.resolve("localhost") is entry
+    assert asyncio.run(dns.resolve_async("localhost")) is entry
+
+
+def test_ip_literals_resolve_to_themselves_without_being_cached(dns):
+    for host in (f"10.0.{i >> 8}.{i & 255}" for i in range(2 * DnsCache.MAX_ENTRIES)):
+        assert dns.resolve(host)["addresses"] == [host]
+    entry = dns.resolve("::1")
+    assert entry == {"host": "::1", "addresses": ["::1"], "error": None, "dns_time": 0}
+    assert dns.lookup("::1") == entry
+    assert len(dns._entries) == 0
+
+
+def test_least_recently_used_names_are_evicted(dns, monkeypatch):
+    monkeypatch.setattr(DnsCache, "MAX_ENTRIES", 2)
+    first = dns.submit("localhost")
+    first.result(timeout=10)
+    dns.submit("nonexistent.invalid").result(timeout=10)
+    assert dns.submit("localhost") is first  # Now the most recently used
+    dns.submit("other.invalid").result(timeout=10)
+    assert list(dns._entries) == ["localhost", "other.invalid"]
+    assert dns.lookup("nonexistent.invalid") is None
+
+
+def test_failed_lookup_is_reported(dns):
+    entry = dns.resolve("nonexistent.invalid")
+    assert entry["addresses"] == [] and entry["error"].startswith("DNS resolution failed")
+    assert dns.negative_ttl == 30
+
+
+def test_first_address_can_skip_ipv6():
+    entry = {"host": "h", "addresses": ["::1", "127.0.0.1"], "error": None, "dns_time": 0}
+    assert DnsCache.first_address(entry) == "::1"
+    assert DnsCache.first_address(entry, ipv4_only=True) == "127.0.0.1"
+    assert DnsCache.first_address(dict(entry, addresses=["::1"]), ipv4_only=True) is None
@@ -0,0 +1,88 @@
+"""Every scan engine reports the same port states for the same loopback targets."""
+
+import asyncio
+import errno
+import os
+import socket
+
+import pytest
+
+from pingport_cli import NetworkChecker, PortStateStore
+
+TIMEOUT = 0.5
+
+
+def scan_hosts(checker, engine, hosts, ports, **options):
+    """Run one of the cross-host engines and return its host results."""
+    if engine == "thread":
+        return checker.scan_hosts_parallel(hosts, ports, **options)
+    if engine == "select":
+        return checker.scan_hosts_selector(hosts, ports, **options)
+    return asyncio.run(checker.scan_hosts_async(hosts, ports, **options))
+
+
+def scan(engine, addresses, ports):
+    """Scan with one engine and return {(host, port): state}."""
+    checker = NetworkChecker(timeout=TIMEOUT, max_workers=20, concurrency=100)
+    if engine == "sequential":
+        results = [(host, checker.check_port(host, port)) for host in addresses for port in ports]
+    elif engine == "ports_parallel":
+        results = [(host, r) for host in addresses for r in checker.scan_ports_parallel(host, list(ports))]
+    else:
+        results = []
+        scan_hosts(checker, engine, addresses, ports, ping=False, keep_results=False,
+                   on_probe=lambda host, port, result: results.append((host, result)))
+    checker.dns.shutdown()
+    return {(host, result["port"]): PortStateStore.classify(result) for host, result in results}
+
+
+@pytest.mark.parametrize("engine", ["sequential", "ports_parallel", "thread", "async", "select"])
+def test_engine_matches_fixture(loopback, engine):
+    assert scan(engine, loopback.addresses, loopback.ports) == loopback.expected
+
+
+@pytest.mark.parametrize("engine", ["thread", "async", "select"])
+def test_each_host_is_reported_once_in_port_order(loopback, engine):
+    checker = NetworkChecker(timeout=TIMEOUT, max_workers=3, concurrency=3)
+    reported = []
+    results = scan_hosts(checker, engine, loopback.addresses, loopback.ports, ping=False,
+                         on_host_complete=reported.append)
+    checker.dns.shutdown()
+    assert sorted(r["host"] for r in reported) == loopback.addresses
+    assert reported == results
+    for result in results:
+        assert [p["port"] for p in result["ports"]] == list(loopback.ports)
+        assert result["ping"] is None
+
+
+@pytest.mark.parametrize("engine", ["sequential", "async"])
+def test_connects_are_retried_when_out_of_file_descriptors(loopback, monkeypatch, engine):
+    failures = []
+
+    def exhausted():
+        failures.append(1)
+        raise OSError(errno.EMFILE, os.strerror(errno.EMFILE))
+
+    if engine == "sequential":
+        real = socket.create_connection
+        monkeypatch.setattr(socket, "create_connection",
+                            lambda *args, **kwargs: exhausted() if len(failures) < 3 else real(*args, **kwargs))
+    else:
+        real = asyncio.open_connection
+
+        async def open_connection(*args, **kwargs):
+            if len(failures) < 3:
+                exhausted()
+            return await real(*args, **kwargs)
+
+        monkeypatch.setattr(asyncio, "open_connection", open_connection)
+
+    host, port = next(key for key, state in loopback.expected.items() if state == PortStateStore.OPEN)
+    checker = NetworkChecker(timeout=TIMEOUT)
+    if engine == "sequential":
+        result = checker.check_port(host, port)
+    else:
+        result = asyncio.run(checker.check_port_async(host, port))
+    checker.dns.shutdown()
+    assert result["open"] and result["error"] is None
+    assert len(failures) == 3
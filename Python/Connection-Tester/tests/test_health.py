@@ -0,0 +1,50 @@
+"""Health-check decisions, exit codes and prioritized port order."""
+
+import pytest
+
+from pingport_cli import HealthCheck, PrioritizedPortSet
+
+
+def port_result(port, is_open):
+    return {"port": port, "open": is_open, "error": None if is_open else "Connection refused"}
+
+
+@pytest.mark.parametrize("mode, results, healthy", [
+    ("any-open", [port_result(22, False), port_result(80, True)], True),
+    ("any-open", [port_result(22, False), port_result(80, False)], False),
+    ("all-open", [port_result(22, True), port_result(80, True)], True),
+    ("all-open", [port_result(22, True), port_result(80, False)], False),
+])
+def test_decision_and_exit_code(mode, results, healthy):
+    health = HealthCheck(mode)
+    decided = [health.decided("h", r["port"], r) for r in results]
+    assert decided.count(True) == (1 if healthy == (mode == "any-open") else 0)
+    record = health.host_record({"host": "h"})
+    assert record["healthy"] is healthy
+    assert health.exit_code == (0 if healthy else 1)
+    assert "HEALTHY" in HealthCheck.format_record(record)
+
+
+def test_exit_code_fails_if_any_host_fails():
+    health = HealthCheck("any-open")
+    health.decided("up", 443, port_result(443, True))
+    health.host_record({"host": "up"})
+    assert health.exit_code == 0
+    health.host_record({"host": "down"})
+    assert (health.healthy, health.unhealthy, health.exit_code) == (1, 1, 1)
+
+
+def test_common_ports_come_first():
+    ports = PrioritizedPortSet.parse("1-100,443,8080")
+    order = list(ports)
+    common = [443, 80, 22, 8080, 21, 25, 53, 23]
+    assert order[:8] == common
+    assert order[8:] == [p for p in range(1, 101) if p not in common]
+    assert len(order) == len(ports)
+
+
+@pytest.mark.parametrize("ports, code", [("23000-23003", 0), ("23001-23003", 1)])
+def test_cli_exit_code(loopback, cli, ports, code):
+    proc = cli.run("--hosts", loopback.addresses[0], "--port-ranges", ports, "--no-ping",
+                   "--until", "any-open")
+    assert proc.returncode == code, proc.stderr
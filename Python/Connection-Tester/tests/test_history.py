@@ -0,0 +1,51 @@
+"""ScanHistory stores probes and answers the history queries from them."""
+
+import sqlite3
+import time
+
+from pingport_cli import ScanHistory
+
+
+def port_result(host, port, open_=False, error="Connection refused", response_time=0.0):
+    return {"host": host, "port": port, "open": open_, "error": error, "response_time": response_time}
+
+
+def ping_result(host, success=True):
+    return {"host": host, "success": success, "duration": 1.0, "output": "ok", "rtt_avg": 0.25}
+
+
+def test_scan_history_round_trip(tmp_path):
+    path = str(tmp_path / "history.db")
+    with ScanHistory(path, batch_size=2) as history:
+        history.begin_scan("first")
+        history.record_probe("a", None, ping_result("a"))
+        history.record_probe("a", 80, port_result("a", 80, open_=True, error=None, response_time=3.0))
+        history.record_probe("a", 81, dict(port_result("a", 81), inherited=True, checked_at="x"))
+    with ScanHistory(path) as history:
+        history.begin_scan("second")
+        history.record_probe("a", 80, port_result("a", 80, error="Connection timed out"))
+
+    with ScanHistory(path) as history:
+        rows = history.probes("a")
+        assert sorted((row["port"] or 0, row["state"]) for row in rows) == [
+            (0, "up"), (80, "filtered"), (80, "open")]  # The inherited probe is not stored
+        assert history.probes("a", 80, limit=1)[0]["state"] == "filtered"
+        flaps = history.flaps("a", 80)
+        assert [(flap["from"], flap["to"]) for flap in flaps] == [("open", "filtered")]
+        assert history.latency_percentiles(host="a") == [
+            {"host": "a", "samples": 1, "p50": 3.0, "p95": 3.0, "p99": 3.0}]
+        scans = history.conn.execute("SELECT command, finished_at IS NOT NULL FROM scans ORDER BY id").fetchall()
+        assert scans == [("first", 1), ("second", 1)]
+
+
+def test_scan_history_commits_slow_scans_every_flush_interval(tmp_path):
+    path = str(tmp_path / "history.db")
+    reader = sqlite3.connect(path)
+    with ScanHistory(path, flush_interval=0.2) as history:
+        history.begin_scan()
+        history.record_probe("a", 80, port_result("a", 80))
+        assert reader.execute("SELECT COUNT(*) FROM probes").fetchone() == (0,)
+        time.sleep(0.3)
+        history.record_probe("a", 81, port_result("a", 81))
+        assert reader.execute("SELECT COUNT(*) FROM probes").fetchone() == (2,)
+    reader.close()
@@ -0,0 +1,105 @@
+"""IcmpPinger packet building, reply bookkeeping and a live echo to 127.0.0.1 where permitted."""
+
+import asyncio
+import struct
+import sys
+import threading
+import time
+
+import pytest
+
+import pingport_cli
+from pingport_cli import IcmpPinger, _EchoSession
+
+
+def test_checksum_matches_rfc_1071_example():
+    assert IcmpPinger.checksum(bytes([0x00, 0x01, 0xF2, 0x03, 0xF4, 0xF5, 0xF6, 0xF7])) == 0x220D
+    assert IcmpPinger.checksum(b"\x01") == IcmpPinger.checksum(b"\x01\x00")
+
+
+def test_echo_request_carries_a_valid_checksum():
+    packet = IcmpPinger()._build_echo(7)
+    kind, code, _, _, seq = struct.unpack("!BBHHH", packet[:8])
+    assert (kind, code, seq) == (IcmpPinger.ICMP_ECHO_REQUEST, 0, 7)
+    assert IcmpPinger.checksum(packet) == 0
+
+
+def test_session_result_reports_rtt_and_loss():
+    session = _EchoSession("h", "192.0.2.1", count=4)
+    session.sent = 4
+    for rtt in (1.0, 3.0, 2.0):
+        session.add_reply(rtt)
+    assert not session.done.is_set()
+    result = session.result(3.14159)
+    assert result["success"] and result["return_code"] == 0 and result["error"] is None
+    assert (result["packets_sent"], result["packets_received"], result["packet_loss"]) == (4, 3, 25.0)
+    assert (result["rtt_min"], result["rtt_avg"], result["rtt_max"]) == (1.0, 2.0, 3.0)
+    assert result["duration"] == 3.14
+
+    session.add_reply(4.0)
+    assert session.done.is_set()
+
+
+def test_session_without_replies_fails():
+    session = _EchoSession("h", "192.0.2.1", count=2)
+    session.sent = 2
+    result = session.result(1.0)
+    assert not result["success"] and result["packet_loss"] == 100.0
+    assert result["error"] == "No echo replies received"
+    assert _EchoSession.failure("h", "boom")["rtt_avg"] is None
+
+
+def test_ping_unresolvable_host_reports_dns_failure():
+    result = IcmpPinger(timeout=1).ping("nonexistent.invalid", count=1)
+    assert not result["success"] and result["error"].startswith("DNS resolution failed")
+
+
+def test_ping_loopback():
+    pinger = IcmpPinger(timeout=1, interval=0.01)
+    if not pinger.available():
+        pytest.skip("ICMP sockets are not permitted here")
+    try:
+        result = pinger.ping("127.0.0.1", count=3)
+    finally:
+        pinger.close()
+    assert result["success"], result
+    assert result["packets_received"] == 3 and result["rtt_min"] <= result["rtt_avg"] <= result["rtt_max"]
+
+
+def test_ping_async_is_interrupted():
+    pinger = IcmpPinger(timeout=10, interval=5)
+    if not pinger.available():
+        pytest.skip("ICMP sockets are not permitted here")
+    threading.Timer(0.2, pinger.interrupt).start()
+    started = time.monotonic()
+    try:
+        result = asyncio.run(pinger.ping_async("192.0.2.1", count=3, address="192.0.2.1"))  # TEST-NET-1: no replies
+    finally:
+        pinger.close()
+    assert time.monotonic() - started < 2
+    assert result["packets_sent"] == 1 and not pinger._pinging
+
+
+def test_icmp_engine_without_permission_is_a_usage_error(monkeypatch, capsys):
+    def refuse(cls):
+        raise PermissionError(1, "Operation not permitted")
+    
+    monkeypatch.setattr(IcmpPinger, "open_socket", classmethod(refuse))
+    monkeypatch.setattr(sys, "argv", ["pingport_cli.py", "--hosts", "127.0.0.1", "--ping-engine", "icmp"])
+    with pytest.raises(SystemExit) as exit_info:
+        pingport_cli.main()
+    assert exit_info.value.code == 2
+    assert IcmpPinger.UNAVAILABLE in capsys.readouterr().err
+
+
+def test_ping_cancelled_before_it_starts_sends_nothing():
+    pinger = IcmpPinger(timeout=10, interval=5)
+    if not pinger.available():
+        pytest.skip("ICMP sockets are not permitted here")
+    started = time.monotonic()
+    try:
+        result = pinger.ping("192.0.2.1", count=3, address="192.0.2.1", cancelled=lambda: True)
+    finally:
+        pinger.close()
+    assert time.monotonic() - started < 1
+    assert result["packets_sent"] == 0 and not pinger._pinging
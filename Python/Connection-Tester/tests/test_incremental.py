@@ -0,0 +1,100 @@
+"""An incremental scan probes plus inherits exactly the ports its plan counted."""
+
+import asyncio
+import json
+import time
+from collections import Counter
+from datetime import datetime
+
+import pytest
+
+from pingport_cli import IncrementalPlan, NetworkChecker, PortStateStore, ScanBaseline
+
+RESULTS = {
+    PortStateStore.OPEN: (True, None),
+    PortStateStore.CLOSED: (False, "Connection refused"),
+    PortStateStore.FILTERED: (False, "Connection timed out"),
+}
+
+
+@pytest.fixture
+def baseline_file(loopback, tmp_path):
+    """NDJSON results of a scan ten days ago, missing the last port of the first host."""
+    path = tmp_path / "baseline.ndjson"
+    scanned_at = datetime.fromtimestamp(time.time() - 10 * 86400).isoformat()
+    new_port = (loopback.addresses[0], list(loopback.ports)[-1])
+    with open(path, "w", encoding="utf-8") as f:
+        for (host, port), state in loopback.expected.items():
+            if (host, port) == new_port:
+                continue
+            is_open, error = RESULTS[state]
+            f.write(json.dumps({"type": "port", "timestamp": scanned_at, "host": host, "port": port,
+                                "open": is_open, "error": error, "response_time": 1.0}) + "\n")
+    return str(path)
+
+
+def make_plan(path, ports):
+    # Nothing sampled and nothing due for a full sweep: stable ports are always inherited
+    return IncrementalPlan(ScanBaseline(path, ports), stable_days=7, sample_rate=0, full_sweep_days=30)
+
+
+@pytest.mark.parametrize("engine", ["thread", "async", "select"])
+def test_incremental_scan_matches_plan(loopback, baseline_file, engine):
+    plan = make_plan(baseline_file, loopback.ports)
+    checker = NetworkChecker(timeout=0.5, max_workers=20, concurrency=100)
+    probes = []
+    options = {
+        "ping": False,
+        "on_probe": lambda host, port, result: probes.append((host, port, result)),
+        "on_host_complete": lambda result: plan.release(result["host"]),
+        "keep_results": False,
+        "restored": plan,
+    }
+    if engine == "thread":
+        checker.scan_hosts_parallel(loopback.addresses, loopback.ports, **options)
+    elif engine == "async":
+        asyncio.run(checker.scan_hosts_async(loopback.addresses, loopback.ports, **options))
+    else:
+        checker.scan_hosts_selector(loopback.addresses, loopback.ports, **options)
+    checker.dns.shutdown()
+    plan.baseline.close()
+
+    reported = Counter((host, port) for host, port, _ in probes)
+    assert set(reported) == set(loopback.expected) and set(reported.values()) == {1}
+
+    inherited = [result for _, _, result in probes if result.get("inherited")]
+    fresh = [result for _, _, result in probes if not result.get("inherited")]
+    counts = plan.counts
+    assert len(inherited) == counts["inherited"]
+    assert len(fresh) == counts["open/changed"] + counts["new"]
+    assert counts["sampled"] == counts["full sweep"] == 0
+    assert counts["new"] == 1
+    assert counts["open/changed"] == list(loopback.expected.values()).count(PortStateStore.OPEN)
+    for host, port, result in probes:
+        assert PortStateStore.classify(result) == loopback.expected[(host, port)]
+
+
+def test_plan_is_counted_once_per_host(loopback, baseline_file):
+    plan = make_plan(baseline_file, loopback.ports)
+    host = loopback.addresses[1]
+    first = plan.get(host)
+    counts = dict(plan.counts)
+    assert plan.get(host) is first
+    assert plan.counts == counts
+    assert sum(counts.values()) == len(loopback.ports)
+
+    plan.release(host)
+    assert plan.get(host) is not first
+    plan.baseline.close()
+
+
+def test_seeded_sample_repeats(loopback, baseline_file):
+    def sampled(seed):
+        plan = IncrementalPlan(ScanBaseline(baseline_file, loopback.ports), stable_days=7, sample_rate=0.5,
+                               full_sweep_days=30, seed=seed)
+        fresh = {host: sorted(set(loopback.ports) - set(plan.get(host, {}))) for host in loopback.addresses}
+        plan.baseline.close()
+        return fresh, plan.counts
+    
+    assert sampled(42) == sampled(42)
+    assert sampled(42)[1]["sampled"] > 0
@@ -0,0 +1,66 @@
+"""NDJSON output: one record per probe, batched, optionally gzip-compressed."""
+
+import gzip
+import json
+
+import pytest
+
+from pingport_cli import NdjsonWriter, PortStateStore
+
+
+def test_writer_batches_and_compresses(tmp_path):
+    path = tmp_path / "scan.ndjson.gz"
+    with NdjsonWriter(str(path), batch_size=2, flush_interval=60) as writer:
+        writer.write_probe("a", None, {"host": "a", "success": True})
+        assert writer.records_written == 0
+        writer.write_probe("a", 80, {"host": "ignored", "port": 80, "open": True})
+        assert writer.records_written == 2
+        writer.write_probe("a", 81, {"host": "a", "port": 81, "open": False})
+    assert writer.records_written == 3
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert [(r["type"], r["host"], r.get("port")) for r in records] == [
+        ("ping", "a", None), ("port", "a", 80), ("port", "a", 81)]
+    assert all(r["timestamp"].endswith("+00:00") for r in records)
+
+
+@pytest.mark.parametrize("options", [["--parallel"], ["--engine", "async"], ["--engine", "select"],
+                                     ["--procs", "2"]])
+def test_cli_streams_one_record_per_probe(loopback, cli, options):
+    proc = cli.run("--hosts", *loopback.addresses, "--port-ranges", str(loopback.ports).replace(" ", ""),
+                   "--no-ping", "--timeout", 1, "--output", "ndjson", *options)
+    assert proc.returncode == 0, proc.stderr
+    records = [json.loads(line) for line in proc.stdout.splitlines()]
+    assert len(records) == len(loopback.expected)
+    assert {(r["host"], r["port"]): PortStateStore.classify(r) for r in records} == loopback.expected
+
+
+def test_cli_without_parallel_probes_in_order(loopback, cli):
+    hosts = loopback.addresses[::-1]
+    ports = list(loopback.ports)[:4]
+    proc = cli.run("--hosts", *hosts, "--port-ranges", f"{ports[0]}-{ports[-1]}", "--no-ping",
+                   "--output", "ndjson")
+    assert proc.returncode == 0, proc.stderr
+    records = [json.loads(line) for line in proc.stdout.splitlines()]
+    assert [(r["host"], r["port"]) for r in records] == [(host, port) for host in hosts for port in ports]
+
+
+@pytest.mark.parametrize("options", [[], ["--engine", "async"], ["--engine", "select"], ["--procs", "2"]])
+def test_cli_reports_an_unresolvable_host_once(loopback, cli, options):
+    proc = cli.run("--hosts", "nonexistent.invalid", loopback.addresses[0], "--ports", 80, 443, 22,
+                   "--timeout", 1, "--ping-count", 1, "--output", "ndjson", *options)
+    assert proc.returncode == 0, proc.stderr
+    records = [json.loads(line) for line in proc.stdout.splitlines()]
+    failed = [r for r in records if r["host"] == "nonexistent.invalid"]
+    assert [r["type"] for r in failed] == ["dns"]
+    assert failed[0]["error"].startswith("DNS resolution failed")
+    assert sorted(r["port"] for r in records
+                  if r["host"] == loopback.addresses[0] and r["type"] == "port") == [22, 80, 443]
+
+
+@pytest.mark.parametrize("option", [["--output-file", "scan.ndjson"], ["--gzip"]])
+def test_cli_rejects_ndjson_options_without_ndjson_output(cli, option):
+    proc = cli.run("--hosts", "127.0.0.1", "--ports", 80, *option)
+    assert proc.returncode == 2
+    assert "require --output ndjson" in proc.stderr
@@ -0,0 +1,71 @@
+"""AIMD rate control of the probe pacer's token buckets."""
+
+import pytest
+
+from pingport_cli import ProbePacer, _AimdBucket
+
+
+def window(bucket, now, timeouts=0, rtt_ms=1.0, feedback_delay=0.5):
+    """Finish one feedback window's worth of probes at time `now`."""
+    for i in range(ProbePacer.WINDOW_PROBES):
+        bucket.observe(now, i < timeouts, rtt_ms, feedback_delay)
+
+
+def test_slow_start_doubles_then_timeouts_halve():
+    bucket = _AimdBucket(max_rate=1000, min_rate=1)
+    t0 = bucket.window_start
+    assert bucket.rate == 100 and bucket.slow_start
+
+    window(bucket, t0 + 1)
+    window(bucket, t0 + 2)
+    assert bucket.rate == 400
+
+    window(bucket, t0 + 3, timeouts=8)
+    assert (bucket.rate, bucket.slow_start, bucket.decreases) == (200, False, 1)
+
+    # Timeouts seen within the feedback delay of the last slowdown are stale
+    window(bucket, t0 + 3.1 + ProbePacer.WINDOW_SECONDS, timeouts=8, feedback_delay=3)
+    assert bucket.rate == 200
+
+    window(bucket, t0 + 5)
+    assert bucket.rate == 250  # Additive increase of 5% of the ceiling
+
+
+def test_inflated_rtt_trims_the_rate():
+    bucket = _AimdBucket(max_rate=1000, min_rate=1)
+    t0 = bucket.window_start
+    window(bucket, t0 + 1, rtt_ms=1.0)
+    window(bucket, t0 + 2, rtt_ms=20.0)
+    assert bucket.rate == pytest.approx(200 * 0.8)
+    assert bucket.base_rtt == 1.0
+
+
+def test_rate_stays_within_bounds():
+    bucket = _AimdBucket(max_rate=100, min_rate=5)
+    t0 = bucket.window_start
+    for i in range(1, 10):
+        window(bucket, t0 + i, timeouts=8, feedback_delay=0)
+    assert bucket.rate == 5
+    for i in range(10, 100):
+        window(bucket, t0 + i)
+    assert bucket.rate == 100
+    assert _AimdBucket(max_rate=2, min_rate=5).min_rate == 2
+
+
+def test_tokens_refill_at_the_current_rate():
+    bucket = _AimdBucket(max_rate=1000, min_rate=1)
+    now = bucket.updated
+    assert bucket.wait_time(now) == 0
+    bucket.tokens -= 1
+    assert bucket.wait_time(now) == pytest.approx(1 / bucket.rate)
+    assert bucket.wait_time(now + 1 / bucket.rate) == 0
+
+
+def test_pacer_takes_tokens_from_global_and_target_buckets():
+    pacer = ProbePacer(rate=100, host_rate=10)
+    pacer.acquire("a")
+    assert pacer.try_acquire("a") > 0.5  # The target bucket (1/s in slow start) is empty
+    pacer.acquire("b")
+    assert pacer.sent == 2
+    pacer.observe("a", {"open": False, "error": "Connection timed out", "response_time": 1000})
+    assert (pacer.finished, pacer.timeouts) == (1, 1)
@@ -0,0 +1,94 @@
+"""PortSet parsing and PortStateStore round trips."""
+
+import pytest
+
+from pingport_cli import NetworkChecker, PortSet, PortStateStore
+
+
+def port_result(host, port, open_=False, error="Connection refused", response_time=0.0):
+    return {"host": host, "port": port, "open": open_, "error": error, "response_time": response_time}
+
+
+def test_port_set_parse_and_format_round_trip():
+    ports = PortSet.parse("443, 80,8000-8010,81, 8005", ports=[22])
+    assert str(ports) == "22, 80-81, 443, 8000-8010"
+    assert PortSet.parse(str(ports)) == ports
+    assert list(ports) == [22, 80, 81, 443] + list(range(8000, 8011))
+    assert len(ports) == 15
+
+
+def test_port_set_index_is_inverse_of_port_at():
+    ports = PortSet.parse("1-3,100,65530-65535")
+    for index, port in enumerate(ports):
+        assert ports.index(port) == index
+        assert ports.port_at(index) == port
+    assert 100 in ports and 99 not in ports
+    with pytest.raises(ValueError):
+        ports.index(99)
+
+
+@pytest.mark.parametrize("spec", ["0", "65536", "10-5", "http"])
+def test_port_set_rejects_invalid_ports(spec):
+    with pytest.raises(ValueError):
+        PortSet.parse(spec)
+
+
+def test_port_state_store_renders_what_was_recorded():
+    ports = PortSet.parse("20-30,443")
+    store = PortStateStore("h", ports)
+    recorded = [
+        port_result("h", 20, open_=True, error=None, response_time=1.5),
+        port_result("h", 21),
+        port_result("h", 25, error="Connection timed out"),
+        port_result("h", 30, error="[Errno 113] No route to host"),
+        port_result("h", 443, open_=True, error=None, response_time=12.25),
+    ]
+    for result in recorded:
+        store.record(result)
+
+    assert list(store) == recorded
+    assert len(store) == len(recorded)
+    assert store.result(25) == recorded[2]
+    assert store.result(22) is None
+    assert [store.state(p) for p in (20, 21, 25, 30)] == ["open", "closed", "filtered", "closed"]
+    assert list(store.ports_in(PortStateStore.OPEN)) == [20, 443]
+
+    assert store.error_messages() == {"Connection refused", "Connection timed out",
+                                      "[Errno 113] No route to host"}
+    alias = store.for_host("alias")
+    assert list(alias) == [dict(result, host="alias") for result in recorded]
+    assert store.host == "h"
+
+    store.record(port_result("h", 20))  # Re-recording replaces the earlier state
+    assert store.state(20) == PortStateStore.CLOSED
+    assert store.count(PortStateStore.OPEN) == 1
+    store.record(port_result("h", 21, error="[Errno 113] No route to host"))
+    assert store.error_messages() == {"Connection refused", "Connection timed out",
+                                      "[Errno 113] No route to host"}
+    store.record(port_result("h", 20, error="[Errno 113] No route to host"))
+    assert store.error_messages() == {"Connection timed out", "[Errno 113] No route to host"}
+
+
+def test_port_state_store_set_operations():
+    ports = PortSet.parse("1-16")
+    a, b = PortStateStore("a", ports), PortStateStore("b", ports)
+    for port in ports:
+        a.record(port_result("a", port, open_=port % 2 == 0, error=None))
+        b.record(port_result("b", port, open_=port % 4 == 0, error=None))
+    assert a.difference(b) == [2, 6, 10, 14]
+    assert a.intersection(b) == [4, 8, 12, 16]
+    other = PortStateStore("c", PortSet.parse("4-8"))  # Different port set: slow path
+    other.record(port_result("c", 4, open_=True, error=None))
+    assert a.intersection(other) == [4]
+
+
+def test_engines_keep_port_results_in_stores(loopback):
+    checker = NetworkChecker(timeout=0.5, max_workers=20)
+    results = checker.scan_hosts_parallel(loopback.addresses, loopback.ports, ping=False)
+    checker.dns.shutdown()
+    for result in results:
+        assert isinstance(result["ports"], PortStateStore)
+        for state in PortStateStore.STATES:
+            assert list(result["ports"].ports_in(state)) == [
+                port for (host, port), expected in loopback.expected.items()
+                if host == result["host"] and expected == state]
@@ -0,0 +1,51 @@
+"""LatencyHistogram percentiles and PhaseProfiler aggregation."""
+
+import pytest
+
+from pingport_cli import LatencyHistogram, PhaseProfiler
+
+MS = 1_000_000
+
+
+def histogram(durations_ms):
+    h = LatencyHistogram()
+    for duration in durations_ms:
+        h.add(int(duration * MS))
+    return h
+
+
+def test_percentiles_are_within_bucket_resolution():
+    h = histogram(range(1, 1001))
+    assert (h.count, h.min_ns, h.max_ns) == (1000, MS, 1000 * MS)
+    for pct in (50, 95, 99):
+        assert h.percentile(pct) == pytest.approx(10 * pct, rel=0.1)
+    assert h.percentile(100) <= 1000
+    assert h.percentile(0) == pytest.approx(1, rel=0.1)
+    assert LatencyHistogram().percentile(50) == 0.0
+
+
+def test_merge_matches_a_single_histogram():
+    merged = histogram([1, 2, 3])
+    merged.merge(histogram([400, 500]))
+    merged.merge(LatencyHistogram())
+    single = histogram([1, 2, 3, 400, 500])
+    assert merged.buckets == single.buckets
+    assert (merged.count, merged.total_ns, merged.min_ns, merged.max_ns) == (
+        single.count, single.total_ns, single.min_ns, single.max_ns)
+
+
+def test_profiler_summary_lists_phases_and_slowest_hosts():
+    profiler = PhaseProfiler()
+    profiler.record("connect", "fast", 1 * MS)
+    profiler.record("dns", "slow", 5 * MS)
+    profiler.record("connect_timeout", "slow", 3000 * MS)
+    other = PhaseProfiler()
+    other.record("connect", "fast", 2 * MS)
+    profiler.merge(other.global_phases, other.host_phases)
+
+    assert profiler.global_phases["connect"].count == 2
+    summary = profiler.format_summary(top_hosts=1).splitlines()
+    phases = [line.split()[0] for line in summary[2:5]]
+    assert phases == ["dns", "connect", "connect_timeout"]
+    assert "Slowest 1 host(s)" in summary[6]
+    assert all(line.split()[0] == "slow" for line in summary[8:])
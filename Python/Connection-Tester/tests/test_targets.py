@@ -0,0 +1,41 @@
+"""Lazy expansion of CIDR blocks, address ranges and host files."""
+
+from itertools import islice
+
+import pytest
+
+from pingport_cli import expand_target, iter_host_file, iter_targets
+
+
+@pytest.mark.parametrize("spec, hosts", [
+    ("10.0.0.0/30", ["10.0.0.1", "10.0.0.2"]),
+    ("10.0.0.7/32", ["10.0.0.7"]),
+    ("10.0.0.254-10.0.1.1", ["10.0.0.254", "10.0.0.255", "10.0.1.0", "10.0.1.1"]),
+    ("10.0.0.1-3", ["10.0.0.1", "10.0.0.2", "10.0.0.3"]),
+    ("fe80::1-fe80::2", ["fe80::1", "fe80::2"]),
+    ("web-01.example.com", ["web-01.example.com"]),
+    (" example.com ", ["example.com"]),
+])
+def test_expand_target(spec, hosts):
+    assert list(expand_target(spec)) == hosts
+
+
+@pytest.mark.parametrize("spec", ["10.0.0.5-10.0.0.1", "10.0.0.1-::1", "10.0.0.0/33"])
+def test_expand_target_rejects_malformed_specs(spec):
+    with pytest.raises(ValueError):
+        list(expand_target(spec))
+
+
+def test_expansion_is_lazy():
+    assert list(islice(expand_target("10.0.0.0/8"), 2)) == ["10.0.0.1", "10.0.0.2"]
+
+
+def test_host_file_and_command_line_targets(tmp_path, capsys):
+    host_file = tmp_path / "hosts.txt"
+    host_file.write_text("# Web servers\nexample.com  # primary\n\n192.168.0.1-2\nexample.com\n",
+                         encoding="utf-8")
+    assert list(iter_host_file(str(host_file))) == ["example.com", "192.168.0.1-2", "example.com"]
+
+    hosts = list(iter_targets(["example.com", "10.0.0.9-1"], [str(host_file)]))
+    assert hosts == ["example.com", "192.168.0.1", "192.168.0.2"]
+    assert "Skipping invalid target '10.0.0.9-1'" in capsys.readouterr().err
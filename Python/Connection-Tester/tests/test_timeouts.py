@@ -0,0 +1,30 @@
+"""RttEstimator follows the RFC 6298 retransmission timer."""
+
+import pytest
+
+from pingport_cli import RttEstimator
+
+
+def test_hosts_without_samples_get_the_ceiling():
+    assert RttEstimator(ceiling=3).timeout("a") == 3
+
+
+def test_timeout_is_srtt_plus_four_rttvar():
+    estimator = RttEstimator(ceiling=3, floor=0.01)
+    estimator.sample("a", 0.1)
+    assert estimator.timeout("a") == pytest.approx(0.1 + 4 * 0.05)
+
+    estimator.sample("a", 0.2)
+    srtt = 0.875 * 0.1 + 0.125 * 0.2
+    rttvar = 0.75 * 0.05 + 0.25 * 0.1
+    assert estimator.timeout("a") == pytest.approx(srtt + 4 * rttvar)
+    assert estimator.timeout("b") == 3
+
+
+def test_timeout_is_clamped():
+    estimator = RttEstimator(ceiling=1, floor=0.2)
+    estimator.sample("fast", 0.001)
+    estimator.sample("slow", 5)
+    assert estimator.timeout("fast") == 0.2
+    assert estimator.timeout("slow") == 1
+    assert RttEstimator(ceiling=0.5, floor=2).floor == 0.5
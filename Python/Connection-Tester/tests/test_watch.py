@@ -0,0 +1,86 @@
+"""WatchMonitor emits a baseline in the first cycle and only transitions afterwards."""
+
+import pytest
+
+from pingport_cli import PortSet, WatchMonitor
+
+
+class ScriptedChecker:
+    """Stands in for NetworkChecker, answering each probe from the current cycle's script."""
+    
+    max_workers = 2
+    
+    def __init__(self, cycles):
+        self.cycles = cycles
+        self.cycle = 0
+        self.dns = self
+    
+    def resolve(self, host):
+        """A host missing from the cycle's script does not resolve."""
+        error = None if host in self.cycles[self.cycle] else "DNS resolution failed"
+        return {"host": host, "addresses": [] if error else [host], "error": error, "dns_time": 1.0}
+    
+    def ping_host(self, host, count=4):
+        return {"host": host, "success": self.cycles[self.cycle][host]}
+    
+    def check_port(self, host, port):
+        state = self.cycles[self.cycle][(host, port)]
+        return {"host": host, "port": port, "open": state == "open",
+                "error": {"open": None, "closed": "Connection refused",
+                          "filtered": "Connection timed out"}[state],
+                "response_time": 1.0}
+
+
+def test_transitions_only_after_the_baseline():
+    checker = ScriptedChecker([
+        {"a": True, ("a", 80): "open", ("a", 81): "closed", ("a", 82): "filtered"},
+        {"a": True, ("a", 80): "open", ("a", 81): "closed", ("a", 82): "filtered"},
+        {"a": False, ("a", 80): "filtered", ("a", 81): "open", ("a", 82): "filtered"},
+    ])
+    events = []
+    monitor = WatchMonitor(checker, ["a"], PortSet.parse("80-82"), interval=0, emit=events.append)
+
+    monitor.run_cycle()
+    assert [(e["port"], e["from"], e["to"]) for e in events] == [(None, None, "up"), (80, None, "open")]
+
+    events.clear()
+    checker.cycle = 1
+    monitor.run_cycle()
+    assert events == []
+
+    checker.cycle = 2
+    monitor.run_cycle()
+    changes = sorted(((e["port"] or 0), e["from"], e["to"], e["error"]) for e in events)
+    assert changes == [(0, "up", "down", None), (80, "open", "filtered", "Connection timed out"),
+                       (81, "closed", "open", None)]
+    assert monitor.cycle == 3
+
+
+def test_unresolvable_host_is_reported_once():
+    checker = ScriptedChecker([
+        {},
+        {},
+        {"a": True, ("a", 80): "open", ("a", 81): "closed"},
+    ])
+    events = []
+    monitor = WatchMonitor(checker, ["a"], PortSet.parse("80-81"), interval=0, emit=events.append)
+
+    monitor.run_cycle()
+    monitor.run_cycle()
+    assert [(e["port"], e["from"], e["to"], e["error"]) for e in events] == [
+        (None, None, "unresolved", "DNS resolution failed")]
+
+    events.clear()
+    checker.cycle = 2
+    monitor.run_cycle()
+    assert [(e["port"], e["from"], e["to"]) for e in events][:1] == [(None, "unresolved", "resolved")]
+    assert sorted((e["port"] or 0, e["to"]) for e in events[1:]) == [(0, "up"), (80, "open")]
+
+
+def test_failed_probe_is_raised_even_after_pruning():
+    ports = PortSet.parse("1-2000")
+    script = {"a": True, **{("a", port): "closed" for port in ports}}
+    del script[("a", 5)]  # Probing it raises KeyError, early in a cycle long enough to be pruned
+    monitor = WatchMonitor(ScriptedChecker([script]), ["a"], ports, interval=0, emit=lambda event: None)
+    with pytest.raises(KeyError):
+        monitor.run_cycle()